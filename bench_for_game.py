@@ -0,0 +1,631 @@
+import os
+import sys
+import json
+import time
+import random
+import gc
+import argparse
+import platform
+import statistics
+import subprocess
+
+# Benchmarks never need a window.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame as p
+import numpy as np
+from tools_for_game import update_water_flow, generate_caves_in_layer, generate_trees, load_bg_image, GROUND_LEVEL
+from tile_for_game import load_textures, tile_size
+from terrain_for_game import generate_region, check_region_matches_default
+from world_for_game import World
+from render_for_game import WorldLayer
+from entity_for_game import Entities, KIND_WIDTH, KIND_HEIGHT
+from particle_for_game import Particles, particle_sprite, PARTICLE_LIFE, PARTICLE_GRAVITY, BREAK_PARTICLES
+from water_for_game import WaterSimulation
+from generation_for_game import ChunkGenerator
+from player_for_game import Player
+from mountain_for_game import Mountain, MountainRange, MOUNTAIN_SCALE
+from cloud_for_game import CloudLayer, CLOUD_COUNT
+from block_game import ScriptedKeys
+
+SEED = 1234
+
+#--------------------------------------------------------------------------------------------------------------------
+def timed(fn, repeat=5):
+    """Runs fn repeat times and returns (best, median) wall time in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+def init_display(size=(800, 600)):
+    if not p.display.get_init():
+        p.display.init()
+    screen = p.display.set_mode(size)
+    load_textures()
+    return screen
+
+#--------------------------------------------------------------------------------------------------------------------
+def flooded_cavern(seed, width, depth, top=20):
+    """
+    A world with a width x depth cavern dug out below the surface and the upper half of it
+    sprinkled with flowing water (level 7), which keeps falling and spreading for many ticks.
+    """
+    rng = random.Random(seed)
+    world = World()
+    for y in range(top, top + depth):
+        for x in range(width):
+            world.set_tile(x, y, None)
+    for y in range(top, top + depth // 2):
+        for x in range(width):
+            if rng.random() < 0.5:
+                world.set_tile(x, y, "water", level=7)
+    return world
+
+def water_state(world):
+    return sorted(world.water_cells())
+
+def caves_world(seed, width=600):
+    """The startup world of the game (caves, lakes and trees over width columns), from a fixed seed."""
+    random.seed(seed)
+    world = World()
+    half = width // 2
+    generate_caves_in_layer(world, -half, half, GROUND_LEVEL + 5, GROUND_LEVEL + 10, "dirt")
+    generate_caves_in_layer(world, -half, half, GROUND_LEVEL + 15, GROUND_LEVEL + 24, "stone")
+    generate_trees(world, -half, half)
+    return world
+
+#--------------------------------------------------------------------------------------------------------------------
+def bench_tile_access(seed=SEED, count=200000):
+    """get_tile / set_tile throughput over random positions in a 2048 x 128 tile area."""
+    rng = random.Random(seed)
+    world = World()
+    positions = [(rng.randint(-1024, 1023), rng.randint(-16, 111)) for _ in range(count)]
+    kinds = [rng.choice([None, "dirt", "stone", "wood"]) for _ in range(count)]
+    def read_cold():
+        for x, y in positions:
+            world.get_tile(x, y)
+    cold = timed(read_cold, repeat=1)[0]
+    def read():
+        for x, y in positions:
+            world.get_tile(x, y)
+    def write():
+        for (x, y), kind in zip(positions, kinds):
+            world.set_tile(x, y, kind)
+    read_best, read_median = timed(read)
+    write_best, write_median = timed(write)
+    return {
+        "operations": count,
+        "get_tile_cold_ops_per_s": count / cold,
+        "get_tile_ops_per_s": count / read_best,
+        "set_tile_ops_per_s": count / write_best,
+        "get_tile_median_s": read_median,
+        "set_tile_median_s": write_median,
+    }
+
+def bench_terrain(seed=SEED):
+    """Vectorized terrain generation for a 32 x 32 chunk, and a bit-for-bit check against the scalar terrain."""
+    rng = random.Random(seed)
+    origins = [(rng.randint(-10 ** 6, 10 ** 6), rng.randint(-2, 1) * 32) for _ in range(200)]
+    def generate():
+        for x0, y0 in origins:
+            generate_region(x0, y0, 32, 32)
+    best, median = timed(generate)
+    mismatches = sum(len(check_region_matches_default(x0, y0, 32, 32)) for x0, y0 in origins[:20])
+    return {
+        "chunks": len(origins),
+        "ms_per_chunk": best / len(origins) * 1000.0,
+        "median_ms_per_chunk": median / len(origins) * 1000.0,
+        "mismatches": mismatches,
+    }
+
+def bench_draw(seed=SEED, frames=120, sizes=((800, 600), (1280, 720), (1920, 1080))):
+    """
+    World.draw (background and foreground) per frame, with the camera panning over the startup
+    world, at several window sizes. Warm frames reuse the cached chunk surfaces; cold frames drop
+    them first, so every visible chunk is rendered from its tiles (as when it comes into view).
+    """
+    results = []
+    for size in sizes:
+        init_display(size)
+        fg_world = caves_world(seed)
+        bg_world = World(layer="background")
+        def frame(i):
+            camera_x = (i * 7) % 4000 - 2000
+            camera_y = 150 + (i * 3) % 300
+            bg_world.draw(camera_x, camera_y)
+            fg_world.draw(camera_x, camera_y)
+        times = []
+        for i in range(frames):
+            start = time.perf_counter()
+            frame(i)
+            times.append(time.perf_counter() - start)
+        cold_times = []
+        tiles_drawn = 0
+        for i in range(0, frames, 4):
+            fg_world.surface_cache.clear()
+            bg_world.surface_cache.clear()
+            start = time.perf_counter()
+            frame(i)
+            cold_times.append(time.perf_counter() - start)
+            tiles_drawn += fg_world.tiles_drawn + bg_world.tiles_drawn
+        results.append({
+            "size": list(size),
+            "frames": frames,
+            "first_frame_ms": times[0] * 1000.0,
+            "median_frame_ms": statistics.median(times) * 1000.0,
+            "p99_frame_ms": sorted(times)[int(len(times) * 0.99) - 1] * 1000.0,
+            "median_cold_frame_ms": statistics.median(cold_times) * 1000.0,
+            "us_per_tile_drawn": sum(cold_times) / max(tiles_drawn, 1) * 1e6,
+        })
+    return results
+
+def bench_scroll(seed=SEED, frames=240, size=(800, 600)):
+    """
+    Drawing the world every frame directly (World.draw of both layers) against through a
+    WorldLayer, with the camera standing still and panning a few pixels per frame.
+    """
+    screen = init_display(size)
+    fg_world = caves_world(seed)
+    bg_world = World(layer="background")
+    layer = WorldLayer([bg_world, fg_world], size)
+    def direct(camera_x, camera_y):
+        bg_world.draw(camera_x, camera_y)
+        fg_world.draw(camera_x, camera_y)
+    def layered(camera_x, camera_y):
+        layer.draw(screen, camera_x, camera_y)
+    results = {}
+    for name, draw in (("direct", direct), ("layer", layered)):
+        for motion, step in (("idle", 0), ("pan", 4)):
+            draw(-400, 150)
+            times = []
+            for i in range(frames):
+                start = time.perf_counter()
+                draw(-400 + i * step, 150 + (i * step) // 4)
+                times.append(time.perf_counter() - start)
+            results[f"{name}_{motion}_median_ms"] = statistics.median(times) * 1000.0
+    return results
+
+def bench_water(seed=SEED, sizes=(100, 10000, 100000), ticks=10):
+    """update_water_flow per tick with about 100, 10k and 100k water cells in a flooded cavern."""
+    results = []
+    for cells in sizes:
+        # Half of the upper half of the cavern is water: cells ~= width * depth / 4.
+        depth = max(8, min(128, int((cells * 4) ** 0.5 / 2)))
+        width = max(8, cells * 4 // depth)
+        world = flooded_cavern(seed, width, depth)
+        water_cells = sum(1 for _ in world.water_cells())
+        start = time.perf_counter()
+        for _ in range(ticks):
+            update_water_flow(world)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "water_cells": water_cells,
+            "ticks": ticks,
+            "ms_per_tick": elapsed / ticks * 1000.0,
+            "water_cells_after": sum(1 for _ in world.water_cells()),
+        })
+    return results
+
+def bench_generation(seed=SEED, widths=(600, 6000)):
+    """generate_caves_in_layer (dirt and stone layers) and generate_trees over wide column ranges."""
+    results = []
+    for width in widths:
+        random.seed(seed)
+        world = World()
+        half = width // 2
+        start = time.perf_counter()
+        generate_caves_in_layer(world, -half, half, GROUND_LEVEL + 5, GROUND_LEVEL + 10, "dirt")
+        generate_caves_in_layer(world, -half, half, GROUND_LEVEL + 15, GROUND_LEVEL + 24, "stone")
+        caves = time.perf_counter() - start
+        start = time.perf_counter()
+        generate_trees(world, -half, half)
+        trees = time.perf_counter() - start
+        results.append({"columns": width, "caves_s": caves, "trees_s": trees, "chunks": len(world.chunks)})
+    return results
+
+def bench_streaming(seed=SEED, columns=256):
+    """ChunkGenerator: chunks generated on demand (caves, lakes, trees) along a strip of the surface, as a walk would."""
+    world = World()
+    world.generator = ChunkGenerator(seed)
+    start = time.perf_counter()
+    for cx in range(columns):
+        for cy in (-1, 0, 1):
+            world.get_chunk(cx, cy)
+    elapsed = time.perf_counter() - start
+    return {"chunks": columns * 3, "ms_per_chunk": elapsed / (columns * 3) * 1000.0, "water_cells": sum(1 for _ in world.water_cells())}
+
+def bench_player(seed=SEED, updates=20000):
+    """Player.update collision over the startup world, walking and jumping with scripted keys."""
+    world = caves_world(seed)
+    player = Player(0, (GROUND_LEVEL - 2) * tile_size)
+    keys = ScriptedKeys()
+    start = time.perf_counter()
+    for _ in range(updates):
+        keys.advance()
+        player.update(world, keys)
+    elapsed = time.perf_counter() - start
+    return {"updates": updates, "us_per_update": elapsed / updates * 1e6, "final_position": [player.x, player.y]}
+
+def bench_entities(seed=SEED, counts=(30, 1000, 10000), frames=100):
+    """Entities.update (gravity, integration and tile collision) per frame for mobs and drops scattered over the startup world."""
+    world = caves_world(seed)
+    results = []
+    for count in counts:
+        rng = random.Random(seed)
+        entities = Entities()
+        for i in range(count):
+            entities.spawn("mob" if i % 2 else "drop", rng.uniform(-9000, 9000), rng.uniform(0, 8 * tile_size),
+                           vx=rng.choice((-1.0, 1.0)), data=2)
+        # Let them land first, then time walking and resting.
+        for _ in range(20):
+            entities.update(world)
+        start = time.perf_counter()
+        for _ in range(frames):
+            entities.update(world)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "entities": count,
+            "ms_per_update": elapsed / frames * 1000.0,
+            "us_per_entity": elapsed / frames / count * 1e6,
+            "on_ground": int(entities.on_ground[:entities.count].sum()),
+        })
+    return results
+
+def bench_spatial(seed=SEED, count=10000, frames=50, queries=1000):
+    """
+    Proximity queries among count mobs and drops: box, radius (128 px) and nearest-5 queries
+    through the Entities grid against a scan of every entity, the cost of keeping the grid up
+    to date in Entities.update, and Player.collect.
+    """
+    world = caves_world(seed)
+    rng = random.Random(seed)
+    entities = Entities()
+    for i in range(count):
+        entities.spawn("mob" if i % 2 else "drop", rng.uniform(-9000, 9000), rng.uniform(0, 8 * tile_size),
+                       vx=rng.choice((-1.0, 1.0)), data=2)
+    for _ in range(20):
+        entities.update(world)
+    moves = entities.grid.moves
+    start = time.perf_counter()
+    for _ in range(frames):
+        entities.update(world)
+    update_ms = (time.perf_counter() - start) / frames * 1000.0
+    points = [(rng.uniform(-9000, 9000), rng.uniform(0, 8 * tile_size)) for _ in range(queries)]
+
+    def scan_box(left, top, right, bottom):
+        n = entities.count
+        kind = entities.kind[:n]
+        x = entities.x[:n]
+        y = entities.y[:n]
+        return np.nonzero((x < right) & (y < bottom) & (x + KIND_WIDTH[kind] > left) & (y + KIND_HEIGHT[kind] > top))[0]
+
+    def scan_nearest(cx, cy, k):
+        n = entities.count
+        kind = entities.kind[:n]
+        distance = (entities.x[:n] + KIND_WIDTH[kind] / 2 - cx) ** 2 + (entities.y[:n] + KIND_HEIGHT[kind] / 2 - cy) ** 2
+        return np.argsort(distance)[:k]
+
+    def per_query(fn):
+        start = time.perf_counter()
+        found = sum(len(fn(x, y)) for x, y in points)
+        return (time.perf_counter() - start) / queries * 1e6, found / queries
+
+    results = {"entities": count, "cell_size": entities.grid.cell_size, "cells": len(entities.grid.cells),
+               "update_ms": update_ms, "cell_changes_per_update": (entities.grid.moves - moves) / frames}
+    for name, grid, scan in (
+            ("box", lambda x, y: entities.query_box(x - 64, y - 64, x + 64, y + 64), lambda x, y: scan_box(x - 64, y - 64, x + 64, y + 64)),
+            ("radius", lambda x, y: entities.query_radius(x, y, 128), None),
+            ("nearest5", lambda x, y: entities.nearest(x, y, 5), lambda x, y: scan_nearest(x, y, 5))):
+        us, found = per_query(grid)
+        results[name] = {"us_per_query": us, "found_per_query": found}
+        if scan is not None:
+            results[name]["scan_us_per_query"] = per_query(scan)[0]
+    player = Player(0, (GROUND_LEVEL - 2) * tile_size)
+    start = time.perf_counter()
+    for x, y in points:
+        player.x = x
+        player.y = y
+        player.collect(entities)
+    results["collect_us"] = (time.perf_counter() - start) / queries * 1e6
+    results["collected"] = sum(player.inventory.values())
+    return results
+
+class ObjectParticle:
+    """A particle as its own object, the way bench_pool's baseline keeps them."""
+    def __init__(self, x, y, vx, vy, tile_id):
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.tile = tile_id
+        self.life = PARTICLE_LIFE
+
+def gc_collections():
+    return sum(stat["collections"] for stat in gc.get_stats())
+
+def bench_pool(seed=SEED, frames=600, breaks_per_frame=2, max_drops=400):
+    """
+    Tile breaking churn: every frame breaks_per_frame tiles burst into particles and drop an
+    item, and the oldest drops are picked up past max_drops. The Particles pool and preallocated
+    Entities against particles as objects in a list with one blit each; per frame time (update
+    and draw), garbage collections and pool allocations after the first second.
+    """
+    init_display()
+    world = caves_world(seed)
+    screen = p.Surface((800, 600))
+    results = {}
+    for name in ("pool", "objects"):
+        rng = random.Random(seed)
+        particles = Particles(seed=seed) if name == "pool" else []
+        entities = Entities(max_drops + 64, max_count=max_drops + 64) if name == "pool" else Entities()
+        elapsed = 0.0
+        for frame in range(frames):
+            if frame == 60:
+                gc.collect()
+                collections = gc_collections()
+                allocations = entities.allocations
+            start = time.perf_counter()
+            for _ in range(breaks_per_frame):
+                x = rng.uniform(0, 800)
+                y = rng.uniform(0, 600)
+                tile_id = rng.randint(1, 3)
+                if name == "pool":
+                    particles.burst(x, y, tile_id)
+                else:
+                    for _ in range(BREAK_PARTICLES):
+                        particles.append(ObjectParticle(x, y, rng.uniform(-3, 3), rng.uniform(-4, 0), tile_id))
+                entities.spawn("drop", x, y, vx=rng.uniform(-1, 1), vy=-3.0, data=tile_id)
+            if entities.count > max_drops:
+                entities.remove(np.arange(entities.count - max_drops))
+            entities.update(world)
+            if name == "pool":
+                particles.update()
+                particles.draw(screen, 0, 0)
+            else:
+                for particle in particles:
+                    particle.vy += PARTICLE_GRAVITY
+                    particle.x += particle.vx
+                    particle.y += particle.vy
+                    particle.life -= 1
+                particles = [particle for particle in particles if particle.life > 0]
+                for particle in particles:
+                    screen.blit(particle_sprite(particle.tile), (particle.x, particle.y))
+            entities.draw(screen, 0, 0)
+            if frame >= 60:
+                elapsed += time.perf_counter() - start
+        results[name] = {
+            "ms_per_frame": elapsed / (frames - 60) * 1000.0,
+            "particles": len(particles),
+            "gc_collections": gc_collections() - collections,
+            "entity_allocations": entities.allocations - allocations,
+        }
+    return results
+
+def mountain_strip_baseline(images, camera_x, mountains, w):
+    """The old per-frame mountain upkeep of run_game: a list, scaling every new mountain's image again."""
+    grass_y = GROUND_LEVEL * tile_size
+    effective_cam = camera_x * 0.3
+    while mountains and (mountains[-1].x + mountains[-1].image.get_width() < effective_cam + w):
+        possible_indices = [i for i in range(len(images)) if i != mountains[-1].image_id] or list(range(len(images)))
+        new_idx = random.choice(possible_indices)
+        new_img = images[new_idx]
+        new_scaled_img = p.transform.scale(new_img, (int(new_img.get_width() * MOUNTAIN_SCALE), int(new_img.get_height() * MOUNTAIN_SCALE)))
+        mountains.append(Mountain(new_scaled_img, new_idx, mountains[-1].x + mountains[-1].image.get_width(), grass_y - new_scaled_img.get_height()))
+    while mountains and (mountains[0].x > effective_cam):
+        possible_indices = [i for i in range(len(images)) if i != mountains[0].image_id] or list(range(len(images)))
+        new_idx = random.choice(possible_indices)
+        new_img = images[new_idx]
+        new_scaled_img = p.transform.scale(new_img, (int(new_img.get_width() * MOUNTAIN_SCALE), int(new_img.get_height() * MOUNTAIN_SCALE)))
+        mountains.insert(0, Mountain(new_scaled_img, new_idx, mountains[0].x - new_scaled_img.get_width(), grass_y - new_scaled_img.get_height()))
+    while mountains and (mountains[0].x + mountains[0].image.get_width() < effective_cam - w):
+        mountains.pop(0)
+    while mountains and (mountains[-1].x > effective_cam + 2 * w):
+        mountains.pop()
+
+def bench_mountains(seed=SEED, frames=600, speed=40, size=(800, 600)):
+    """
+    The mountain strip while the camera pans right then back left at speed pixels per frame:
+    upkeep and drawing per frame for the old list that scaled every new image, MountainRange
+    and MountainRange with the pre-drawn strip.
+    """
+    init_display(size)
+    images = [image for image in (load_bg_image(f"mountain{i}.png") for i in (1, 2, 3)) if image is not None]
+    if not images:
+        return {"error": "no mountain images"}
+    screen = p.Surface(size)
+    camera_y = (GROUND_LEVEL - 12) * tile_size
+    path = [speed * f for f in range(frames // 2)] + [speed * (frames // 2 - f) for f in range(frames - frames // 2)]
+    results = {}
+    for name in ("list", "range", "composite"):
+        random.seed(seed)
+        if name == "list":
+            strip = MountainRange(images, size[0])
+            mountains = list(strip)
+        else:
+            strip = MountainRange(images, size[0], composite=name == "composite")
+        update = draw = worst = 0.0
+        for camera_x in path:
+            start = time.perf_counter()
+            if name == "list":
+                mountain_strip_baseline(images, camera_x, mountains, size[0])
+            else:
+                strip.update(camera_x)
+            middle = time.perf_counter()
+            if name == "list":
+                for mountain in mountains:
+                    mountain.draw(screen, camera_x, camera_y)
+            else:
+                strip.draw(screen, camera_x, camera_y)
+            draw += time.perf_counter() - middle
+            update += middle - start
+            worst = max(worst, middle - start)
+        results[name] = {"update_us": update / frames * 1e6, "draw_us": draw / frames * 1e6, "worst_update_us": worst * 1e6,
+                         "ms_per_frame": (update + draw) / frames * 1000.0, "rebuilds": strip.rebuilds}
+    return results
+
+class ScreenCloud:
+    """The old Cloud: its own rotozoomed image, wrapping around the screen width."""
+    def __init__(self, images, w):
+        self.image = p.transform.rotozoom(random.choice(images), 0, random.uniform(1.5, 2.5))
+        self.w = w
+        self.x = random.randint(0, w)
+        self.y = random.randint(-300, 50)
+        self.speed = random.uniform(0.2, 1.0)
+
+    def update(self):
+        self.x += self.speed
+        if self.x > self.w:
+            self.x = -self.image.get_width()
+            self.y = random.randint(-300, 50)
+
+def bench_clouds(seed=SEED, frames=600, speeds=(0, 10), size=(800, 600)):
+    """
+    The cloud layer with the camera standing still and panning: creation, then update and
+    drawing per frame, for the old screen-wrapping clouds (a rotozoom and a blit each, left
+    behind when the camera moves) and CloudLayer (cached scaled images, off-screen clouds
+    skipped, one blits call).
+    """
+    init_display(size)
+    images = [image for image in (load_bg_image(f"cloud{i}.png") for i in (1, 2, 3)) if image is not None]
+    if not images:
+        return {"error": "no cloud images"}
+    screen = p.Surface(size)
+    camera_y = -100
+    results = []
+    for speed in speeds:
+        for name in ("objects", "layer"):
+            random.seed(seed)
+            start = time.perf_counter()
+            clouds = [ScreenCloud(images, size[0]) for _ in range(CLOUD_COUNT)] if name == "objects" else CloudLayer(images, size)
+            create = time.perf_counter() - start
+            drawn = 0
+            start = time.perf_counter()
+            for frame in range(frames):
+                camera_x = speed * frame
+                if name == "objects":
+                    for cloud in clouds:
+                        cloud.update()
+                    for cloud in clouds:
+                        screen.blit(cloud.image, (cloud.x - camera_x, cloud.y - camera_y))
+                    drawn += sum(1 for cloud in clouds if cloud.x - camera_x < size[0] and cloud.x - camera_x + cloud.image.get_width() > 0)
+                else:
+                    clouds.update(camera_x)
+                    clouds.draw(screen, camera_x, camera_y)
+                    drawn += len(clouds.visible(camera_x, camera_y))
+            elapsed = time.perf_counter() - start
+            results.append({"clouds": name, "camera_speed": speed, "create_ms": create * 1000.0,
+                            "us_per_frame": elapsed / frames * 1e6, "on_screen_per_frame": drawn / frames,
+                            "scaled_images": CLOUD_COUNT if name == "objects" else len(clouds.sprites)})
+    return results
+
+def bench_water_scaling(seed=1, width=512, depth=96, ticks=20, workers_list=(1, 2, 4, 8)):
+    """
+    Times WaterSimulation ticks on the same flooded cavern with 1, 2, 4 and 8 worker processes
+    and checks that every parallel run ends in exactly the serial state.
+    The first tick (which also starts the pool) is not timed.
+    """
+    results = []
+    serial_state = None
+    for workers in workers_list:
+        world = flooded_cavern(seed, width, depth)
+        simulation = WaterSimulation(world, workers=workers)
+        simulation.step()
+        active = simulation.active_count()
+        start = time.perf_counter()
+        for _ in range(ticks):
+            simulation.step()
+        elapsed = time.perf_counter() - start
+        simulation.close()
+        state = water_state(world)
+        if serial_state is None:
+            serial_state = state
+        results.append({
+            "workers": workers,
+            "active_cells_at_start": active,
+            "ticks": ticks,
+            "ms_per_tick": elapsed / ticks * 1000.0,
+            "matches_serial": state == serial_state,
+        })
+    return results
+
+BENCHMARKS = {
+    "tile_access": bench_tile_access,
+    "terrain": bench_terrain,
+    "draw": bench_draw,
+    "scroll": bench_scroll,
+    "water": bench_water,
+    "generation": bench_generation,
+    "streaming": bench_streaming,
+    "player": bench_player,
+    "entities": bench_entities,
+    "spatial": bench_spatial,
+    "pool": bench_pool,
+    "mountains": bench_mountains,
+    "clouds": bench_clouds,
+    "water_scaling": bench_water_scaling,
+}
+# Left out of a plain run: they take long (water_scaling starts process pools).
+SLOW_BENCHMARKS = {"water_scaling"}
+
+#--------------------------------------------------------------------------------------------------------------------
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pygame": p.version.ver,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "seed": SEED,
+    }
+
+# Result keys holding a time, by their unit: *_s, *_ms, *_us, ms_per_* and us_per_* (*_ops_per_s is a throughput).
+TIME_SUFFIXES = ("_s", "_ms", "_us")
+TIME_PREFIXES = ("ms_per_", "us_per_")
+
+def is_timing(key):
+    return key.endswith(TIME_SUFFIXES) or key.startswith(TIME_PREFIXES)
+
+def compare(old, new, path=""):
+    """
+    Prints old -> new and the new / old ratio for every timing and throughput figure of two result
+    files (see is_timing). For times a ratio above 1 is a slowdown, for *_ops_per_s a speedup.
+    """
+    if isinstance(new, dict):
+        for key, value in new.items():
+            if isinstance(old, dict) and key in old and key != "environment":
+                compare(old[key], value, f"{path}.{key}" if path else key)
+    elif isinstance(new, list):
+        for i, (old_item, new_item) in enumerate(zip(old, new)):
+            compare(old_item, new_item, f"{path}[{i}]")
+    elif isinstance(new, (int, float)) and isinstance(old, (int, float)) and not isinstance(new, bool) and old:
+        if is_timing(path.rsplit(".", 1)[-1]):
+            print(f"{path}: {old:.4g} -> {new:.4g} ({new / old:.2f}x)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine benchmarks (headless, seeded).")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all but {', '.join(SLOW_BENCHMARKS)}): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file from an earlier run to compare against")
+    args = parser.parse_args(argv)
+    results = {"environment": environment()}
+    for name in args.names or [name for name in BENCHMARKS if name not in SLOW_BENCHMARKS]:
+        results[name] = BENCHMARKS[name]()
+        print(name, json.dumps(results[name], indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
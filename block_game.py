@@ -1,519 +1,126 @@
 import pygame as p
 import sys
-import math
 import os
+import time
 import random
+import argparse
+import tempfile
+from tools_for_game import load_bg_image
+from tile_for_game import load_textures
+from world_for_game import World
+from water_for_game import WaterSimulation
+from player_for_game import Player, load_player_images
+from mountain_for_game import MountainRange
+from cloud_for_game import CloudLayer
+from profiler_for_game import FrameProfiler
+from region_for_game import RegionStore, read_meta, write_meta
+from generation_for_game import ChunkGenerator
+from streaming_for_game import ChunkStreamer
+from structures_for_game import TREES, pending_to_json, pending_from_json
+from render_for_game import WorldLayer, DirtyRegions, clipped
+from entity_for_game import Entities
+from particle_for_game import Particles
 #-------------------------------------------------------------------------------------------------------------------------------------------------
-# Setup paths and initialization
-base_path = os.path.dirname(__file__)
-images_path = os.path.join(base_path, 'images')
-p.init()
+# Settings
 w, h = 800, 600
-screen = p.display.set_mode((w, h))
-p.display.set_caption("Open World Game")
 tile_size = 32
 sky = (135, 206, 235)
 GROUND_LEVEL = 10
-MOUNTAIN_SCALE = 1.5
 soul_count = 10
+camera_margin = 200
+# Fixed time step used by headless runs, which do not wait for a frame clock.
+HEADLESS_DT = 1.0 / 60.0
+# Frame phases and counters recorded by the profiler (F3 toggles the overlay, F4 exports).
+FRAME_PHASES = ("input", "player", "entities", "camera", "chunks", "water", "mountains", "clouds", "world", "entity_draw", "player_draw", "hud", "flip", "wait")
+FRAME_COUNTERS = ("tile_draws", "chunk_blits", "layer_pixels", "presented_pixels", "water_active", "chunks_pending", "entities",
+                  "particles", "entity_allocations", "gc_collections", "gc_ms")
+HEADLESS_PHASES = ("player", "camera", "water")
+PROFILE_EXPORT = "profile"
+SAVE_VERSION = 1
+# Memory budget of the resident foreground chunks (see World.trim).
+CHUNK_BUDGET_MB = 64
+# Entity slots allocated up front; past this many mobs and drops, spawns are refused.
+ENTITY_CAPACITY = 2048
 
 #-------------------------------------------------------------------------------------------------------------------------------------------------
-# Helper functions to load images
-def load_texture(filename):
-    path = os.path.join(images_path, filename)
-    try:
-        img = p.image.load(path).convert_alpha()
-        # Scale to tile size
-        return p.transform.scale(img, (tile_size, tile_size))
-    except Exception as e:
-        print(f"Failed to load image: {path}", e)
-        return None
-#-------------------------------------------------------------------------------------------------------------------------------------------------
-def load_bg_image(filename):
-    path = os.path.join(images_path, filename)
-    try:
-        return p.image.load(path).convert_alpha()
-    except Exception as e:
-        print(f"Failed to load background image: {path}", e)
-        return None
-
-# Define textures. If a texture file is missing, a fallback color is used.-------------------------------------------------------------------------------------------------------------------------------------------------
-textures = {
-    "grass": load_texture("grass.png"),      
-    "dirt": load_texture("dirt.png"),        
-    "cave_stone": load_texture("cave_stone.png"), 
-    "water": load_texture("water.png"),      
-    "wood": load_texture("wood.png"),
-    "leaves": load_texture("leaves.png"),
-    "stone": load_texture("stone.png")
-}
-
-# Load player animation images-------------------------------------------------------------------------------------------------------------------------------------------------
-side_right = p.transform.scale(p.image.load(os.path.join(images_path, "side.png")).convert_alpha(), (24, 48))
-move_right1 = p.transform.scale(p.image.load(os.path.join(images_path, "finishstep.png")).convert_alpha(), (24, 48))
-move_right2 = p.transform.scale(p.image.load(os.path.join(images_path, "bigstep.png")).convert_alpha(), (24, 48))
-side_left = p.transform.scale(p.image.load(os.path.join(images_path, "side2.png")).convert_alpha(), (24, 48))
-move_left1 = p.transform.scale(p.image.load(os.path.join(images_path, "finishstep2.png")).convert_alpha(), (24, 48))
-move_left2 = p.transform.scale(p.image.load(os.path.join(images_path, "bigstep2.png")).convert_alpha(), (24, 48))
-
-# --- Tile and World Classes ----------------------------------------------------------------------------------------------------------------------------------------------------
-class Tile:
-    def __init__(self, kind, level=None):
-        self.kind = kind
-        # For water, attach a level (1 to 8, where 8 means a full source)
-        if self.kind == "water":
-            self.level = 8 if level is None else level
-        self.image = textures.get(kind, None)
-        # Interactive tiles for collision (except water)
-        self.can_interact = kind in ["grass", "dirt", "stone", "wood", "leaves", "cave_stone"]
-        
-    def __eq__(self, other):
-        if other is None:
-            return False
-        if isinstance(other, Tile):
-            # For water, ignore level differences when comparing types.
-            if self.kind == "water" and other.kind == "water":
-                return True
-            return self.kind == other.kind
-        if isinstance(other, str):
-            return self.kind == other
-        return False
-    
-    def draw(self, screen, x, y, camera_x, camera_y):
-        if self.image:
-            screen.blit(self.image, (x - camera_x, y - camera_y))
-        else:
-            # Fallback colors if texture is missing.
-            color_mapping = {
-                "grass": (34, 139, 34),
-                "dirt": (139, 69, 19),
-                "cave_stone": (70, 70, 70),
-                "stone": (128, 128, 128),
-                "wood": (160, 82, 45),
-                "leaves": (34, 139, 34),
-                "water": (50, 100, 255)
-            }
-            color = color_mapping.get(self.kind, (200, 0, 200))
-            p.draw.rect(screen, color, p.Rect(x - camera_x, y - camera_y, tile_size, tile_size))
-
 #-------------------------------------------------------------------------------------------------------------------------------------------------
-class World:
-
-    def __init__(self, layer="foreground"):
-        self.modifications = {}
-        self.layer = layer
-        
-    def default_tile(self, x, y):
-        if self.layer == "foreground":
-            if y < GROUND_LEVEL:
-                return None
-            elif y == GROUND_LEVEL:
-                return Tile("grass")
-            elif GROUND_LEVEL < y <= GROUND_LEVEL + 6:
-                noise = (math.sin(x * 12.9898 + y * 78.233) * 43758.5453) % 1.0
-                threshold = (y - (GROUND_LEVEL + 1)) / 5.0  # 0 at GROUND_LEVEL+1, 1 at GROUND_LEVEL+6
-                if noise < threshold:
-                    return Tile("stone")
-                else:
-                    return Tile("dirt")
-            else:
-                return Tile("stone")
-        
-    def get_tile(self, x, y):
-        if (x, y) in self.modifications:
-            return self.modifications[(x, y)]
-        return self.default_tile(x, y)
-
-    def set_tile(self, x, y, kind):
-        default_tile_obj = self.default_tile(x, y)
-        if kind is None:
-            new_tile = None
-        elif isinstance(kind, Tile):
-            new_tile = kind
-        else:
-            new_tile = Tile(kind)
-            
-        if new_tile == default_tile_obj:
-            if (x, y) in self.modifications:
-                del self.modifications[(x, y)]
-        else:
-            self.modifications[(x, y)] = new_tile
-            
-    def add_tile(self, x, y, kind):
-        self.set_tile(x, y, kind)
-        
-    def remove_tile(self, x, y):
-        cur = self.get_tile(x, y)
-        if cur is not None and cur.can_interact:
-            self.set_tile(x, y, None)
-            
-    def draw(self, camera_x, camera_y):
-        start_x = math.floor(camera_x / tile_size)
-        end_x = math.floor((camera_x + w) / tile_size) + 1
-        start_y = math.floor(camera_y / tile_size)
-        end_y = math.floor((camera_y + h) / tile_size) + 1
-        for tx in range(start_x, end_x):
-            for ty in range(start_y, end_y):
-                tile = self.get_tile(tx, ty)
-                if tile is not None:
-                    tile.draw(screen, tx * tile_size, ty * tile_size, camera_x, camera_y)
-
-# Create the foreground world.
-fg_world = World(layer="foreground")
-
-# --- Advanced Water Flow Simulation ----------------------------------------------------------------------------------------------------------------------------------------------------
-def update_water_flow(world):
-    water_positions = []
-    for pos, tile in list(world.modifications.items()):
-        if tile is not None and tile.kind == "water":
-            water_positions.append((pos, tile.level))
-    # Process water from bottom to top so gravity is respected.
-    water_positions.sort(key=lambda pos_level: pos_level[0][1], reverse=True)
-    for (x, y), level in water_positions:
-        current_tile = world.get_tile(x, y)
-        if current_tile is None or current_tile.kind != "water":
-            continue
-        L = current_tile.level
-        below = world.get_tile(x, y + 1)
-        if below is None or (below.kind == "water" and getattr(below, "level", 0) < L):
-            world.set_tile(x, y + 1, Tile("water", level=L))
-            if L < 8:  # Only non-source water is removed after flowing.
-                world.set_tile(x, y, None)
-
-# --- Utility Function: Fill Surface Cave Openings with Water ----------------------------------------------------------------------------------------------------------------------------------------------------
-def fill_surface_caves_with_water(world, x_min, x_max, y_top, y_bottom):
-    x = x_min
-    while x < x_max:
-        if world.get_tile(x, y_top) is None:
-            start = x
-            while x < x_max and world.get_tile(x, y_top) is None:
-                x += 1
-            region_width = x - start
-            if region_width >= 5:
-                for i in range(start, x):
-                    for y in range(y_top, y_bottom + 1):
-                        world.set_tile(i, y, "water")
-        else:
-            x += 1
-
-# --- Cave Generation Functions --------------------------------------------------------------------------------------------------------------------------------------------------
-def generate_cave_blob(world, cx, cy, rx, ry, entrance_width, cave_type):
-    entrance_height = 2
-    top_y = cy - ry
-    for y in range(top_y, cy + ry + 1):
-        for x in range(cx - rx, cx + rx + 1):
-            if y < top_y + entrance_height:
-                if cave_type == "dirt":
-                    if x == cx:
-                        world.set_tile(x, y, None)
-                else:
-                    if abs(x - cx) <= entrance_width // 2:
-                        world.set_tile(x, y, None)
-            else:
-                if ((x - cx) ** 2) / (rx ** 2) + ((y - cy) ** 2) / (ry ** 2) < 1:
-                    world.set_tile(x, y, None)
+def pop_inventory():
+    pass
 
 #-------------------------------------------------------------------------------------------------------------------------------------------------
-def generate_caves_in_layer(world, start_x, end_x, start_y, end_y, cave_type):
-    width = end_x - start_x
-    if cave_type == "dirt":
-        num_blobs = max(8, width // 20)
-        entrance_width = 2
+class ScriptedKeys:
+    """
+    Stands in for p.key.get_pressed() in headless runs: the player walks right and left in
+    ten second stretches and jumps every second, so collisions, falling and swimming all get
+    exercised.
+    """
+    def __init__(self):
+        self.frame = 0
+        self.pressed = set()
+
+    def advance(self):
+        self.frame += 1
+        self.pressed = {p.K_d if (self.frame // 600) % 2 == 0 else p.K_a}
+        if self.frame % 60 == 0:
+            self.pressed.add(p.K_SPACE)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+# --- World Generation ----------------------------------------------------------------------------------------------------------------------------------------------------
+def generate_world(seed=None):
+    """
+    Creates the foreground world and the background wall behind it.
+    Nothing is generated up front: the foreground gets its caves, lakes and trees chunk by chunk
+    as chunks are first needed (see generation_for_game.ChunkGenerator), so the world has no edge
+    and startup does not depend on its size. The same seed always gives the same world; without
+    one a random seed is picked. The seed is kept in fg_world.seed.
+    """
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    fg_world = World(layer="foreground")
+    bg_world = World(layer="background")
+    fg_world.seed = seed
+    fg_world.generator = ChunkGenerator(seed)
+    return fg_world, bg_world
+
+def open_world(world_dir=None, seed=None, chunk_budget=None):
+    """
+    Returns (fg_world, bg_world, meta). Without world_dir the world only lives in memory.
+    With one, a world saved there is opened: chunks changed by the player are read from the
+    region files as they are needed, all others are generated again from the saved seed. If
+    nothing is saved there yet, a new world is created from seed. meta holds what world.json
+    stores next to the region files.
+    With a chunk_budget (bytes), each layer evicts the chunks beyond it; modified foreground chunks
+    are spilled to the saved world, or to a temporary directory when there is none. Background
+    chunks are never modified, so they are just dropped and generated again when needed.
+    """
+    meta = read_meta(world_dir) if world_dir else None
+    fg_world, bg_world = generate_world(meta["seed"] if meta else seed)
+    fg_world.chunk_budget = chunk_budget
+    bg_world.chunk_budget = chunk_budget
+    if meta is None:
+        meta = {"version": SAVE_VERSION, "seed": fg_world.seed}
     else:
-        num_blobs = max(5, width // 30)
-        entrance_width = 1
-    for _ in range(num_blobs):
-        cx = random.randint(start_x, end_x)
-        cy = random.randint(start_y, end_y)
-        if cave_type == "dirt":
-            rx = random.randint(3, 6)
-            ry = random.randint(2, 4)
-        else:  # stone caves – generate bigger blobs
-            rx = random.randint(8, 16)
-            ry = random.randint(6, 12)
-        generate_cave_blob(world, cx, cy, rx, ry, entrance_width, cave_type)
-        # For stone caves, sometimes generate an interconnected upper blob.
-        if cave_type == "stone" and random.random() < 0.2:
-            upper_cy = cy - ry - random.randint(2, 4)
-            upper_rx = random.randint(6, 10)
-            upper_ry = random.randint(4, 8)
-            generate_cave_blob(world, cx, upper_cy, upper_rx, upper_ry, 1, "stone")
-            for y in range(upper_cy + upper_ry, cy - ry + 1):
-                world.set_tile(cx, y, None)
-
-# --- Generate Caves ----------------------------------------------------------------------------------------------------------------------------------------------------
-# Dirt layer caves (higher) with narrow, coal-mine style entrances.
-generate_caves_in_layer(fg_world, -300, 300, GROUND_LEVEL + 5, GROUND_LEVEL + 10, "dirt")
-# Stone layer caves (lower) with larger dimensions.
-generate_caves_in_layer(fg_world, -300, 300, GROUND_LEVEL + 15, GROUND_LEVEL + 24, "stone")
-# Fill wide openings in the dirt layer with water.
-fill_surface_caves_with_water(fg_world, -300, 300, GROUND_LEVEL + 1, GROUND_LEVEL + 4)
-
-# --- Other World Generation: Trees ----------------------------------------------------------------------------------------------------------------------------------------------------
-def generate_trees(world, start_x, end_x):
-    for x in range(start_x, end_x):
-        surface = world.get_tile(x, GROUND_LEVEL)
-        if surface and surface.kind == "grass":
-            if random.random() < 0.1:  # 10% chance per column
-                tree_height = random.randint(6, 9)
-                for i in range(1, tree_height + 1):
-                    world.set_tile(x, GROUND_LEVEL - i, "wood")
-                canopy_y = GROUND_LEVEL - tree_height
-                for cx in range(x - 1, x + 2):
-                    for cy in range(canopy_y - 1, canopy_y + 2):
-                        world.set_tile(cx, cy, "leaves")
-generate_trees(fg_world, -50, 150)
-
-# --- Player, Mountain, and Cloud Classes ----------------------------------------------------------------------------------------------------------------------------------------------------
-class Player:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.width = 24
-        self.height = 48
-        self.vel_y = 0
-        self.on_ground = False
-        self.fly_mode = False
-        self.direction = "right"
-        self.walking = False
-        self.animation_frames = {
-            "right": [move_right1, move_right2],
-            "left": [move_left1, move_left2]
-        }
-        self.animation_index = 0
-        self.animation_counter = 0
-        self.animation_speed = 10
-        self.current_image = side_right
-
-    def rect(self):
-        return p.Rect(self.x, self.y, self.width, self.height)
-
-    def update(self, world, keys):
-        dx, dy = 0, 0
-        if self.fly_mode:
-            if keys[p.K_a]:
-                dx = -5
-            if keys[p.K_d]:
-                dx = 5
-            if keys[p.K_w]:
-                dy = -5
-            if keys[p.K_s]:
-                dy = 5
-            self.x += dx
-            self.y += dy
-        else:
-            if keys[p.K_a]:
-                dx = -5
-                self.direction = "left"
-            elif keys[p.K_d]:
-                dx = 5
-                self.direction = "right"
-            self.x += dx
-
-            # Horizontal collision (ignoring water)
-            start_tx = math.floor(self.x / tile_size)
-            end_tx = math.floor((self.x + self.width) / tile_size) + 1
-            start_ty = math.floor(self.y / tile_size)
-            end_ty = math.floor((self.y + self.height) / tile_size) + 1
-            for tx in range(start_tx, end_tx):
-                for ty in range(start_ty, end_ty):
-                    tile = world.get_tile(tx, ty)
-                    if tile is not None and tile.kind != "water":
-                        tile_rect = p.Rect(tx * tile_size, ty * tile_size, tile_size, tile_size)
-                        if self.rect().colliderect(tile_rect):
-                            if dx > 0:
-                                self.x = tile_rect.left - self.width
-                            elif dx < 0:
-                                self.x = tile_rect.right
-
-            # Gravity
-            self.vel_y += 0.5
-            self.y += self.vel_y
-            start_tx = math.floor(self.x / tile_size)
-            end_tx = math.floor((self.x + self.width) / tile_size) + 1
-            start_ty = math.floor(self.y / tile_size)
-            end_ty = math.floor((self.y + self.height) / tile_size) + 1
-            for tx in range(start_tx, end_tx):
-                for ty in range(start_ty, end_ty):
-                    tile = world.get_tile(tx, ty)
-                    if tile is not None and tile.kind != "water":
-                        tile_rect = p.Rect(tx * tile_size, ty * tile_size, tile_size, tile_size)
-                        if self.rect().colliderect(tile_rect):
-                            if self.vel_y > 0:
-                                self.y = tile_rect.top - self.height
-                                self.vel_y = 0
-                                self.on_ground = True
-                            elif self.vel_y < 0:
-                                self.y = tile_rect.bottom
-                                self.vel_y = 0
-
-            # Check if in water
-            in_water = False
-            for tx in range(start_tx, end_tx):
-                for ty in range(start_ty, end_ty):
-                    tile = world.get_tile(tx, ty)
-                    if tile is not None and tile.kind == "water":
-                        in_water = True
-                        break
-                if in_water:
-                    break
-            if in_water:
-                self.on_ground = False
-                if keys[p.K_SPACE]:
-                    self.vel_y = -1.5
-                else:
-                    self.vel_y = min(self.vel_y + 0.2, 1.5)
-            if self.on_ground and keys[p.K_SPACE]:
-                self.vel_y = -10
-                self.on_ground = False
-
-            # Update animation
-            if dx != 0:
-                self.walking = True
-                self.animation_counter += 1
-                if self.animation_counter >= self.animation_speed:
-                    self.animation_counter = 0
-                    self.animation_index = (self.animation_index + 1) % len(self.animation_frames[self.direction])
-                    self.current_image = self.animation_frames[self.direction][self.animation_index]
-            else:
-                self.walking = False
-                self.current_image = side_right if self.direction == "right" else side_left
-
-    def draw(self, camera_x, camera_y):
-        screen.blit(self.current_image, (self.x - camera_x, self.y - camera_y))
-
-#-------------------------------------------------------------------------------------------------------------------------------------------------
-class Soul:
-    def __init__(self, img, x, y):
-        self.x = x
-        self.y = y
-        self.image = img
-
-    def draw(self, screen, x, y):
-        '''if self.image:
-            screen.blit(self.image, (x, y))
-        else:'''
-        p.draw.rect(screen, (67, 173, 162), p.Rect(x, y, tile_size, tile_size))
-#-------------------------------------------------------------------------------------------------------------------------------------------------
-class Mountain:
-    def __init__(self, image, image_id, x, y=GROUND_LEVEL, parallax=0.3):
-        self.image = image
-        self.image_id = image_id
-        self.x = x
-        self.y = y
-        self.parallax = parallax
-
-    def draw(self, screen, camera_x, camera_y):
-        draw_x = self.x - camera_x * self.parallax
-        ground_screen_y = GROUND_LEVEL * tile_size - camera_y
-        draw_y = ground_screen_y - self.image.get_height()
-        screen.blit(self.image, (draw_x, draw_y))
-
-#-------------------------------------------------------------------------------------------------------------------------------------------------
-class Cloud:
-    def __init__(self, images):
-        self.original_image = random.choice(images)
-        self.scale = random.uniform(1.5, 2.5)
-        self.image = p.transform.rotozoom(self.original_image, 0, self.scale)
-        self.x = random.randint(0, w)
-        self.y = random.randint(-300, 50)
-        self.speed = random.uniform(0.2, 1.0)
-
-    def update(self):
-        self.x += self.speed
-        if self.x > w:
-            self.x = -self.image.get_width()
-            self.y = random.randint(-300, 50)
-
-    def draw(self, screen, camera_x, camera_y):
-        screen.blit(self.image, (self.x - camera_x, self.y - camera_y))
+        pending_from_json(fg_world, meta.get("pending_structures", []))
+    if world_dir:
+        # Only the foreground can be edited; the background wall is always the default terrain.
+        fg_world.storage = RegionStore(os.path.join(world_dir, "foreground"))
+    elif chunk_budget is not None:
+        fg_world.storage = RegionStore(tempfile.mkdtemp(prefix="open-world-spill-"), temporary=True)
+    return fg_world, bg_world, meta
+
+def save_world(world_dir, fg_world, meta, player):
+    """Saves the chunks changed since the last save and world.json (seed, player position, queued structures)."""
+    start = time.perf_counter()
+    chunks, written = fg_world.save()
+    meta["player"] = [player.x, player.y]
+    meta["pending_structures"] = pending_to_json(fg_world)
+    write_meta(world_dir, meta)
+    print(f"Saved {chunks} chunks ({written} bytes) in {(time.perf_counter() - start) * 1000.0:.1f} ms")
 
 #-------------------------------------------------------------------------------------------------------------------------------------------------
-def pop_inventory():
-    pass
-
-# --- Initialize Mountains and Clouds ----------------------------------------------------------------------------------------------------------------------------------------------------
-mountain_images_raw = [
-    load_bg_image("mountain1.png"),
-    load_bg_image("mountain2.png"),
-    load_bg_image("mountain3.png")
-]
-mountain_images = [img for img in mountain_images_raw if img is not None]
-cloud_images = [
-    load_bg_image("cloud1.png"),
-    load_bg_image("cloud2.png"),
-    load_bg_image("cloud3.png")
-]
-cloud_images = [img for img in cloud_images if img is not None]
-
-mountains = []
-container_width = w * 2
-x_offset = 0
-prev_idx = None
-grass_y = GROUND_LEVEL * tile_size
-while x_offset < container_width:
-    possible_indices = list(range(len(mountain_images)))
-    if prev_idx is not None:
-        possible_indices = [i for i in possible_indices if i != prev_idx]
-    if not possible_indices:
-        possible_indices = list(range(len(mountain_images)))
-    idx = random.choice(possible_indices)
-    image = mountain_images[idx]
-    if image:
-        scaled_img = p.transform.scale(image, (int(image.get_width() * MOUNTAIN_SCALE), int(image.get_height() * MOUNTAIN_SCALE)))
-        y_pos = grass_y - scaled_img.get_height()
-        mountain = Mountain(scaled_img, idx, x_offset, y_pos, parallax=0.3)
-        mountains.append(mountain)
-        prev_idx = idx
-        x_offset += scaled_img.get_width()
-
-clouds = [Cloud(cloud_images) for _ in range(12)]
-
-soul_y = 0
-soul_spacing = tile_size
-
-soul_positions = [(0, soul_y + i * soul_spacing) for i in range(soul_count)]
-
-# --- Main Game Loop ----------------------------------------------------------------------------------------------------------------------------------------------------
-spawn_y = (GROUND_LEVEL - 2) * tile_size
-player = Player(0, spawn_y)
-clock = p.time.Clock()
-camera_x = 0
-camera_y = 0
-camera_margin = 200
-
-soul_image = load_texture("soul.png") or p.Surface((tile_size, tile_size))
-soul_image.fill((67, 173, 162))  # fallback
-souls = [Soul(lambda: soul_image, 0, 0) for _ in range(soul_count)]
-
-inventory_open = False
-while True:
-# Keys-------------------------------------------------------------------------------------------------------------------------------------------------
-    for event in p.event.get():
-        if event.type == p.QUIT:
-            p.quit()
-            sys.exit()
-        if event.type == p.KEYDOWN:
-            if event.key == p.K_f:
-                player.fly_mode = not player.fly_mode
-                print("Fly mode:", player.fly_mode)
-            elif event.key == p.K_e:
-                inventory_open = not inventory_open
-                print("Inventory open")
-                pop_inventory()
-        if event.type == p.MOUSEBUTTONDOWN:
-            mx, my = p.mouse.get_pos()
-            tx = (mx + camera_x) // tile_size
-            ty = (my + camera_y) // tile_size
-            if event.button == 1:
-                fg_world.remove_tile(tx, ty)
-            elif event.button == 3:
-                fg_world.add_tile(tx, ty, "dirt")
-    
-    keys = p.key.get_pressed()
-    player.update(fg_world, keys)
-
-# Camera and paralax-------------------------------------------------------------------------------------------------------------------------------------------------
+def follow_camera(player, camera_x, camera_y):
     if player.x - camera_x < camera_margin:
         camera_x = player.x - camera_margin
     elif player.x - camera_x > w - camera_margin - player.width:
@@ -522,65 +129,290 @@ while True:
         camera_y = player.y - camera_margin
     elif player.y - camera_y > h - camera_margin - player.height:
         camera_y = player.y - (h - camera_margin - player.height)
-    
-    update_water_flow(fg_world)
-    
-    screen.fill(sky)
-    
-    effective_cam = camera_x * 0.3
-    while mountains and (mountains[-1].x + mountains[-1].image.get_width() < effective_cam + w):
-        prev_idx = mountains[-1].image_id
-        possible_indices = [i for i in range(len(mountain_images)) if i != prev_idx]
-        if not possible_indices:
-            possible_indices = list(range(len(mountain_images)))
-        new_idx = random.choice(possible_indices)
-        new_img = mountain_images[new_idx]
-        new_scaled_img = p.transform.scale(new_img, (int(new_img.get_width() * MOUNTAIN_SCALE), int(new_img.get_height() * MOUNTAIN_SCALE)))
-        new_x = mountains[-1].x + mountains[-1].image.get_width()
-        new_mountain = Mountain(new_scaled_img, new_idx, new_x, grass_y - new_scaled_img.get_height(), parallax=0.3)
-        mountains.append(new_mountain)
-#-------------------------------------------------------------------------------------------------------------------------------------------------
-    while mountains and (mountains[0].x > effective_cam):
-        prev_idx = mountains[0].image_id
-        possible_indices = [i for i in range(len(mountain_images)) if i != prev_idx]
-        if not possible_indices:
-            possible_indices = list(range(len(mountain_images)))
-        new_idx = random.choice(possible_indices)
-        new_img = mountain_images[new_idx]
-        new_scaled_img = p.transform.scale(new_img, (int(new_img.get_width() * MOUNTAIN_SCALE), int(new_img.get_height() * MOUNTAIN_SCALE)))
-        new_x = mountains[0].x - new_scaled_img.get_width()
-        new_mountain = Mountain(new_scaled_img, new_idx, new_x, grass_y - new_scaled_img.get_height(), parallax=0.3)
-        mountains.insert(0, new_mountain)
-#-------------------------------------------------------------------------------------------------------------------------------------------------
-    while mountains and (mountains[0].x + mountains[0].image.get_width() < effective_cam - w):
-        mountains.pop(0)
-    while mountains and (mountains[-1].x > effective_cam + 2 * w):
-        mountains.pop()
-    for mountain in mountains:
-        mountain.draw(screen, camera_x, camera_y)
-        
-    for cloud in clouds:
-        cloud.update()
-        cloud.draw(screen, camera_x, camera_y)
-
-    for i, (soul_x, soul_y) in enumerate(soul_positions):
-        souls[i].draw(screen, soul_y, soul_x)
-
-    fg_world.draw(camera_x, camera_y)
-    start_x = math.floor(camera_x / tile_size)
-    end_x = math.floor((camera_x + w) / tile_size) + 1
-    start_y = max(math.floor(camera_y / tile_size), GROUND_LEVEL)
-    end_y = math.floor((camera_y + h) / tile_size) + 1
-    cave_stone_tile = Tile("cave_stone")
-    for tx in range(start_x, end_x):
-        for ty in range(start_y, end_y):
-            if (tx, ty) in fg_world.modifications and fg_world.modifications[(tx, ty)] is None:
-                cave_stone_tile.draw(screen, tx * tile_size, ty * tile_size, camera_x, camera_y)
+    return camera_x, camera_y
+
+# --- Headless Simulation ----------------------------------------------------------------------------------------------------------------------------------------------------
+def run_headless(frames, water_workers=1, profile_out=None, world_dir=None, seed=None, chunk_budget=None):
+    """
+    Runs the simulation (player physics, camera and water) for a number of frames as fast as
+    possible, without a window, textures or rendering. Returns a summary of the run.
+    """
+    fg_world, bg_world, meta = open_world(world_dir, seed, chunk_budget)
+    water = WaterSimulation(fg_world, workers=water_workers)
+    player = Player(*meta.get("player", (0, (GROUND_LEVEL - 2) * tile_size)))
+    keys = ScriptedKeys()
+    profiler = FrameProfiler(HEADLESS_PHASES, ("water_active",))
+    camera_x = 0
+    camera_y = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        profiler.begin_frame()
+        keys.advance()
+        player.update(fg_world, keys)
+        profiler.mark("player")
+        camera_x, camera_y = follow_camera(player, camera_x, camera_y)
+        profiler.mark("camera")
+        water.update(HEADLESS_DT)
+        profiler.mark("water")
+        profiler.count("water_active", water.active_count())
+        fg_world.trim()
+        profiler.end_frame()
+    elapsed = time.perf_counter() - start
+    water.close()
+    if profile_out:
+        profiler.export(profile_out)
+    if world_dir:
+        save_world(world_dir, fg_world, meta, player)
+    cache = fg_world.cache_stats()
+    if fg_world.storage is not None:
+        fg_world.storage.close()
+    return {
+        "seed": fg_world.seed,
+        "frames": frames,
+        "seconds": elapsed,
+        "frames_per_second": frames / elapsed if elapsed > 0 else float("inf"),
+        "water_ticks": water.ticks,
+        "water_cells_queued": water.active_count(),
+        "chunks": len(fg_world.chunks),
+        "chunk_cache": cache,
+        "player": (player.x, player.y),
+    }
+
+# --- Main Game Loop ----------------------------------------------------------------------------------------------------------------------------------------------------
+def run_game(water_workers=1, profile_out=None, world_dir=None, seed=None, gen_workers=2, chunk_budget=None, dirty_rects=False,
+             composite_mountains=False):
+    p.init()
+    screen = p.display.set_mode((w, h))
+    p.display.set_caption("Open World Game")
+    load_textures()
+    load_player_images()
+
+    fg_world, bg_world, meta = open_world(world_dir, seed, chunk_budget)
+    # Water runs at its own tick rate and only simulates water that is still moving.
+    water = WaterSimulation(fg_world, workers=water_workers)
+    # New chunks are generated by background workers ahead of the player (gen_workers=0: on the spot when needed).
+    streamer = ChunkStreamer(fg_world, (w, h), workers=gen_workers) if gen_workers > 0 else None
+    # The tiles on screen are kept between frames; only what scrolled into view or changed is redrawn.
+    world_layer = WorldLayer([bg_world, fg_world], (w, h))
+    dirty = DirtyRegions((w, h), enabled=dirty_rects)
+
+    # Initialize Mountains and Clouds
+    mountain_images_raw = [
+        load_bg_image("mountain1.png"),
+        load_bg_image("mountain2.png"),
+        load_bg_image("mountain3.png")
+    ]
+    mountain_images = [img for img in mountain_images_raw if img is not None]
+    cloud_images = [
+        load_bg_image("cloud1.png"),
+        load_bg_image("cloud2.png"),
+        load_bg_image("cloud3.png")
+    ]
+    cloud_images = [img for img in cloud_images if img is not None]
+
+    mountains = MountainRange(mountain_images, w, composite=composite_mountains)
+
+    clouds = CloudLayer(cloud_images, (w, h))
+
+
+    spawn_y = (GROUND_LEVEL - 2) * tile_size
+    player = Player(*meta.get("player", (0, spawn_y)))
+    clock = p.time.Clock()
+    camera_x = 0
+    camera_y = 0
+    last_camera = None
+
+    # Mobs, dropped items and the souls along the top of the screen, and the debris of broken tiles.
+    entities = Entities(ENTITY_CAPACITY, max_count=ENTITY_CAPACITY)
+    for i in range(soul_count):
+        entities.spawn("soul", i * tile_size, 0)
+    particles = Particles(seed=random.getrandbits(32))
+
+    profiler = FrameProfiler(FRAME_PHASES, FRAME_COUNTERS)
+    profiler.watch_gc()
+    inventory_open = False
+    dt = 0.0
+    while True:
+        profiler.begin_frame()
+    # Keys-------------------------------------------------------------------------------------------------------------------------------------------------
+        for event in p.event.get():
+            if event.type == p.QUIT:
+                water.close()
+                if streamer is not None:
+                    streamer.close()
+                if profile_out:
+                    profiler.export(profile_out)
+                if world_dir:
+                    save_world(world_dir, fg_world, meta, player)
+                if fg_world.storage is not None:
+                    fg_world.storage.close()
+                p.quit()
+                sys.exit()
+            if event.type == p.VIDEOEXPOSE:
+                dirty.invalidate()
+            if event.type == p.KEYDOWN:
+                if event.key == p.K_f:
+                    player.fly_mode = not player.fly_mode
+                    print("Fly mode:", player.fly_mode)
+                elif event.key == p.K_e:
+                    inventory_open = not inventory_open
+                    print("Inventory open")
+                    pop_inventory()
+                elif event.key == p.K_F3:
+                    profiler.toggle_overlay()
+                elif event.key == p.K_F4:
+                    profiler.export_csv(PROFILE_EXPORT + ".csv")
+                    profiler.export_json(PROFILE_EXPORT + ".json")
+                    print(f"Profile written to {PROFILE_EXPORT}.csv / {PROFILE_EXPORT}.json")
+                elif event.key == p.K_F5 and world_dir:
+                    save_world(world_dir, fg_world, meta, player)
+            if event.type == p.MOUSEBUTTONDOWN:
+                mx, my = p.mouse.get_pos()
+                # The camera can be between pixels (it follows jumps and falls); tile coordinates are ints.
+                tx = int((mx + camera_x) // tile_size)
+                ty = int((my + camera_y) // tile_size)
+                if event.button == 1:
+                    tile = fg_world.remove_tile(tx, ty)
+                    if tile is not None:
+                        # The tile breaks into debris and drops as an item to pick up.
+                        particles.burst((tx + 0.5) * tile_size, (ty + 0.5) * tile_size, tile.id)
+                        entities.spawn("drop", (tx + 0.5) * tile_size - 6, (ty + 0.5) * tile_size - 6,
+                                       vx=random.uniform(-1.0, 1.0), vy=-3.0, data=tile.id)
+                elif event.button == 3:
+                    fg_world.add_tile(tx, ty, "dirt")
+            if event.type == p.KEYDOWN and event.key == p.K_m:
+                # Spawns a mob under the mouse.
+                mx, my = p.mouse.get_pos()
+                entities.spawn("mob", mx + camera_x, my + camera_y, vx=random.choice((-1.0, 1.0)))
+            if event.type == p.KEYDOWN and event.key == p.K_t:
+                # Plants a tree on the tile under the mouse. Its parts in chunks that are not loaded
+                # yet are queued and stamped when those chunks load (see World.place_structure).
+                mx, my = p.mouse.get_pos()
+                fg_world.place_structure(random.choice(list(TREES.values())),
+                                         int((mx + camera_x) // tile_size), int((my + camera_y) // tile_size))
+
+        profiler.mark("input")
+        keys = p.key.get_pressed()
+        player.update(fg_world, keys)
+        profiler.mark("player")
+        entities.update(fg_world)
+        player.collect(entities)
+        particles.update()
+        profiler.count("entities", entities.simulated)
+        profiler.count("particles", len(particles))
+        profiler.count("entity_allocations", entities.allocations)
+        profiler.mark("entities")
+
+    # Camera and paralax-------------------------------------------------------------------------------------------------------------------------------------------------
+        camera_x, camera_y = follow_camera(player, camera_x, camera_y)
+        profiler.mark("camera")
+
+        if streamer is not None:
+            streamer.update(player.x, player.y, camera_x, camera_y, dt)
+            profiler.count("chunks_pending", streamer.pending_count())
+        fg_world.trim()
+        bg_world.trim()
+        profiler.mark("chunks")
+
+        water.update(dt)
+        profiler.mark("water")
+
+        # The updates come first, since the dirty regions have to be known before anything is drawn;
+        # each is charged to the phase of its draw pass below (mark() adds up within a frame).
+        mountains.update(camera_x)
+        profiler.mark("mountains")
+        clouds.update(camera_x)
+        profiler.mark("clouds")
+
+        # Only what changed is drawn and presented, unless the camera moved (or dirty_rects is off).
+        world_rects = world_layer.update(camera_x, camera_y)
+        if (camera_x, camera_y) != last_camera:
+            dirty.invalidate()
+        last_camera = (camera_x, camera_y)
+        for rect in world_rects:
+            dirty.add(rect)
+        for rect in entities.dirty_rects(camera_x, camera_y, w, h):
+            dirty.add(rect)
+        rect = particles.dirty_rect(camera_x, camera_y)
+        if rect is not None:
+            dirty.add(rect)
+        visible_clouds = set(clouds.visible(camera_x, camera_y))
+        for cloud in clouds:
+            dirty.sprite(cloud, cloud.screen_rect(camera_x, camera_y) if cloud in visible_clouds else None)
+        dirty.sprite(player, player.screen_rect(camera_x, camera_y), player.current_frame)
+        dirty.sprite(profiler, profiler.overlay_rect(screen), profiler.overlay_surface)
+        regions = dirty.regions()
+        profiler.mark("world")
+
+        for _ in clipped(screen, regions):
+            screen.fill(sky)
+            mountains.draw(screen, camera_x, camera_y)
+        profiler.mark("mountains")
+
+        for _ in clipped(screen, regions):
+            clouds.draw(screen, camera_x, camera_y)
+        profiler.mark("clouds")
+
+        # The background wall shows through wherever the foreground has been dug out.
+        for _ in clipped(screen, regions):
+            screen.blit(world_layer.surface, (0, 0))
+        profiler.mark("world")
+
+        for _ in clipped(screen, regions):
+            entities.draw(screen, camera_x, camera_y)
+            particles.draw(screen, camera_x, camera_y)
+        profiler.mark("entity_draw")
+    #-------------------------------------------------------------------------------------------------------------------------------------------------
+        for _ in clipped(screen, regions):
+            player.draw(camera_x, camera_y)
+        profiler.mark("player_draw")
+
+        profiler.count("tile_draws", bg_world.tiles_drawn + fg_world.tiles_drawn)
+        profiler.count("chunk_blits", bg_world.chunks_drawn + fg_world.chunks_drawn)
+        profiler.count("layer_pixels", world_layer.pixels_drawn)
+        profiler.count("presented_pixels", dirty.presented_pixels)
+        profiler.count("water_active", water.active_count())
+        for _ in clipped(screen, regions):
+            profiler.draw_overlay(screen)
+        profiler.mark("hud")
+
+        dirty.present()
+        profiler.mark("flip")
+        dt = clock.tick(60) / 1000.0
+        profiler.mark("wait")
+        profiler.end_frame()
+
 #-------------------------------------------------------------------------------------------------------------------------------------------------
-    player.draw(camera_x, camera_y)
-    
-    p.display.flip()
-    clock.tick(60)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Open World Game")
+    parser.add_argument("--headless", action="store_true", help="run the simulation without a window or rendering, as fast as possible")
+    parser.add_argument("--frames", type=int, default=3600, help="frames to simulate in headless mode")
+    parser.add_argument("--seed", type=int, help="seed for world generation")
+    parser.add_argument("--world", help="directory of the saved world: opened if it exists, saved on exit and with F5")
+    parser.add_argument("--water-workers", type=int, default=1, help="worker processes for large water simulations")
+    parser.add_argument("--gen-workers", type=int, default=2, help="worker processes generating chunks ahead of the player (0: generate on the spot)")
+    parser.add_argument("--chunk-budget", type=float, default=CHUNK_BUDGET_MB, help="memory budget of the loaded chunks of each layer in MB (0: unlimited)")
+    parser.add_argument("--dirty-rects", action="store_true", help="draw and present only the parts of the screen that changed while the camera stands still")
+    parser.add_argument("--composite-mountains", action="store_true", help="keep the mountain strip pre-drawn as one surface")
+    parser.add_argument("--profile-out", help="on exit, write the frame profile to this .csv or .json file")
+    args = parser.parse_args(argv)
+    chunk_budget = int(args.chunk_budget * 1024 * 1024) if args.chunk_budget > 0 else None
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.headless:
+        # No window: anything that still touches the display gets SDL's dummy driver.
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        summary = run_headless(args.frames, water_workers=args.water_workers, profile_out=args.profile_out,
+                               world_dir=args.world, seed=args.seed, chunk_budget=chunk_budget)
+        for key, value in summary.items():
+            print(f"{key}: {value}")
+    else:
+        run_game(water_workers=args.water_workers, profile_out=args.profile_out, world_dir=args.world, seed=args.seed,
+                 gen_workers=args.gen_workers, chunk_budget=chunk_budget, dirty_rects=args.dirty_rects,
+                 composite_mountains=args.composite_mountains)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
 
 """
 experience TODO:
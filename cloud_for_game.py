@@ -1,22 +1,85 @@
 import pygame as p
 import random
 
-w, h = 800, 600
+CLOUD_COUNT = 16
+CLOUD_SCALES = (1.5, 2.5)
+# Cloud scales are rounded to this step, so a few scaled copies of each image serve every cloud.
+SCALE_STEP = 0.25
 
 class Cloud:
-    def __init__(self, images):
-        self.original_image = random.choice(images)
-        self.scale = random.uniform(1.5, 2.5)
-        self.image = p.transform.rotozoom(self.original_image, 0, self.scale)
-        self.x = random.randint(0, w)
-        self.y = random.randint(-300, 50)
-        self.speed = random.uniform(0.2, 1.0)
-
-    def update(self):
-        self.x += self.speed
-        if self.x > w:
-            self.x = -self.image.get_width()
-            self.y = random.randint(-300, 50)
+    def __init__(self, image, x, y, speed):
+        self.image = image
+        self.x = x
+        self.y = y
+        self.speed = speed
+
+    def screen_rect(self, camera_x, camera_y):
+        return p.Rect((self.x - camera_x, self.y - camera_y), self.image.get_size())
+
+    def draw(self, screen, camera_x, camera_y):
+        screen.blit(self.image, (self.x - camera_x, self.y - camera_y))
+
+#--------------------------------------------------------------------------------------------------------------------
+class CloudLayer:
+    """
+    Clouds drifting right across the sky, in world coordinates. They are kept within half a view
+    to either side of the camera: a cloud that drifts (or is left) past one end of that band comes
+    back off screen at the other end at a new height, so the sky stays populated wherever the
+    camera goes.
+    The scaled images are cached by (image, scale rounded to SCALE_STEP), made once and RLE
+    accelerated; draw() skips the clouds off screen and blits the others in one Surface.blits call.
+    """
+    def __init__(self, images, view_size, count=CLOUD_COUNT, camera_x=0):
+        self.images = images
+        self.width, self.height = view_size
+        self.margin = self.width // 2
+        self.sprites = {}
+        self.clouds = []
+        if images:
+            for _ in range(count):
+                index = random.randrange(len(images))
+                scale = random.uniform(*CLOUD_SCALES)
+                x = random.uniform(camera_x - self.margin, camera_x + self.width + self.margin)
+                self.clouds.append(Cloud(self.sprite(index, scale), x, random.randint(-300, 50), random.uniform(0.2, 1.0)))
+
+    def __iter__(self):
+        return iter(self.clouds)
+
+    def __len__(self):
+        return len(self.clouds)
+
+    def sprite(self, index, scale):
+        """Image index scaled by scale (to the nearest SCALE_STEP), cached."""
+        key = (index, round(scale / SCALE_STEP))
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = p.transform.rotozoom(self.images[index], 0, key[1] * SCALE_STEP)
+            # Run-length encoded, the transparent parts around a cloud are skipped instead of
+            # blended: about five times faster to blit, within one level of the plain blend.
+            sprite.set_alpha(255, p.RLEACCEL)
+            self.sprites[key] = sprite
+        return sprite
+
+    def update(self, camera_x):
+        left = camera_x - self.margin
+        right = camera_x + self.width + self.margin
+        for cloud in self.clouds:
+            cloud.x += cloud.speed
+            # Clouds come back anywhere in the margin off the other side of the screen, so clouds
+            # that leave together (a fast pan) do not come back in a clump.
+            if cloud.x > right:
+                cloud.x = random.uniform(left, camera_x) - cloud.image.get_width()
+                cloud.y = random.randint(-300, 50)
+            elif cloud.x + cloud.image.get_width() < left:
+                cloud.x = random.uniform(camera_x + self.width, right)
+                cloud.y = random.randint(-300, 50)
+
+    def visible(self, camera_x, camera_y):
+        """The clouds that overlap the view."""
+        return [cloud for cloud in self.clouds
+                if cloud.x - camera_x < self.width and cloud.x - camera_x + cloud.image.get_width() > 0
+                and cloud.y - camera_y < self.height and cloud.y - camera_y + cloud.image.get_height() > 0]
 
     def draw(self, screen, camera_x, camera_y):
-        screen.blit(self.image, (self.x - camera_x, self.y - camera_y))
\ No newline at end of file
+        screen.blits([(cloud.image, (cloud.x - camera_x, cloud.y - camera_y)) for cloud in self.visible(camera_x, camera_y)],
+                     doreturn=False)
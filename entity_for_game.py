@@ -0,0 +1,365 @@
+import pygame as p
+import numpy as np
+from tile_for_game import tile_size, SOLID, TILE_TYPES, atlas_areas, get_atlas
+from spatial_for_game import SpatialHash, NO_CELL, cell_keys
+
+# Entity kind flags.
+COLLIDES = 1    # stopped by solid tiles
+WALKS = 2       # walks at its kind's speed and turns around at walls
+SLIDES = 4      # slows down by friction while on the ground (dropped items)
+SCREEN = 8      # positioned in screen coordinates and never simulated (HUD souls)
+
+# Speeds are in pixels per frame, like Player.update. Nothing moves more than a tile per frame,
+# so the tile collision (which only looks at where an entity ends up) cannot skip a wall.
+MAX_SPEED = tile_size - 1
+GROUND_FRICTION = 0.8
+
+#--------------------------------------------------------------------------------------------------------------------
+class EntityKind:
+    """A registered entity kind (see register_kind); entities only store its integer id."""
+    __slots__ = ("id", "name", "width", "height", "gravity", "speed", "flags", "color")
+
+    def __init__(self, kind_id, name, width, height, gravity, speed, flags, color):
+        self.id = kind_id
+        self.name = name
+        self.width = width
+        self.height = height
+        self.gravity = gravity
+        self.speed = speed
+        self.flags = flags
+        self.color = color
+
+    def __repr__(self):
+        return f"EntityKind({self.name!r})"
+
+# Kind registry, id -> kind, plus the per-kind columns update() indexes with the kind array.
+ENTITY_KINDS = [None]
+ENTITY_IDS = {}
+KIND_WIDTH = np.zeros(1)
+KIND_HEIGHT = np.zeros(1)
+KIND_GRAVITY = np.zeros(1)
+KIND_SPEED = np.zeros(1)
+KIND_FLAGS = np.zeros(1, dtype=np.uint8)
+
+def register_kind(name, width, height, gravity, speed, flags, color):
+    global KIND_WIDTH, KIND_HEIGHT, KIND_GRAVITY, KIND_SPEED, KIND_FLAGS
+    if name in ENTITY_IDS:
+        raise ValueError(f"Entity kind already registered: {name}")
+    kind = EntityKind(len(ENTITY_KINDS), name, width, height, gravity, speed, flags, color)
+    ENTITY_KINDS.append(kind)
+    ENTITY_IDS[name] = kind.id
+    KIND_WIDTH = np.append(KIND_WIDTH, width)
+    KIND_HEIGHT = np.append(KIND_HEIGHT, height)
+    KIND_GRAVITY = np.append(KIND_GRAVITY, gravity)
+    KIND_SPEED = np.append(KIND_SPEED, speed)
+    KIND_FLAGS = np.append(KIND_FLAGS, np.uint8(flags))
+    return kind
+
+register_kind("mob", 24, 32, 0.5, 1.5, COLLIDES | WALKS, (150, 40, 40))
+register_kind("drop", 12, 12, 0.5, 0.0, COLLIDES | SLIDES, (200, 200, 200))
+register_kind("soul", tile_size, tile_size, 0.0, 0.0, SCREEN, (67, 173, 162))
+
+#--------------------------------------------------------------------------------------------------------------------
+# Sprites by (kind id, data): drops show a small copy of their tile (data is the tile id), the
+# other kinds a block of their color until they get images.
+sprites = {}
+
+def entity_sprite(kind_id, data):
+    key = (kind_id, data if kind_id == ENTITY_IDS["drop"] else 0)
+    sprite = sprites.get(key)
+    if sprite is None:
+        kind = ENTITY_KINDS[kind_id]
+        size = (kind.width, kind.height)
+        if key[1] and TILE_TYPES[key[1]] is not None:
+            sprite = p.transform.scale(get_atlas().subsurface(atlas_areas[key[1]]), size)
+        else:
+            sprite = p.Surface(size)
+            sprite.fill(kind.color)
+        sprites[key] = sprite
+    return sprite
+
+class Entities:
+    """
+    Every mob, dropped item and soul, as a struct of arrays: entity i is x[i], y[i] (its top-left
+    corner in pixels), vx[i], vy[i], kind[i] (an ENTITY_KINDS id), data[i] (kind specific: the tile
+    id of a drop) and on_ground[i], for i < count. The arrays grow by doubling, up to max_count
+    if given (spawn then refuses new entities); remove() moves the last entities into the freed
+    indices, so indices only hold until the next remove, and the slots are used again by the next
+    spawns. allocations counts the times the arrays had to grow.
+    grid is a SpatialHash of the world entities, kept up to date by spawn, update and remove;
+    query_box, query_radius and nearest answer "what is near here" from it instead of scanning
+    every entity.
+    update() moves all of them at once with array operations: gravity, integration and collision
+    against the world's solid tiles, one axis at a time like Player.update. The tiles an entity
+    touches are tested at sample points spaced at most a tile apart along its leading edge, in one
+    World.tile_flags call per axis. Entities whose chunk is not loaded stay frozen until it is.
+    """
+    def __init__(self, capacity=64, max_count=None):
+        self.count = 0
+        self.max_count = max_count
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.data = np.zeros(capacity, dtype=np.int32)
+        self.on_ground = np.zeros(capacity, dtype=bool)
+        # Positions before the last update, for dirty rectangles.
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.grid = SpatialHash(capacity=capacity)
+        # World boxes (left, top, right, bottom) of the entities removed since the last dirty_rects call.
+        self.removed_boxes = []
+        # Statistics: entities simulated by the last update, array growths and refused spawns.
+        self.simulated = 0
+        self.allocations = 0
+        self.refused = 0
+
+    def __len__(self):
+        return self.count
+
+    def grow(self, capacity):
+        self.allocations += 1
+        for name in ("x", "y", "vx", "vy", "kind", "data", "on_ground", "prev_x", "prev_y"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, kind, x, y, vx=0.0, vy=0.0, data=0):
+        """Adds an entity of kind (a name or an id) and returns its index (None if there are max_count already)."""
+        if self.count == self.max_count:
+            self.refused += 1
+            return None
+        if self.count == len(self.x):
+            self.grow(2 * len(self.x) if self.max_count is None else min(2 * len(self.x), self.max_count))
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.kind[i] = ENTITY_IDS[kind] if isinstance(kind, str) else kind
+        self.data[i] = data
+        self.on_ground[i] = False
+        self.count += 1
+        self.grid.set_cells([i], self.cell_keys(np.array([i])))
+        return i
+
+    def remove(self, indices):
+        """Removes the entities at indices (an index, a sequence or a boolean mask over count)."""
+        removed = np.zeros(self.count, dtype=bool)
+        removed[indices] = True
+        kept = self.count - int(np.count_nonzero(removed))
+        # The survivors past the new count fill the freed indices below it.
+        holes = np.nonzero(removed[:kept])[0]
+        movers = np.nonzero(~removed[kept:])[0] + kept
+        gone = np.nonzero(removed)[0]
+        kind = self.kind[gone]
+        self.removed_boxes.extend(zip(np.minimum(self.x[gone], self.prev_x[gone]).tolist(),
+                                      np.minimum(self.y[gone], self.prev_y[gone]).tolist(),
+                                      (np.maximum(self.x[gone], self.prev_x[gone]) + KIND_WIDTH[kind]).tolist(),
+                                      (np.maximum(self.y[gone], self.prev_y[gone]) + KIND_HEIGHT[kind]).tolist()))
+        self.grid.set_cells(gone, np.full(len(gone), NO_CELL, dtype=np.int64))
+        self.grid.move_items(movers, holes)
+        for name in ("x", "y", "vx", "vy", "kind", "data", "on_ground", "prev_x", "prev_y"):
+            array = getattr(self, name)
+            array[holes] = array[movers]
+        self.count = kept
+
+    def cell_keys(self, index):
+        """Grid cells of the entities at index (NO_CELL for screen entities)."""
+        keys = cell_keys(self.x[index], self.y[index], self.grid.cell_size)
+        keys[(KIND_FLAGS[self.kind[index]] & SCREEN) != 0] = NO_CELL
+        return keys
+
+    def update(self, world):
+        """Advances every entity whose chunk is loaded by one frame."""
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        if n == 0:
+            self.simulated = 0
+            return
+        kind = self.kind[:n]
+        flags = KIND_FLAGS[kind]
+        width = KIND_WIDTH[kind]
+        height = KIND_HEIGHT[kind]
+        x = self.x[:n]
+        y = self.y[:n]
+        active = (flags & SCREEN) == 0
+        active[active] = world.resident_mask(np.floor((x[active] + width[active] / 2) / tile_size).astype(np.int64),
+                                             np.floor((y[active] + height[active] / 2) / tile_size).astype(np.int64))
+        index = np.nonzero(active)[0]
+        self.simulated = len(index)
+        if not len(index):
+            return
+        flags = flags[index]
+        width = width[index]
+        height = height[index]
+        walks = (flags & WALKS) != 0
+        vx = self.vx[index]
+        vx[walks] = np.where(vx[walks] < 0, -1.0, 1.0) * KIND_SPEED[kind[index][walks]]
+        vy = np.minimum(self.vy[index] + KIND_GRAVITY[kind[index]], MAX_SPEED)
+        vx = np.clip(vx, -MAX_SPEED, MAX_SPEED)
+        collides = (flags & COLLIDES) != 0
+        ex = x[index] + vx
+        ey = y[index]
+
+        # Horizontal: the column of the leading edge, at rows from the top to the bottom.
+        moving = collides & (vx != 0)
+        if moving.any():
+            m = np.nonzero(moving)[0]
+            edge = np.where(vx[m] > 0, np.ceil(ex[m] + width[m]) - 1, ex[m])
+            tx = np.floor(edge / tile_size).astype(np.int64)
+            ty = self.edge_samples(ey[m], height[m])
+            blocked = (world.tile_flags(np.broadcast_to(tx[:, None], ty.shape), ty) & SOLID).any(axis=1)
+            b = m[blocked]
+            ex[b] = np.where(vx[b] > 0, tx[blocked] * tile_size - width[b], (tx[blocked] + 1) * tile_size)
+            # Walkers turn around, anything else stops.
+            vx[b] = np.where(walks[b], -vx[b], 0.0)
+
+        # Vertical: the row of the leading edge, at columns from the left to the right side.
+        ey = ey + vy
+        on_ground = np.zeros(len(index), dtype=bool)
+        moving = collides & (vy != 0)
+        if moving.any():
+            m = np.nonzero(moving)[0]
+            edge = np.where(vy[m] > 0, np.ceil(ey[m] + height[m]) - 1, ey[m])
+            ty = np.floor(edge / tile_size).astype(np.int64)
+            tx = self.edge_samples(ex[m], width[m])
+            blocked = (world.tile_flags(tx, np.broadcast_to(ty[:, None], tx.shape)) & SOLID).any(axis=1)
+            b = m[blocked]
+            falling = vy[b] > 0
+            ey[b] = np.where(falling, ty[blocked] * tile_size - height[b], (ty[blocked] + 1) * tile_size)
+            on_ground[b[falling]] = True
+            vy[b] = 0.0
+
+        slides = on_ground & ((flags & SLIDES) != 0)
+        vx[slides] *= GROUND_FRICTION
+        vx[slides & (np.abs(vx) < 0.05)] = 0.0
+        self.x[index] = ex
+        self.y[index] = ey
+        self.vx[index] = vx
+        self.vy[index] = vy
+        self.on_ground[index] = on_ground
+        self.grid.set_cells(index, self.cell_keys(index))
+
+    @staticmethod
+    def edge_samples(start, length):
+        """
+        Tile coordinates along edges beginning at start (pixels) of the given lengths: one row of
+        samples per edge, spaced at most a tile apart from the first pixel the edge covers to the last.
+        """
+        first = np.floor(start)
+        last = np.ceil(start + length) - 1
+        steps = int(np.ceil((last - first).max() / tile_size))
+        samples = np.minimum(first[:, None] + np.arange(steps + 1)[None, :] * tile_size, last[:, None])
+        return np.floor(samples / tile_size).astype(np.int64)
+
+    #----------------------------------------------------------------------------------------------------------------
+    def query_box(self, left, top, right, bottom, kind=None):
+        """Indices of the world entities (of kind, a name, if given) overlapping the pixel box [left, right) x [top, bottom)."""
+        # Entities are in the cell of their top-left corner, so the ones that reach into the box
+        # from the left or from above are up to a kind size away.
+        index = self.grid.candidates(left - KIND_WIDTH.max(), top - KIND_HEIGHT.max(), right, bottom)
+        if not len(index):
+            return index
+        kinds = self.kind[index]
+        x = self.x[index]
+        y = self.y[index]
+        inside = (x < right) & (y < bottom) & (x + KIND_WIDTH[kinds] > left) & (y + KIND_HEIGHT[kinds] > top)
+        if kind is not None:
+            inside &= kinds == ENTITY_IDS[kind]
+        return index[inside]
+
+    def query_radius(self, cx, cy, radius, kind=None):
+        """Indices of the world entities (of kind, if given) whose box is within radius pixels of (cx, cy)."""
+        index = self.query_box(cx - radius, cy - radius, cx + radius, cy + radius, kind)
+        if not len(index):
+            return index
+        kinds = self.kind[index]
+        x = self.x[index]
+        y = self.y[index]
+        dx = np.clip(cx, x, x + KIND_WIDTH[kinds]) - cx
+        dy = np.clip(cy, y, y + KIND_HEIGHT[kinds]) - cy
+        return index[dx * dx + dy * dy <= radius * radius]
+
+    def nearest(self, cx, cy, k=1, kind=None, max_distance=None):
+        """
+        Indices of the k world entities (of kind, if given) whose centers are nearest to (cx, cy),
+        nearest first; fewer if there are not that many within max_distance. The search looks at
+        a box around the point that doubles in size until it holds k entities close enough to be
+        sure of them.
+        """
+        bounds = self.grid.bounds()
+        if bounds is None:
+            return np.zeros(0, dtype=np.int64)
+        # Past this radius the box holds every entity in the grid.
+        left, top, right, bottom = bounds
+        reach = max(cx - left, right - cx, cy - top, bottom - cy) + max(KIND_WIDTH.max(), KIND_HEIGHT.max())
+        radius = self.grid.cell_size / 2
+        while True:
+            if max_distance is not None:
+                radius = min(radius, max_distance)
+            index = self.query_box(cx - radius, cy - radius, cx + radius, cy + radius, kind)
+            kinds = self.kind[index]
+            dx = self.x[index] + KIND_WIDTH[kinds] / 2 - cx
+            dy = self.y[index] + KIND_HEIGHT[kinds] / 2 - cy
+            distance = dx * dx + dy * dy
+            # Only centers within radius are certain: one outside it may be beaten by one outside the box.
+            if radius < reach:
+                close = distance <= radius * radius
+            elif max_distance is None:
+                close = np.ones(len(index), dtype=bool)
+            else:
+                close = distance <= max_distance * max_distance
+            if np.count_nonzero(close) >= k or radius == max_distance or radius >= reach:
+                index = index[close]
+                order = np.argsort(distance[close], kind="stable")[:k]
+                return index[order]
+            radius *= 2
+
+    def visible(self, camera_x, camera_y, width, height):
+        """Indices of the entities that overlap a width x height screen at the camera position."""
+        n = self.count
+        kind = self.kind[:n]
+        screen = (KIND_FLAGS[kind] & SCREEN) != 0
+        sx = np.where(screen, self.x[:n], self.x[:n] - camera_x)
+        sy = np.where(screen, self.y[:n], self.y[:n] - camera_y)
+        inside = (sx < width) & (sy < height) & (sx + KIND_WIDTH[kind] > 0) & (sy + KIND_HEIGHT[kind] > 0)
+        return np.nonzero(inside)[0], sx, sy
+
+    def draw(self, screen, camera_x, camera_y):
+        """Blits the visible entities in one Surface.blits call."""
+        index, sx, sy = self.visible(camera_x, camera_y, *screen.get_size())
+        if not len(index):
+            return
+        screen.blits([(entity_sprite(k, d), (px, py)) for k, d, px, py in
+                      zip(self.kind[index].tolist(), self.data[index].tolist(), sx[index].tolist(), sy[index].tolist())], doreturn=False)
+
+    def dirty_rects(self, camera_x, camera_y, width, height):
+        """
+        Screen rects covering where the entities that moved in the last update were and are now,
+        and where the entities removed since the last call were.
+        """
+        n = self.count
+        moved = (self.x[:n] != self.prev_x[:n]) | (self.y[:n] != self.prev_y[:n])
+        index = np.nonzero(moved)[0]
+        kind = self.kind[index]
+        left = np.minimum(self.x[index], self.prev_x[index])
+        top = np.minimum(self.y[index], self.prev_y[index])
+        right = np.maximum(self.x[index], self.prev_x[index]) + KIND_WIDTH[kind]
+        bottom = np.maximum(self.y[index], self.prev_y[index]) + KIND_HEIGHT[kind]
+        if self.removed_boxes:
+            boxes = np.array(self.removed_boxes).T
+            self.removed_boxes = []
+            left, top, right, bottom = (np.concatenate((a, b)) for a, b in zip((left, top, right, bottom), boxes))
+        if not len(left):
+            return []
+        left = left - camera_x
+        top = top - camera_y
+        right = right - camera_x + 1
+        bottom = bottom - camera_y + 1
+        inside = (left < width) & (top < height) & (right > 0) & (bottom > 0)
+        return [p.Rect(l, t, r - l, b - t) for l, t, r, b in zip(np.floor(left[inside]).tolist(), np.floor(top[inside]).tolist(),
+                                                                 np.ceil(right[inside]).tolist(), np.ceil(bottom[inside]).tolist())]
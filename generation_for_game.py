@@ -0,0 +1,139 @@
+import random
+import numpy as np
+from collections import OrderedDict
+from tile_for_game import WATER_ID
+from terrain_for_game import generate_region
+from world_for_game import CHUNK_SHIFT, CHUNK_SIZE
+from tools_for_game import GROUND_LEVEL, carve_mask
+from structures_for_game import TREES, stamp_structure
+
+# Cave layers (same depths and sizes as tools_for_game.generate_caves_in_layer at startup).
+DIRT_CAVE_TOP = GROUND_LEVEL + 5
+DIRT_CAVE_BOTTOM = GROUND_LEVEL + 10
+STONE_CAVE_TOP = GROUND_LEVEL + 15
+STONE_CAVE_BOTTOM = GROUND_LEVEL + 24
+# Chance of a second dirt / stone cave in a chunk column (about one dirt cave per 20 columns and
+# one stone cave per 30, like the startup generation).
+EXTRA_DIRT_CAVE = 0.6
+EXTRA_STONE_CAVE = 0.07
+UPPER_CAVE_CHANCE = 0.2
+# Lakes: runs of at least LAKE_MIN_WIDTH open tiles on the row below the grass are flooded down to LAKE_BOTTOM.
+LAKE_TOP = GROUND_LEVEL + 1
+LAKE_BOTTOM = GROUND_LEVEL + 4
+LAKE_MIN_WIDTH = 5
+TREE_CHANCE = 0.1
+# Chunk columns whose features are cached (they are looked up again for every neighbour).
+FEATURE_CACHE_SIZE = 256
+
+#--------------------------------------------------------------------------------------------------------------------
+class ChunkGenerator:
+    """
+    Deterministic, on-demand generation of the foreground features (caves, lakes and trees), one
+    chunk at a time, as World.get_chunk needs chunks.
+    Features are placed per chunk column from a random generator seeded with the world seed and
+    the column, so they never depend on what was generated before. A chunk applies the features
+    of the neighbouring columns too (a cave blob or a canopy reaches at most one column over),
+    and everything that reads the world while generating (lake gaps, grass under trees) is
+    computed from those features instead, so every chunk comes out the same whatever order
+    chunks are generated in.
+    """
+    def __init__(self, seed):
+        self.seed = seed
+        self.features = OrderedDict()
+
+    def column_rng(self, column, salt):
+        return random.Random(f"{self.seed}/{column}/{salt}")
+
+    def column_features(self, column):
+        """Returns (blobs, shafts, tree candidates) anchored in a chunk column, cached."""
+        features = self.features.get(column)
+        if features is not None:
+            self.features.move_to_end(column)
+            return features
+        x0 = column << CHUNK_SHIFT
+        x1 = x0 + CHUNK_SIZE - 1
+        blobs = []
+        shafts = []
+        rng = self.column_rng(column, "caves")
+        for _ in range(1 + (rng.random() < EXTRA_DIRT_CAVE)):
+            blobs.append((rng.randint(x0, x1), rng.randint(DIRT_CAVE_TOP, DIRT_CAVE_BOTTOM), rng.randint(3, 6), rng.randint(2, 4), 1, "dirt"))
+        for _ in range(1 + (rng.random() < EXTRA_STONE_CAVE)):
+            cx = rng.randint(x0, x1)
+            cy = rng.randint(STONE_CAVE_TOP, STONE_CAVE_BOTTOM)
+            rx = rng.randint(8, 16)
+            ry = rng.randint(6, 12)
+            blobs.append((cx, cy, rx, ry, 1, "stone"))
+            # Sometimes an interconnected upper blob, joined by a one tile wide shaft.
+            if rng.random() < UPPER_CAVE_CHANCE:
+                upper_cy = cy - ry - rng.randint(2, 4)
+                upper_rx = rng.randint(6, 10)
+                upper_ry = rng.randint(4, 8)
+                blobs.append((cx, upper_cy, upper_rx, upper_ry, 1, "stone"))
+                shafts.append((cx, upper_cy + upper_ry, cy - ry + 1))
+        trees = []
+        rng = self.column_rng(column, "trees")
+        for x in range(x0, x1 + 1):
+            if rng.random() < TREE_CHANCE:
+                trees.append((x, rng.randint(6, 9)))
+        features = (blobs, shafts, trees)
+        self.features[column] = features
+        while len(self.features) > FEATURE_CACHE_SIZE:
+            self.features.popitem(last=False)
+        return features
+
+    def caves_near(self, column):
+        """Blobs and shafts of a column and its neighbours: everything that can carve into it."""
+        blobs = []
+        shafts = []
+        for c in (column - 1, column, column + 1):
+            column_blobs, column_shafts, _ = self.column_features(c)
+            blobs.extend(column_blobs)
+            shafts.extend(column_shafts)
+        return blobs, shafts
+
+    def trees(self, column):
+        """The trees of a column that stand on grass (the caves did not carve the ground under them)."""
+        candidates = self.column_features(column)[2]
+        if not candidates:
+            return []
+        blobs, shafts = self.caves_near(column)
+        ground = carve_mask(column << CHUNK_SHIFT, GROUND_LEVEL, CHUNK_SIZE, 1, blobs, shafts)[0]
+        return [(x, height) for x, height in candidates if not ground[x - (column << CHUNK_SHIFT)]]
+
+    def generate_chunk(self, cx, cy):
+        """Returns (tiles, water) of a chunk: a bytearray of tile ids and a {index: level} water table."""
+        x0 = cx << CHUNK_SHIFT
+        y0 = cy << CHUNK_SHIFT
+        y1 = y0 + CHUNK_SIZE
+        tiles = generate_region(x0, y0, CHUNK_SIZE, CHUNK_SIZE)
+        blobs, shafts = self.caves_near(cx)
+        tiles[carve_mask(x0, y0, CHUNK_SIZE, CHUNK_SIZE, blobs, shafts)] = 0
+        water = {}
+        if y0 <= LAKE_BOTTOM and y1 > LAKE_TOP:
+            # An open run that reaches past LAKE_MIN_WIDTH - 1 tiles outside the chunk is wide enough anyway.
+            margin = LAKE_MIN_WIDTH - 1
+            row = carve_mask(x0 - margin, LAKE_TOP, CHUNK_SIZE + 2 * margin, 1, blobs, shafts)[0].tolist()
+            lake_columns = []
+            start = None
+            for i, carved in enumerate(row + [False]):
+                if carved and start is None:
+                    start = i
+                elif not carved and start is not None:
+                    if i - start >= LAKE_MIN_WIDTH or start == 0 or i == len(row):
+                        lake_columns.extend(range(max(start, margin), min(i, margin + CHUNK_SIZE)))
+                    start = None
+            if lake_columns:
+                lx = np.array(lake_columns) - margin
+                for y in range(max(LAKE_TOP, y0), min(LAKE_BOTTOM + 1, y1)):
+                    tiles[y - y0, lx] = WATER_ID
+                    for col in lake_columns:
+                        water[((y - y0) << CHUNK_SHIFT) | (col - margin)] = 8
+        # Trees are stamped here rather than through World.place_structure: every chunk takes the
+        # parts of its neighbours' trees itself, so it comes out the same whichever order chunks
+        # are generated in (or in a worker process, with no world), and a tree never lands on a
+        # neighbour the player has already changed. Trees go in order of x, so overlapping
+        # canopies end up the same in every chunk.
+        for column in (cx - 1, cx, cx + 1):
+            for x, height in self.trees(column):
+                stamp_structure(tiles, None, x0, y0, TREES[height], x, GROUND_LEVEL)
+        return bytearray(tiles.tobytes()), water
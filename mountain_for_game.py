@@ -0,0 +1,121 @@
+import pygame as p
+import random
+from collections import deque
+from tile_for_game import tile_size
+from tools_for_game import GROUND_LEVEL
+
+MOUNTAIN_SCALE = 1.5
+MOUNTAIN_PARALLAX = 0.3
+
+class Mountain:
+    def __init__(self, image, image_id, x, y=GROUND_LEVEL, parallax=MOUNTAIN_PARALLAX):
+        self.image = image
+        self.image_id = image_id
+        self.x = x
+        self.y = y
+        self.parallax = parallax
+
+    def draw(self, screen, camera_x, camera_y):
+        draw_x = self.x - camera_x * self.parallax
+        ground_screen_y = GROUND_LEVEL * tile_size - camera_y
+        draw_y = ground_screen_y - self.image.get_height()
+        screen.blit(self.image, (draw_x, draw_y))
+
+#--------------------------------------------------------------------------------------------------------------------
+class MountainRange:
+    """
+    The strip of mountains behind the world, side by side on the ground line and scrolling with
+    the camera at parallax speed. Every image is scaled once, up front; the strip is a deque
+    that update() extends and trims at both ends so it covers a screen to either side of the
+    view, picking each new mountain at random but never the same image twice in a row.
+    With composite on, the strip is also kept pre-drawn into a single surface, rebuilt only when
+    a mountain is added or dropped, and draw() is one blit.
+    """
+    def __init__(self, images, view_width, scale=MOUNTAIN_SCALE, parallax=MOUNTAIN_PARALLAX, composite=False):
+        self.images = [p.transform.scale(image, (int(image.get_width() * scale), int(image.get_height() * scale))) for image in images]
+        self.view_width = view_width
+        self.parallax = parallax
+        self.composite = composite
+        self.mountains = deque()
+        # The images a mountain may use after image prev_idx (any but prev_idx, unless there is only one), by prev_idx.
+        count = len(self.images)
+        self.candidates = {prev_idx: [i for i in range(count) if i != prev_idx] or list(range(count))
+                           for prev_idx in [None, *range(count)]}
+        # The pre-drawn strip and the x of its left edge, when composite is on (None: to rebuild).
+        self.surface = None
+        self.surface_x = 0
+        # Statistics: strip rebuilds so far.
+        self.rebuilds = 0
+        x_offset = 0
+        prev_idx = None
+        while self.images and x_offset < 2 * view_width:
+            mountain = self.make_mountain(prev_idx, x_offset)
+            self.mountains.append(mountain)
+            prev_idx = mountain.image_id
+            x_offset += mountain.image.get_width()
+
+    def __len__(self):
+        return len(self.mountains)
+
+    def __iter__(self):
+        return iter(self.mountains)
+
+    def make_mountain(self, prev_idx, x, right_edge=False):
+        """A random mountain other than image prev_idx, starting at x (ending there if right_edge)."""
+        idx = random.choice(self.candidates[prev_idx])
+        image = self.images[idx]
+        if right_edge:
+            x -= image.get_width()
+        return Mountain(image, idx, x, GROUND_LEVEL * tile_size - image.get_height(), parallax=self.parallax)
+
+    def update(self, camera_x):
+        """Adds mountains coming into reach of the view and drops the ones far behind it."""
+        mountains = self.mountains
+        effective_cam = camera_x * self.parallax
+        w = self.view_width
+        changed = False
+        while mountains and (mountains[-1].x + mountains[-1].image.get_width() < effective_cam + w):
+            last = mountains[-1]
+            mountains.append(self.make_mountain(last.image_id, last.x + last.image.get_width()))
+            changed = True
+        while mountains and (mountains[0].x > effective_cam):
+            first = mountains[0]
+            mountains.appendleft(self.make_mountain(first.image_id, first.x, right_edge=True))
+            changed = True
+        while mountains and (mountains[0].x + mountains[0].image.get_width() < effective_cam - w):
+            mountains.popleft()
+            changed = True
+        while mountains and (mountains[-1].x > effective_cam + 2 * w):
+            mountains.pop()
+            changed = True
+        if changed:
+            self.surface = None
+
+    def build_surface(self):
+        """Draws the whole strip into one surface, bottoms on the ground line."""
+        left = self.mountains[0].x
+        right = self.mountains[-1].x + self.mountains[-1].image.get_width()
+        height = max(mountain.image.get_height() for mountain in self.mountains)
+        surface = p.Surface((right - left, height), p.SRCALPHA)
+        # Added onto a cleared surface the images are copied as they are, alpha included
+        # (the mountains do not overlap).
+        surface.blits([(mountain.image, (mountain.x - left, height - mountain.image.get_height()), None, p.BLEND_RGBA_ADD)
+                       for mountain in self.mountains], doreturn=False)
+        self.surface = surface
+        self.surface_x = left
+        self.rebuilds += 1
+
+    def draw(self, screen, camera_x, camera_y):
+        if not self.mountains:
+            return
+        shift = camera_x * self.parallax
+        ground_screen_y = GROUND_LEVEL * tile_size - camera_y
+        if self.composite:
+            if self.surface is None:
+                self.build_surface()
+            screen.blit(self.surface, (self.surface_x - shift, ground_screen_y - self.surface.get_height()))
+            return
+        screen_width = screen.get_width()
+        screen.blits([(mountain.image, (mountain.x - shift, ground_screen_y - mountain.image.get_height()))
+                      for mountain in self.mountains
+                      if mountain.x - shift < screen_width and mountain.x - shift + mountain.image.get_width() > 0], doreturn=False)
@@ -0,0 +1,142 @@
+import pygame as p
+import numpy as np
+from itertools import islice
+from tile_for_game import atlas_areas, get_atlas
+
+# Pool size: enough for every tile broken in half a second of frantic clicking.
+PARTICLE_CAPACITY = 1024
+# Particles live this many frames; all of them the same, so they die in the order they were made.
+PARTICLE_LIFE = 24
+PARTICLE_SIZE = 4
+PARTICLE_GRAVITY = 0.35
+# Particles per broken tile and the speed range they fly out at (pixels per frame).
+BREAK_PARTICLES = 10
+BURST_SPEED = 3.0
+
+#--------------------------------------------------------------------------------------------------------------------
+# Sprites by tile id: a PARTICLE_SIZE square of the tile's average color in the atlas.
+sprites = {}
+
+def particle_sprite(tile_id):
+    sprite = sprites.get(tile_id)
+    if sprite is None:
+        atlas = get_atlas()
+        sprite = p.Surface((PARTICLE_SIZE, PARTICLE_SIZE))
+        sprite.fill(p.transform.average_color(atlas, atlas_areas[tile_id])[:3])
+        sprites[tile_id] = sprite
+    return sprite
+
+class Particles:
+    """
+    Short-lived debris (broken tiles), in a fixed-size pool allocated once: a ring buffer of
+    capacity slots holding x, y, vx, vy, the tile id and the frame each particle was made.
+    burst() writes new particles at the cursor, overwriting the oldest ones when the pool is full
+    (counted in recycled); since every particle lives PARTICLE_LIFE frames, the live ones are
+    always the count slots before the cursor, and dying is just lowering count. update() moves
+    them with in-place array operations. The blit sequence is preallocated too: one [sprite,
+    position] item per slot, the position being a row of a screen position array that draw()
+    fills in place, so no Python object is made per particle and the pool never allocates after
+    __init__.
+    """
+    def __init__(self, capacity=PARTICLE_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.tile = np.zeros(capacity, dtype=np.uint8)
+        self.born = np.zeros(capacity, dtype=np.int64)
+        # Screen positions of the slots, written by draw(), and the blit items over them (whose
+        # sprite burst() sets when it fills the slot).
+        self.screen_pos = np.zeros((capacity, 2))
+        self.screen_x = self.screen_pos[:, 0]
+        self.screen_y = self.screen_pos[:, 1]
+        self.blit_items = [[None, self.screen_pos[i]] for i in range(capacity)]
+        self.rng = np.random.default_rng(seed)
+        # Scratch space for the random burst directions and speeds.
+        self.scratch = np.zeros((2, capacity))
+        self.next = 0
+        self.count = 0
+        self.frame = 0
+        # Statistics: particles made and live particles overwritten because the pool was full.
+        self.spawned = 0
+        self.recycled = 0
+        # World box (left, top, right, bottom) the particles covered when last drawn, for dirty rectangles.
+        self.drawn_box = None
+
+    def __len__(self):
+        return self.count
+
+    def live_slices(self):
+        """The live particles, as one or two slices of the arrays (the ring may wrap around)."""
+        start = (self.next - self.count) % self.capacity
+        end = start + self.count
+        if end <= self.capacity:
+            return (slice(start, end),)
+        return (slice(start, self.capacity), slice(0, end - self.capacity))
+
+    def burst(self, x, y, tile_id, count=BREAK_PARTICLES):
+        """Throws count particles of a tile out from (x, y), mostly upwards."""
+        count = min(count, self.capacity)
+        angle, speed = self.scratch[0, :count], self.scratch[1, :count]
+        # Angles between 0 and -pi: up, to either side.
+        self.rng.random(out=angle)
+        angle *= -np.pi
+        self.rng.random(out=speed)
+        speed *= BURST_SPEED
+        speed += 1.0
+        slots = (self.next + np.arange(count)) % self.capacity
+        self.x[slots] = x - PARTICLE_SIZE / 2
+        self.y[slots] = y - PARTICLE_SIZE / 2
+        self.vx[slots] = np.cos(angle) * speed
+        self.vy[slots] = np.sin(angle) * speed
+        self.tile[slots] = tile_id
+        self.born[slots] = self.frame
+        sprite = particle_sprite(tile_id)
+        for i in range(count):
+            self.blit_items[(self.next + i) % self.capacity][0] = sprite
+        self.next = (self.next + count) % self.capacity
+        self.recycled += max(0, self.count + count - self.capacity)
+        self.count = min(self.count + count, self.capacity)
+        self.spawned += count
+
+    def update(self):
+        """Ages the particles by a frame, drops the expired ones and moves the rest."""
+        self.frame += 1
+        expired = self.frame - PARTICLE_LIFE
+        for part in self.live_slices():
+            self.count -= int(np.count_nonzero(self.born[part] <= expired))
+        for part in self.live_slices():
+            vy = self.vy[part]
+            vy += PARTICLE_GRAVITY
+            self.x[part] += self.vx[part]
+            self.y[part] += vy
+
+    def box(self):
+        """World box (left, top, right, bottom) of the live particles, or None."""
+        if not self.count:
+            return None
+        parts = self.live_slices()
+        return (min(self.x[part].min() for part in parts), min(self.y[part].min() for part in parts),
+                max(self.x[part].max() for part in parts) + PARTICLE_SIZE, max(self.y[part].max() for part in parts) + PARTICLE_SIZE)
+
+    def dirty_rect(self, camera_x, camera_y):
+        """One screen rect covering the particles where they were last drawn and where they are now, or None."""
+        boxes = [box for box in (self.drawn_box, self.box()) if box is not None]
+        if not boxes:
+            return None
+        left = min(box[0] for box in boxes) - camera_x
+        top = min(box[1] for box in boxes) - camera_y
+        right = max(box[2] for box in boxes) - camera_x
+        bottom = max(box[3] for box in boxes) - camera_y
+        return p.Rect(int(np.floor(left)), int(np.floor(top)), int(np.ceil(right - left)) + 1, int(np.ceil(bottom - top)) + 1)
+
+    def draw(self, screen, camera_x, camera_y):
+        """Blits the live particles from the preallocated blit items (one Surface.blits call per live slice)."""
+        self.drawn_box = self.box()
+        if not self.count:
+            return
+        np.subtract(self.x, camera_x, out=self.screen_x)
+        np.subtract(self.y, camera_y, out=self.screen_y)
+        for part in self.live_slices():
+            screen.blits(islice(self.blit_items, part.start, part.stop), doreturn=False)
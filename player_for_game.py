@@ -1,18 +1,26 @@
 import pygame as p
 import math
-import random
-from tile_for_game import*
-from tools_for_game import*
+import os
+from tile_for_game import tile_size, SOLID, FLUID, TILE_KINDS
+from tools_for_game import images_path
 
-side_right = p.transform.scale(p.image.load(os.path.join(images_path, "side.png")).convert_alpha(), (24, 48))
-move_right1 = p.transform.scale(p.image.load(os.path.join(images_path, "finishstep.png")).convert_alpha(), (24, 48))
-move_right2 = p.transform.scale(p.image.load(os.path.join(images_path, "bigstep.png")).convert_alpha(), (24, 48))
-side_left = p.transform.scale(p.image.load(os.path.join(images_path, "side2.png")).convert_alpha(), (24, 48))
-move_left1 = p.transform.scale(p.image.load(os.path.join(images_path, "finishstep2.png")).convert_alpha(), (24, 48))
-move_left2 = p.transform.scale(p.image.load(os.path.join(images_path, "bigstep2.png")).convert_alpha(), (24, 48))
+# Dropped items within this many pixels of the player's box are picked up.
+PICKUP_RANGE = 16
 
-w, h = 800, 600
-screen = p.display.set_mode((w, h))
+# Player animation frames, loaded by load_player_images once the display exists.
+PLAYER_IMAGE_FILES = {
+    "side_right": "side.png",
+    "move_right1": "finishstep.png",
+    "move_right2": "bigstep.png",
+    "side_left": "side2.png",
+    "move_left1": "finishstep2.png",
+    "move_left2": "bigstep2.png"
+}
+player_images = {}
+
+def load_player_images():
+    for name, filename in PLAYER_IMAGE_FILES.items():
+        player_images[name] = p.transform.scale(p.image.load(os.path.join(images_path, filename)).convert_alpha(), (24, 48))
 
 class Player:
     def __init__(self, x, y):
@@ -26,13 +34,15 @@ class Player:
         self.direction = "right"
         self.walking = False
         self.animation_frames = {
-            "right": [move_right1, move_right2],
-            "left": [move_left1, move_left2]
+            "right": ["move_right1", "move_right2"],
+            "left": ["move_left1", "move_left2"]
         }
         self.animation_index = 0
         self.animation_counter = 0
         self.animation_speed = 10
-        self.current_image = side_right
+        self.current_frame = "side_right"
+        # Picked up items: tile kind -> count.
+        self.inventory = {}
 
     def rect(self):
         return p.Rect(self.x, self.y, self.width, self.height)
@@ -59,53 +69,44 @@ class Player:
                 self.direction = "right"
             self.x += dx
 
-            # Horizontal collision (ignoring water)
-            start_tx = math.floor(self.x / tile_size)
-            end_tx = math.floor((self.x + self.width) / tile_size) + 1
-            start_ty = math.floor(self.y / tile_size)
-            end_ty = math.floor((self.y + self.height) / tile_size) + 1
-            for tx in range(start_tx, end_tx):
-                for ty in range(start_ty, end_ty):
-                    tile = world.get_tile(tx, ty)
-                    if tile is not None and tile.kind != "water":
-                        tile_rect = p.Rect(tx * tile_size, ty * tile_size, tile_size, tile_size)
-                        if self.rect().colliderect(tile_rect):
-                            if dx > 0:
-                                self.x = tile_rect.left - self.width
-                            elif dx < 0:
-                                self.x = tile_rect.right
+            # Horizontal collision (ignoring water). The box is the player's rect in whole pixels.
+            if dx:
+                left = int(self.x)
+                top = int(self.y)
+                hit = world.first_tile(left, top, left + self.width, top + self.height, SOLID)
+                if hit is not None and dx > 0:
+                    self.x = hit[0] * tile_size - self.width
+                elif hit is not None:
+                    # Pushed right out of the leftmost blocking column, then out of any other column
+                    # the player was overlapping (within the columns it overlapped after moving).
+                    right = (math.floor((self.x + self.width) / tile_size) + 1) * tile_size
+                    while hit is not None:
+                        self.x = (hit[0] + 1) * tile_size
+                        hit = world.first_tile(self.x, top, min(self.x + self.width, right), top + self.height, SOLID) if self.x < right else None
 
             # Gravity
             self.vel_y += 0.5
             self.y += self.vel_y
+            # The water check below uses the tiles the player overlaps before the vertical
+            # collision pushes it back out, as it always has.
             start_tx = math.floor(self.x / tile_size)
             end_tx = math.floor((self.x + self.width) / tile_size) + 1
             start_ty = math.floor(self.y / tile_size)
             end_ty = math.floor((self.y + self.height) / tile_size) + 1
-            for tx in range(start_tx, end_tx):
-                for ty in range(start_ty, end_ty):
-                    tile = world.get_tile(tx, ty)
-                    if tile is not None and tile.kind != "water":
-                        tile_rect = p.Rect(tx * tile_size, ty * tile_size, tile_size, tile_size)
-                        if self.rect().colliderect(tile_rect):
-                            if self.vel_y > 0:
-                                self.y = tile_rect.top - self.height
-                                self.vel_y = 0
-                                self.on_ground = True
-                            elif self.vel_y < 0:
-                                self.y = tile_rect.bottom
-                                self.vel_y = 0
+            if self.vel_y:
+                left = int(self.x)
+                top = int(self.y)
+                hit = world.first_tile(left, top, left + self.width, top + self.height, SOLID)
+                if hit is not None:
+                    if self.vel_y > 0:
+                        self.y = hit[1] * tile_size - self.height
+                        self.on_ground = True
+                    else:
+                        self.y = (hit[1] + 1) * tile_size
+                    self.vel_y = 0
 
             # Check if in water
-            in_water = False
-            for tx in range(start_tx, end_tx):
-                for ty in range(start_ty, end_ty):
-                    tile = world.get_tile(tx, ty)
-                    if tile is not None and tile.kind == "water":
-                        in_water = True
-                        break
-                if in_water:
-                    break
+            in_water = world.any_tile(start_tx, start_ty, end_tx, end_ty, FLUID)
             if in_water:
                 self.on_ground = False
                 if keys[p.K_SPACE]:
@@ -123,42 +124,26 @@ class Player:
                 if self.animation_counter >= self.animation_speed:
                     self.animation_counter = 0
                     self.animation_index = (self.animation_index + 1) % len(self.animation_frames[self.direction])
-                    self.current_image = self.animation_frames[self.direction][self.animation_index]
+                    self.current_frame = self.animation_frames[self.direction][self.animation_index]
             else:
                 self.walking = False
-                self.current_image = side_right if self.direction == "right" else side_left
-
-    def draw(self, camera_x, camera_y):
-        screen.blit(self.current_image, (self.x - camera_x, self.y - camera_y))
-
-class Mountain:
-    def __init__(self, image, image_id, x, y=GROUND_LEVEL, parallax=0.3):
-        self.image = image
-        self.image_id = image_id
-        self.x = x
-        self.y = y
-        self.parallax = parallax
-
-    def draw(self, screen, camera_x, camera_y):
-        draw_x = self.x - camera_x * self.parallax
-        ground_screen_y = GROUND_LEVEL * tile_size - camera_y
-        draw_y = ground_screen_y - self.image.get_height()
-        screen.blit(self.image, (draw_x, draw_y))
+                self.current_frame = "side_right" if self.direction == "right" else "side_left"
 
-class Cloud:
-    def __init__(self, images):
-        self.original_image = random.choice(images)
-        self.scale = random.uniform(1.5, 2.5)
-        self.image = p.transform.rotozoom(self.original_image, 0, self.scale)
-        self.x = random.randint(0, w)
-        self.y = random.randint(-300, 50)
-        self.speed = random.uniform(0.2, 1.0)
+    def collect(self, entities):
+        """Picks up the drops within PICKUP_RANGE of the player into the inventory; returns how many."""
+        index = entities.query_box(self.x - PICKUP_RANGE, self.y - PICKUP_RANGE,
+                                   self.x + self.width + PICKUP_RANGE, self.y + self.height + PICKUP_RANGE, "drop")
+        for tile_id in entities.data[index].tolist():
+            kind = TILE_KINDS[tile_id]
+            self.inventory[kind] = self.inventory.get(kind, 0) + 1
+        if len(index):
+            entities.remove(index)
+        return len(index)
 
-    def update(self):
-        self.x += self.speed
-        if self.x > w:
-            self.x = -self.image.get_width()
-            self.y = random.randint(-300, 50)
+    def screen_rect(self, camera_x, camera_y):
+        """Where draw() puts the player on screen."""
+        return p.Rect((self.x - camera_x, self.y - camera_y), player_images[self.current_frame].get_size())
 
-    def draw(self, screen, camera_x, camera_y):
-        screen.blit(self.image, (self.x - camera_x, self.y - camera_y))
\ No newline at end of file
+    def draw(self, camera_x, camera_y):
+        screen = p.display.get_surface()
+        screen.blit(player_images[self.current_frame], (self.x - camera_x, self.y - camera_y))
@@ -0,0 +1,175 @@
+import gc
+import csv
+import json
+import time
+import numpy as np
+import pygame as p
+
+# Frames kept in the ring buffer (10 seconds at 60 FPS).
+PROFILE_CAPACITY = 600
+# The overlay text is re-rendered this often instead of every frame.
+OVERLAY_REFRESH = 0.25
+
+class FrameProfiler:
+    """
+    Lightweight per-phase frame timing.
+    Each frame is a row in a fixed-size ring buffer: begin_frame() starts the clock, mark(phase)
+    stores the time since the previous mark under that phase, count(name, value) stores a per
+    frame counter and end_frame() closes the row. Recording is a couple of array writes, so the
+    profiler can stay on all the time; stats(), the overlay and the exports read the buffer.
+    After watch_gc(), the garbage collections run during each frame and the time they took are
+    recorded in the "gc_collections" and "gc_ms" counters (if they are among the counters).
+    """
+    def __init__(self, phases, counters=(), capacity=PROFILE_CAPACITY):
+        self.phases = list(phases)
+        self.counters = list(counters)
+        self.phase_index = {name: i for i, name in enumerate(self.phases)}
+        self.counter_index = {name: i for i, name in enumerate(self.counters)}
+        self.capacity = capacity
+        self.times = np.zeros((capacity, len(self.phases)), dtype=np.float64)
+        self.frame_times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.counters)), dtype=np.float64)
+        self.frames = 0
+        self.row = 0
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.overlay_visible = False
+        self.overlay_surface = None
+        self.overlay_time = 0.0
+        self.font = None
+        # Garbage collections during the current frame (see watch_gc).
+        self.gc_collections = 0
+        self.gc_time = 0.0
+        self.gc_start = 0.0
+
+    def watch_gc(self):
+        gc.callbacks.append(self.on_gc)
+
+    def on_gc(self, phase, info):
+        if phase == "start":
+            self.gc_start = time.perf_counter()
+        else:
+            self.gc_collections += 1
+            self.gc_time += time.perf_counter() - self.gc_start
+
+    def begin_frame(self):
+        self.row = self.frames % self.capacity
+        self.times[self.row] = 0.0
+        self.values[self.row] = 0.0
+        self.gc_collections = 0
+        self.gc_time = 0.0
+        self.frame_start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.times[self.row, self.phase_index[phase]] += now - self.last
+        self.last = now
+
+    def count(self, name, value):
+        self.values[self.row, self.counter_index[name]] = value
+
+    def end_frame(self):
+        if "gc_collections" in self.counter_index:
+            self.count("gc_collections", self.gc_collections)
+        if "gc_ms" in self.counter_index:
+            self.count("gc_ms", self.gc_time * 1000.0)
+        self.frame_times[self.row] = time.perf_counter() - self.frame_start
+        self.frames += 1
+
+    def recorded(self):
+        """Returns (phase times, frame times, counters) of the recorded frames, oldest first."""
+        n = min(self.frames, self.capacity)
+        order = (np.arange(n) + (self.frames - n)) % self.capacity
+        return self.times[order], self.frame_times[order], self.values[order]
+
+    def stats(self):
+        """FPS and p50 / p99 milliseconds per phase over the buffered frames, plus the latest counters."""
+        times, frame_times, values = self.recorded()
+        if len(frame_times) == 0:
+            return {"frames": 0}
+        result = {
+            "frames": len(frame_times),
+            "fps": float(len(frame_times) / frame_times.sum()) if frame_times.sum() > 0 else 0.0,
+            "frame_p50_ms": float(np.percentile(frame_times, 50) * 1000.0),
+            "frame_p99_ms": float(np.percentile(frame_times, 99) * 1000.0),
+            "phases": {},
+            "counters": {name: float(values[-1, i]) for i, name in enumerate(self.counters)},
+        }
+        for i, name in enumerate(self.phases):
+            result["phases"][name] = {
+                "p50_ms": float(np.percentile(times[:, i], 50) * 1000.0),
+                "p99_ms": float(np.percentile(times[:, i], 99) * 1000.0),
+            }
+        return result
+
+    #--------------------------------------------------------------------------------------------------------------------
+    def export_csv(self, path):
+        """One row per buffered frame: frame time and every phase in milliseconds, then the counters."""
+        times, frame_times, values = self.recorded()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame_ms"] + [f"{name}_ms" for name in self.phases] + self.counters)
+            for i in range(len(frame_times)):
+                writer.writerow([f"{frame_times[i] * 1000.0:.4f}"] + [f"{t * 1000.0:.4f}" for t in times[i]] + [f"{v:g}" for v in values[i]])
+
+    def export_json(self, path):
+        times, frame_times, values = self.recorded()
+        with open(path, "w") as f:
+            json.dump({
+                "stats": self.stats(),
+                "phases": self.phases,
+                "counters": self.counters,
+                "frame_ms": (frame_times * 1000.0).tolist(),
+                "phase_ms": (times * 1000.0).tolist(),
+                "counter_values": values.tolist(),
+            }, f)
+
+    def export(self, path):
+        """Writes path as CSV or JSON depending on its extension."""
+        if path.endswith(".csv"):
+            self.export_csv(path)
+        else:
+            self.export_json(path)
+
+    #--------------------------------------------------------------------------------------------------------------------
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_surface = None
+
+    def draw_overlay(self, screen):
+        """Draws FPS, p50/p99 per phase and the counters in the top-right corner, if the overlay is on."""
+        rect = self.overlay_rect(screen)
+        if rect is not None:
+            screen.blit(self.overlay_surface, rect)
+
+    def overlay_rect(self, screen):
+        """Where the overlay goes on screen (None while it is off); renders it again every OVERLAY_REFRESH seconds."""
+        if not self.overlay_visible:
+            return None
+        now = time.perf_counter()
+        if self.overlay_surface is None or now - self.overlay_time >= OVERLAY_REFRESH:
+            self.overlay_surface = self.render_overlay()
+            self.overlay_time = now
+        return self.overlay_surface.get_rect(topright=(screen.get_width() - 8, 8))
+
+    def render_overlay(self):
+        if self.font is None:
+            if not p.font.get_init():
+                p.font.init()
+            self.font = p.font.Font(None, 18)
+        stats = self.stats()
+        lines = [f"FPS {stats.get('fps', 0.0):5.1f}   frame p50 {stats.get('frame_p50_ms', 0.0):5.2f}  p99 {stats.get('frame_p99_ms', 0.0):5.2f} ms"]
+        for name, phase in stats.get("phases", {}).items():
+            lines.append(f"{name:<12} p50 {phase['p50_ms']:5.2f}  p99 {phase['p99_ms']:5.2f} ms")
+        for name, value in stats.get("counters", {}).items():
+            lines.append(f"{name:<12} {value:g}")
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(surface.get_width() for surface in rendered) + 12
+        height = sum(surface.get_height() for surface in rendered) + 12
+        surface = p.Surface((width, height), p.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        y = 6
+        for line in rendered:
+            surface.blit(line, (6, y))
+            y += line.get_height()
+        return surface
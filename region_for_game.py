@@ -0,0 +1,180 @@
+import os
+import shutil
+import json
+import mmap
+import struct
+import zlib
+from world_for_game import Chunk, CHUNK_SIZE
+
+# Region files hold REGION_SIZE x REGION_SIZE chunks each.
+REGION_SHIFT = 5
+REGION_SIZE = 1 << REGION_SHIFT
+REGION_MASK = REGION_SIZE - 1
+REGION_MAGIC = b"OWGR"
+REGION_VERSION = 1
+# Chunk records are stored in whole sectors, so a chunk that is saved again usually fits in its old place.
+SECTOR_SIZE = 256
+# Offset index: one (first sector, sector count, byte length) entry per chunk of the region, 0 sectors = not stored.
+INDEX_ENTRY = struct.Struct("<IHH")
+INDEX_OFFSET = 8
+HEADER_SECTORS = (INDEX_OFFSET + REGION_SIZE * REGION_SIZE * INDEX_ENTRY.size + SECTOR_SIZE - 1) // SECTOR_SIZE
+COMPRESSION_LEVEL = 6
+META_FILE = "world.json"
+
+#--------------------------------------------------------------------------------------------------------------------
+def encode_chunk(chunk):
+    """
+    The uncompressed chunk record: the tile ids (CHUNK_SIZE * CHUNK_SIZE bytes), the number of
+    water tiles (uint16), their cell indices (uint16 each) and then their levels (one byte each).
+    """
+    cells = sorted(chunk.water)
+    return b"".join((
+        bytes(chunk.tiles),
+        struct.pack(f"<H{len(cells)}H", len(cells), *cells),
+        bytes(chunk.water[i] for i in cells),
+    ))
+
+def decode_chunk(cx, cy, data):
+    count = CHUNK_SIZE * CHUNK_SIZE
+    chunk = Chunk(cx, cy, bytearray(data[:count]))
+    (water_count,) = struct.unpack_from("<H", data, count)
+    cells = struct.unpack_from(f"<{water_count}H", data, count + 2)
+    levels = data[count + 2 + 2 * water_count:count + 2 + 3 * water_count]
+    chunk.water = dict(zip(cells, levels))
+    return chunk
+
+def region_index(chunk_x, chunk_y):
+    return (chunk_y & REGION_MASK) * REGION_SIZE + (chunk_x & REGION_MASK)
+
+#--------------------------------------------------------------------------------------------------------------------
+class RegionStore:
+    """
+    Chunk storage on disk, one binary region file per REGION_SIZE x REGION_SIZE chunks.
+    A region file starts with the magic, the format version and an offset index of every chunk
+    slot, followed by the zlib-compressed chunk records in SECTOR_SIZE sectors. Single chunks are
+    read straight out of a memory map of the file, and saving writes only the given chunks: a
+    record goes back into its old sectors when it still fits, otherwise into the first free gap
+    (or the end of the file); the index entry is updated after the data is written.
+    A temporary store (only used to spill chunks out of memory) deletes its directory on close().
+    """
+    def __init__(self, directory, temporary=False):
+        self.directory = directory
+        self.temporary = temporary
+        os.makedirs(directory, exist_ok=True)
+        # (rx, ry) -> (file, mmap) of the region files opened for reading.
+        self.maps = {}
+
+    def region_path(self, rx, ry):
+        return os.path.join(self.directory, f"r.{rx}.{ry}.region")
+
+    def open_map(self, rx, ry):
+        mapped = self.maps.get((rx, ry))
+        if mapped is None:
+            path = self.region_path(rx, ry)
+            if not os.path.exists(path):
+                return None
+            f = open(path, "rb")
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:4] != REGION_MAGIC:
+                data.close()
+                f.close()
+                raise ValueError(f"Not a region file: {path}")
+            mapped = (f, data)
+            self.maps[(rx, ry)] = mapped
+        return mapped[1]
+
+    def close_map(self, rx, ry):
+        mapped = self.maps.pop((rx, ry), None)
+        if mapped is not None:
+            mapped[1].close()
+            mapped[0].close()
+
+    def has_chunk(self, cx, cy):
+        data = self.open_map(cx >> REGION_SHIFT, cy >> REGION_SHIFT)
+        if data is None:
+            return False
+        return INDEX_ENTRY.unpack_from(data, INDEX_OFFSET + region_index(cx, cy) * INDEX_ENTRY.size)[1] != 0
+
+    def load_chunk(self, cx, cy):
+        """Returns the stored Chunk at chunk coordinates (cx, cy), or None if it was never saved."""
+        data = self.open_map(cx >> REGION_SHIFT, cy >> REGION_SHIFT)
+        if data is None:
+            return None
+        sector, sectors, length = INDEX_ENTRY.unpack_from(data, INDEX_OFFSET + region_index(cx, cy) * INDEX_ENTRY.size)
+        if sectors == 0:
+            return None
+        start = sector * SECTOR_SIZE
+        return decode_chunk(cx, cy, zlib.decompress(data[start:start + length]))
+
+    def save_chunks(self, chunks):
+        """Writes the given chunks, grouped by region file. Returns the number of bytes written."""
+        regions = {}
+        for chunk in chunks:
+            regions.setdefault((chunk.cx >> REGION_SHIFT, chunk.cy >> REGION_SHIFT), []).append(chunk)
+        written = 0
+        for (rx, ry), region_chunks in regions.items():
+            written += self.save_region(rx, ry, region_chunks)
+        return written
+
+    def save_region(self, rx, ry, chunks):
+        # The read map would not see the file grow; it is reopened on the next load.
+        self.close_map(rx, ry)
+        path = self.region_path(rx, ry)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(REGION_MAGIC + struct.pack("<I", REGION_VERSION))
+                f.write(bytes(HEADER_SECTORS * SECTOR_SIZE - INDEX_OFFSET))
+        written = 0
+        with open(path, "r+b") as f:
+            f.seek(INDEX_OFFSET)
+            index = bytearray(f.read(REGION_SIZE * REGION_SIZE * INDEX_ENTRY.size))
+            entries = [INDEX_ENTRY.unpack_from(index, i * INDEX_ENTRY.size) for i in range(REGION_SIZE * REGION_SIZE)]
+            for chunk in chunks:
+                record = zlib.compress(encode_chunk(chunk), COMPRESSION_LEVEL)
+                needed = (len(record) + SECTOR_SIZE - 1) // SECTOR_SIZE
+                slot = region_index(chunk.cx, chunk.cy)
+                sector, sectors, _ = entries[slot]
+                if sectors < needed:
+                    entries[slot] = (0, 0, 0)
+                    sector = self.free_sectors(entries, needed)
+                f.seek(sector * SECTOR_SIZE)
+                f.write(record)
+                entries[slot] = (sector, needed, len(record))
+                INDEX_ENTRY.pack_into(index, slot * INDEX_ENTRY.size, *entries[slot])
+                written += len(record)
+            f.seek(INDEX_OFFSET)
+            f.write(index)
+        return written
+
+    @staticmethod
+    def free_sectors(entries, needed):
+        """First sector of the lowest gap of at least needed free sectors between the stored records."""
+        used = sorted((sector, sector + sectors) for sector, sectors, _ in entries if sectors)
+        position = HEADER_SECTORS
+        for start, end in used:
+            if start - position >= needed:
+                return position
+            position = max(position, end)
+        return position
+
+    def close(self):
+        for rx, ry in list(self.maps):
+            self.close_map(rx, ry)
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+#--------------------------------------------------------------------------------------------------------------------
+def read_meta(directory):
+    """The world.json of a saved world (seed, player position, ...), or None if there is no saved world there."""
+    path = os.path.join(directory, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def write_meta(directory, meta):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, META_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
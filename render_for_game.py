@@ -0,0 +1,205 @@
+import pygame as p
+import math
+from world_for_game import CHUNK_PIXELS, tile_size
+
+#--------------------------------------------------------------------------------------------------------------------
+class WorldLayer:
+    """
+    The tiles of a stack of worlds (background first) as they appear on screen, kept from one
+    frame to the next.
+    When the camera moves, the pixels of the last frame are shifted with Surface.scroll and only
+    the strips that came into view are drawn from the chunk surfaces; tiles changed since the
+    last frame (set_tile, bulk edits and water, through World.listeners) and chunks that were
+    still placeholders are redrawn in place. A frame in which neither the camera nor any tile in
+    view changed draws nothing at all: draw() just blits the layer.
+    """
+    def __init__(self, worlds, size):
+        self.worlds = worlds
+        self.width, self.height = size
+        self.surface = p.Surface(size, p.SRCALPHA)
+        # Camera position (whole pixels) of the pixels held in surface; None until the first draw.
+        self.camera = None
+        # World tile regions (x0, y0, x1, y1) changed since the last draw.
+        self.changed = []
+        # (world index, chunk key) of the chunks drawn as placeholders, redrawn once they are generated.
+        self.placeholders = set()
+        # Statistics of the last draw call: screen pixels drawn again and whether the view scrolled.
+        self.pixels_drawn = 0
+        self.scrolled = False
+        for world in worlds:
+            world.listeners.append(self.on_tiles_changed)
+
+    def on_tiles_changed(self, x0, y0, x1, y1):
+        self.changed.append((x0, y0, x1, y1))
+
+    def draw(self, screen, camera_x, camera_y):
+        """Brings the layer up to date for the camera position and blits it onto screen."""
+        self.update(camera_x, camera_y)
+        screen.blit(self.surface, (0, 0))
+
+    def update(self, camera_x, camera_y):
+        """
+        Brings the layer up to date for the camera position. Returns the screen rects drawn again
+        (the whole view if it scrolled too far).
+        """
+        camera_x = math.floor(camera_x)
+        camera_y = math.floor(camera_y)
+        for world in self.worlds:
+            world.begin_draw(camera_x, camera_y, self.width, self.height)
+        self.pixels_drawn = 0
+        view = p.Rect(0, 0, self.width, self.height)
+        if self.camera is None:
+            self.scrolled = True
+            dirty = [view]
+        else:
+            dx = self.camera[0] - camera_x
+            dy = self.camera[1] - camera_y
+            self.scrolled = bool(dx or dy)
+            if abs(dx) >= self.width or abs(dy) >= self.height:
+                # Nothing of the last frame is left in view.
+                dirty = [view]
+            else:
+                dirty = []
+                if self.scrolled:
+                    self.surface.scroll(dx, dy)
+                    if dx > 0:
+                        dirty.append(p.Rect(0, 0, dx, self.height))
+                    elif dx < 0:
+                        dirty.append(p.Rect(self.width + dx, 0, -dx, self.height))
+                    if dy > 0:
+                        dirty.append(p.Rect(0, 0, self.width, dy))
+                    elif dy < 0:
+                        dirty.append(p.Rect(0, self.height + dy, self.width, -dy))
+                for x0, y0, x1, y1 in self.changed:
+                    rect = p.Rect(x0 * tile_size - camera_x, y0 * tile_size - camera_y,
+                                  (x1 - x0) * tile_size, (y1 - y0) * tile_size).clip(view)
+                    if rect.width and rect.height:
+                        dirty.append(rect)
+                for index, key in list(self.placeholders):
+                    if key in self.worlds[index].chunks:
+                        self.placeholders.discard((index, key))
+                        rect = p.Rect(key[0] * CHUNK_PIXELS - camera_x, key[1] * CHUNK_PIXELS - camera_y,
+                                      CHUNK_PIXELS, CHUNK_PIXELS).clip(view)
+                        if rect.width and rect.height:
+                            dirty.append(rect)
+        self.camera = (camera_x, camera_y)
+        self.changed = []
+        for rect in dirty:
+            self.redraw(rect)
+        self.surface.set_clip(None)
+        return dirty
+
+    def redraw(self, rect):
+        """Draws the screen area rect of the layer again from the chunk surfaces of every world."""
+        camera_x, camera_y = self.camera
+        surface = self.surface
+        surface.set_clip(rect)
+        surface.fill((0, 0, 0, 0))
+        start_cx = (rect.x + camera_x) // CHUNK_PIXELS
+        end_cx = (rect.right - 1 + camera_x) // CHUNK_PIXELS
+        start_cy = (rect.y + camera_y) // CHUNK_PIXELS
+        end_cy = (rect.bottom - 1 + camera_y) // CHUNK_PIXELS
+        for index, world in enumerate(self.worlds):
+            for cx in range(start_cx, end_cx + 1):
+                for cy in range(start_cy, end_cy + 1):
+                    chunk_surface = world.render_chunk(cx, cy)
+                    if (cx, cy) not in world.chunks:
+                        self.placeholders.add((index, (cx, cy)))
+                    if chunk_surface is not None:
+                        surface.blit(chunk_surface, (cx * CHUNK_PIXELS - camera_x, cy * CHUNK_PIXELS - camera_y))
+                        world.chunks_drawn += 1
+        self.pixels_drawn += rect.width * rect.height
+
+#--------------------------------------------------------------------------------------------------------------------
+# Past this share of the screen, or this many separate regions, a frame is drawn and presented whole.
+FULL_FRAME_AREA = 0.5
+MAX_REGIONS = 24
+
+def merge_rects(rects, view):
+    """Clips rects to view and merges the overlapping ones into their unions, so no pixel is in two of them."""
+    merged = []
+    for rect in rects:
+        rect = rect.clip(view)
+        if not rect.width or not rect.height:
+            continue
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def clipped(screen, regions):
+    """Sets the clip of screen to each region in turn, for drawing one layer into all of them, then clears it."""
+    for rect in regions:
+        screen.set_clip(rect)
+        yield rect
+    screen.set_clip(None)
+
+class DirtyRegions:
+    """
+    Dirty rectangle presentation. During a frame the areas that change are collected: the old
+    and new place of every moving sprite (sprite()), and anything else passed to add(), such as
+    the tiles redrawn by a WorldLayer. regions() turns them into non-overlapping rects; the frame
+    is then drawn layer by layer clipped to each of them (see clipped), and present() shows just
+    those rects with p.display.update(rects).
+    A frame is drawn and flipped whole when the camera scrolled (invalidate()), when the changes
+    cover more than FULL_FRAME_AREA of the screen or MAX_REGIONS rects, and always when
+    enabled is False.
+    """
+    def __init__(self, size, enabled=True):
+        self.view = p.Rect((0, 0), size)
+        self.enabled = enabled
+        # Sprite key -> (screen rect, state) at the last frame.
+        self.sprites = {}
+        self.rects = []
+        self.full = True
+        self.current = [self.view]
+        # Statistics of the last presented frame.
+        self.presented_pixels = 0
+
+    def invalidate(self):
+        """The whole screen changes this frame."""
+        self.full = True
+
+    def add(self, rect):
+        self.rects.append(p.Rect(rect))
+
+    def sprite(self, key, rect, state=None):
+        """
+        Reports where sprite key is drawn this frame (rect None: not drawn). If it moved, was shown
+        or hidden, or its state (e.g. its animation frame) changed, its old and new area are dirty.
+        """
+        old = self.sprites.get(key)
+        new = None if rect is None else (p.Rect(rect), state)
+        if old == new:
+            return
+        if old is not None:
+            self.rects.append(old[0])
+        if new is None:
+            del self.sprites[key]
+        else:
+            self.rects.append(new[0])
+            self.sprites[key] = new
+
+    def regions(self):
+        """The screen areas to draw this frame: non-overlapping rects, or just the whole view."""
+        if self.enabled and not self.full:
+            merged = merge_rects(self.rects, self.view)
+            area = sum(rect.width * rect.height for rect in merged)
+            if len(merged) <= MAX_REGIONS and area <= FULL_FRAME_AREA * self.view.width * self.view.height:
+                self.current = merged
+                return merged
+        self.full = True
+        self.current = [self.view]
+        return self.current
+
+    def present(self):
+        """Shows the frame drawn into the regions, and starts collecting the next one."""
+        if self.full:
+            p.display.flip()
+        elif self.current:
+            p.display.update(self.current)
+        self.presented_pixels = sum(rect.width * rect.height for rect in self.current)
+        self.rects = []
+        self.full = False
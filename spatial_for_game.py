@@ -0,0 +1,109 @@
+import numpy as np
+from tile_for_game import tile_size
+
+# Grid cells are CELL_TILES x CELL_TILES tiles, aligned with the tile grid (and so with chunks:
+# a chunk is a whole number of cells).
+CELL_TILES = 4
+CELL_SIZE = CELL_TILES * tile_size
+# Key of an item that is not in the grid.
+NO_CELL = -(1 << 63)
+
+def cell_keys(x, y, cell_size=CELL_SIZE):
+    """Grid cell keys of arrays of pixel positions: the cell column in the high 32 bits, the row (two's complement) in the low ones."""
+    gx = np.floor(np.asarray(x) / cell_size).astype(np.int64)
+    gy = np.floor(np.asarray(y) / cell_size).astype(np.int64)
+    return (gx << 32) | (gy & 0xFFFFFFFF)
+
+class SpatialHash:
+    """
+    A uniform grid over items identified by small integer indices (the indices of an Entities
+    store). Every item is in the cell of its position (its top-left corner); a cell holds the
+    set of its items, and keys[i] is the cell of item i. set_cells() takes the new cells of many
+    items at once and only touches the buckets of the items that changed cell, so keeping the
+    grid up to date costs next to nothing while things move inside their cells.
+    candidates() returns the items of the cells a box overlaps; callers filter them exactly.
+    """
+    def __init__(self, cell_size=CELL_SIZE, capacity=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.keys = np.full(capacity, NO_CELL, dtype=np.int64)
+        # Items that changed cell, counted over the lifetime of the grid.
+        self.moves = 0
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.cells.values())
+
+    def reserve(self, capacity):
+        if capacity > len(self.keys):
+            keys = np.full(max(capacity, 2 * len(self.keys)), NO_CELL, dtype=np.int64)
+            keys[:len(self.keys)] = self.keys
+            self.keys = keys
+
+    def set_cells(self, indices, keys):
+        """Puts items indices (an int array) in cells keys (NO_CELL: out of the grid)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(indices):
+            self.reserve(int(indices.max()) + 1)
+        old = self.keys[indices]
+        changed = np.nonzero(old != keys)[0]
+        if not len(changed):
+            return
+        cells = self.cells
+        for i, old_key, key in zip(indices[changed].tolist(), old[changed].tolist(), keys[changed].tolist()):
+            if old_key != NO_CELL:
+                bucket = cells[old_key]
+                bucket.discard(i)
+                if not bucket:
+                    del cells[old_key]
+            if key != NO_CELL:
+                bucket = cells.get(key)
+                if bucket is None:
+                    cells[key] = {i}
+                else:
+                    bucket.add(i)
+        self.keys[indices[changed]] = keys[changed]
+        self.moves += len(changed)
+
+    def bounds(self):
+        """The pixel box (left, top, right, bottom) of the occupied cells, or None if the grid is empty."""
+        if not self.cells:
+            return None
+        keys = np.fromiter(self.cells, dtype=np.int64, count=len(self.cells))
+        gx = keys >> 32
+        gy = (keys & 0xFFFFFFFF).astype(np.uint32).view(np.int32)
+        size = self.cell_size
+        return int(gx.min()) * size, int(gy.min()) * size, (int(gx.max()) + 1) * size, (int(gy.max()) + 1) * size
+
+    def move_items(self, sources, targets):
+        """Renumbers items sources to targets (whose old items must have been taken out already)."""
+        keys = self.keys[sources].copy()
+        self.set_cells(sources, np.full(len(keys), NO_CELL, dtype=np.int64))
+        self.set_cells(targets, keys)
+
+    def candidates(self, left, top, right, bottom):
+        """The items in the cells overlapping the pixel box [left, right) x [top, bottom), as an int array."""
+        size = self.cell_size
+        gx0 = int(left // size)
+        gx1 = int(right // size)
+        gy0 = int(top // size)
+        gy1 = int(bottom // size)
+        cells = self.cells
+        found = []
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(cells):
+            # A box wider than the populated grid: look at the occupied cells instead.
+            for key, bucket in cells.items():
+                gx = key >> 32
+                gy = key & 0xFFFFFFFF
+                if gy >= 1 << 31:
+                    gy -= 1 << 32
+                if gx0 <= gx <= gx1 and gy0 <= gy <= gy1:
+                    found.extend(bucket)
+        else:
+            for gx in range(gx0, gx1 + 1):
+                high = gx << 32
+                for gy in range(gy0, gy1 + 1):
+                    bucket = cells.get(high | (gy & 0xFFFFFFFF))
+                    if bucket:
+                        found.extend(bucket)
+        return np.array(found, dtype=np.int64)
@@ -0,0 +1,154 @@
+import math
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from generation_for_game import ChunkGenerator
+from world_for_game import Chunk, CHUNK_PIXELS
+
+# Chunks that may be generating at once per worker; requests past the limit are simply made again next frame.
+IN_FLIGHT_PER_WORKER = 4
+# Finished chunks added to the world per frame, at most.
+INSTALL_PER_FRAME = 4
+# How far ahead (in seconds of the player's current speed) chunks are prefetched, and the ring of
+# chunks around the view that is always kept ready.
+PREFETCH_SECONDS = 1.5
+PREFETCH_MARGIN = 1
+# Smoothing of the measured player velocity (0: keep the old estimate, 1: use the last frame only).
+VELOCITY_SMOOTHING = 0.2
+
+#--------------------------------------------------------------------------------------------------------------------
+# One generator per seed in each worker process, so the feature cache survives between tasks.
+worker_generators = {}
+
+def generate_chunk_task(task):
+    """Pool worker: generates one chunk. task is (seed, cx, cy); returns (cx, cy, tiles, water)."""
+    seed, cx, cy = task
+    generator = worker_generators.get(seed)
+    if generator is None:
+        generator = worker_generators[seed] = ChunkGenerator(seed)
+    tiles, water = generator.generate_chunk(cx, cy)
+    return cx, cy, tiles, water
+
+class ChunkStreamer:
+    """
+    Generates the chunks of a world in a pool of worker processes, ahead of the player.
+    Every frame, update() measures how fast and where the player is moving and requests the
+    chunks of the view, a margin around it and the area the player will reach in the next
+    PREFETCH_SECONDS, nearest first. Finished chunks come back through a bounded queue and
+    update() installs a few of them per frame; nothing in the main loop waits for a worker.
+    While a chunk is on its way World.draw shows a placeholder for it. Code that needs the tiles
+    right away (collisions, water, edits) still gets them from World.get_chunk, which generates
+    on the spot; the streamed copy is then dropped when it arrives, as it is when the chunk was
+    edited and evicted to the storage in the meantime.
+    Chunks saved in the world's storage are loaded directly, which is only a small read.
+    A chunk whose generation failed in a worker (or whose worker died) is reported and
+    forgotten, so it is requested again; a broken pool is replaced on the next request.
+    """
+    def __init__(self, world, view_size, workers=2):
+        self.world = world
+        self.view_width, self.view_height = view_size
+        self.workers = workers
+        self.max_in_flight = workers * IN_FLIGHT_PER_WORKER
+        self.pool = None
+        self.pending = set()
+        self.finished = queue.Queue(maxsize=self.max_in_flight)
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+        self.last_position = None
+        self.installed = 0
+        self.discarded = 0
+        self.failed = 0
+        world.streamer = self
+
+    def request(self, cx, cy):
+        """
+        Asks for chunk (cx, cy). Returns True if it is in the world now (it already was, or it
+        was loaded from storage), False if it is being generated or the pool is busy.
+        """
+        key = (cx, cy)
+        if key in self.world.chunks:
+            return True
+        storage = self.world.storage
+        if storage is not None and storage.has_chunk(cx, cy):
+            self.world.get_chunk(cx, cy)
+            return True
+        if key in self.pending or len(self.pending) >= self.max_in_flight:
+            return False
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.pending.add(key)
+        future = self.pool.submit(generate_chunk_task, (self.world.seed, cx, cy))
+        # At most max_in_flight chunks are pending, so the queue always has room.
+        future.add_done_callback(lambda done: self.finished.put_nowait((key, done)))
+        return False
+
+    def update(self, player_x, player_y, camera_x, camera_y, dt):
+        """Installs finished chunks and requests the ones the player will need next."""
+        self.install()
+        if self.last_position is not None and dt > 0:
+            vx = (player_x - self.last_position[0]) / dt
+            vy = (player_y - self.last_position[1]) / dt
+            self.velocity_x += (vx - self.velocity_x) * VELOCITY_SMOOTHING
+            self.velocity_y += (vy - self.velocity_y) * VELOCITY_SMOOTHING
+        self.last_position = (player_x, player_y)
+        for cx, cy in self.wanted_chunks(player_x, player_y, camera_x, camera_y):
+            self.request(cx, cy)
+
+    def wanted_chunks(self, player_x, player_y, camera_x, camera_y):
+        """
+        The missing chunks of the view plus PREFETCH_MARGIN, stretched in the direction of travel
+        by PREFETCH_SECONDS of movement, ordered by distance from where the player is heading.
+        """
+        ahead_x = self.velocity_x * PREFETCH_SECONDS
+        ahead_y = self.velocity_y * PREFETCH_SECONDS
+        left = camera_x + min(ahead_x, 0)
+        right = camera_x + self.view_width + max(ahead_x, 0)
+        top = camera_y + min(ahead_y, 0)
+        bottom = camera_y + self.view_height + max(ahead_y, 0)
+        start_cx = math.floor(left / CHUNK_PIXELS) - PREFETCH_MARGIN
+        end_cx = math.floor(right / CHUNK_PIXELS) + PREFETCH_MARGIN
+        start_cy = math.floor(top / CHUNK_PIXELS) - PREFETCH_MARGIN
+        end_cy = math.floor(bottom / CHUNK_PIXELS) + PREFETCH_MARGIN
+        target_x = (player_x + ahead_x * 0.5) / CHUNK_PIXELS
+        target_y = (player_y + ahead_y * 0.5) / CHUNK_PIXELS
+        chunks = self.world.chunks
+        missing = [(cx, cy) for cx in range(start_cx, end_cx + 1) for cy in range(start_cy, end_cy + 1)
+                   if (cx, cy) not in chunks and (cx, cy) not in self.pending]
+        missing.sort(key=lambda key: (key[0] + 0.5 - target_x) ** 2 + (key[1] + 0.5 - target_y) ** 2)
+        return missing
+
+    def install(self, limit=INSTALL_PER_FRAME):
+        """Adds up to limit finished chunks to the world, without waiting for any."""
+        for _ in range(limit):
+            try:
+                key, future = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            self.pending.discard(key)
+            try:
+                cx, cy, tiles, water = future.result()
+            except Exception as e:
+                print(f"Failed to generate chunk {key}:", repr(e))
+                self.failed += 1
+                if isinstance(e, BrokenProcessPool):
+                    self.close()
+                continue
+            storage = self.world.storage
+            if (cx, cy) in self.world.chunks or (storage is not None and storage.has_chunk(cx, cy)):
+                # Generated on the spot in the meantime (or loaded), or edited and spilled to the
+                # storage by trim(): that copy may hold edits, and get_chunk loads it when needed.
+                self.discarded += 1
+                continue
+            chunk = Chunk(cx, cy, tiles)
+            chunk.water = water
+            self.world.install_chunk(chunk)
+            self.installed += 1
+
+    def pending_count(self):
+        return len(self.pending)
+
+    def close(self):
+        """Shuts down the worker pool, if one was started."""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
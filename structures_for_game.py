@@ -0,0 +1,103 @@
+import numpy as np
+from tile_for_game import TILE_IDS
+
+# Template characters. A space leaves the world as it is; "." clears the tile to air.
+LEGEND = {
+    ".": None,
+    "G": "grass",
+    "D": "dirt",
+    "S": "stone",
+    "C": "cave_stone",
+    "~": "water",
+    "W": "wood",
+    "L": "leaves",
+}
+
+class Structure:
+    """
+    A prefab compiled once from its text rows: ids holds the tile id of every cell, mask the
+    cells the structure writes (spaces in the template are left out). anchor_x / anchor_y is the
+    cell that goes at the position the structure is placed at; it may lie outside the rows (a
+    tree is anchored on the ground tile under its trunk).
+    """
+    __slots__ = ("name", "ids", "mask", "anchor_x", "anchor_y")
+
+    def __init__(self, name, ids, mask, anchor_x, anchor_y):
+        self.name = name
+        self.ids = ids
+        self.mask = mask
+        self.anchor_x = anchor_x
+        self.anchor_y = anchor_y
+
+    @property
+    def width(self):
+        return self.ids.shape[1]
+
+    @property
+    def height(self):
+        return self.ids.shape[0]
+
+    def origin(self, x, y):
+        """World position of the top-left cell when the anchor is placed at (x, y)."""
+        return x - self.anchor_x, y - self.anchor_y
+
+    def __repr__(self):
+        return f"Structure({self.name!r}, {self.width}x{self.height})"
+
+def compile_structure(name, rows, anchor, legend=LEGEND):
+    width = max(len(row) for row in rows)
+    ids = np.zeros((len(rows), width), dtype=np.uint8)
+    mask = np.zeros((len(rows), width), dtype=bool)
+    for r, row in enumerate(rows):
+        for c, char in enumerate(row):
+            if char == " ":
+                continue
+            ids[r, c] = TILE_IDS[legend[char]]
+            mask[r, c] = True
+    return Structure(name, ids, mask, anchor[0], anchor[1])
+
+#--------------------------------------------------------------------------------------------------------------------
+# Structure registry: name -> Structure. Saved worlds refer to structures by name.
+STRUCTURES = {}
+
+def register_structure(name, rows, anchor):
+    if name in STRUCTURES:
+        raise ValueError(f"Structure already registered: {name}")
+    structure = compile_structure(name, rows, anchor)
+    STRUCTURES[name] = structure
+    return structure
+
+def tree_rows(height):
+    """A tree with a trunk of the given height under a 3 x 3 canopy centred on its top."""
+    return ["LLL"] * 3 + [" W "] * (height - 2)
+
+# Trees of trunk height 6 to 9, anchored on the grass tile under the trunk.
+TREES = {height: register_structure(f"tree_{height}", tree_rows(height), (1, height + 1)) for height in range(6, 10)}
+
+#--------------------------------------------------------------------------------------------------------------------
+def stamp_structure(ids, mask, x0, y0, structure, x, y):
+    """
+    Writes a structure, anchored at (x, y), into a tile id array whose top-left tile is (x0, y0),
+    clipped to the array. If mask is given, the written cells are also set in it.
+    """
+    sx, sy = structure.origin(x, y)
+    height, width = ids.shape
+    xa = max(sx, x0)
+    xb = min(sx + structure.width, x0 + width)
+    ya = max(sy, y0)
+    yb = min(sy + structure.height, y0 + height)
+    if xa >= xb or ya >= yb:
+        return
+    part = structure.mask[ya - sy:yb - sy, xa - sx:xb - sx]
+    target = ids[ya - y0:yb - y0, xa - x0:xb - x0]
+    target[part] = structure.ids[ya - sy:yb - sy, xa - sx:xb - sx][part]
+    if mask is not None:
+        mask[ya - y0:yb - y0, xa - x0:xb - x0] |= part
+
+def pending_to_json(world):
+    """The structure parts queued in a world (see World.place_structure), in a form world.json can hold."""
+    return [[structure.name, x0, y0, cx, cy] for (cx, cy), queued in world.pending_structures.items() for structure, x0, y0 in queued]
+
+def pending_from_json(world, data):
+    for name, x0, y0, cx, cy in data:
+        world.pending_structures.setdefault((cx, cy), []).append((STRUCTURES[name], x0, y0))
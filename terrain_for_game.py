@@ -0,0 +1,94 @@
+import math
+import numpy as np
+from tile_for_game import TILE_IDS
+from tools_for_game import GROUND_LEVEL
+
+GRASS_ID = TILE_IDS["grass"]
+DIRT_ID = TILE_IDS["dirt"]
+STONE_ID = TILE_IDS["stone"]
+CAVE_STONE_ID = TILE_IDS["cave_stone"]
+
+# Noise values closer than this to a layer threshold (or to the 0/1 wrap of the modulo) are
+# recomputed with math.sin, so a last-bit difference between NumPy's and libm's sin can never
+# change a tile.
+NOISE_EPSILON = 1e-9
+
+#--------------------------------------------------------------------------------------------------------------------
+def terrain_noise(x, y):
+    return (math.sin(x * 12.9898 + y * 78.233) * 43758.5453) % 1.0
+
+def default_tile_id(x, y):
+    """
+    Default foreground terrain for a single tile:
+      - y < GROUND_LEVEL: sky (0).
+      - y == GROUND_LEVEL: grass tile.
+      - GROUND_LEVEL < y <= GROUND_LEVEL+6: a random blend of dirt and stone.
+      - y > GROUND_LEVEL+6: stone.
+    """
+    if y < GROUND_LEVEL:
+        return 0
+    elif y == GROUND_LEVEL:
+        return GRASS_ID
+    elif GROUND_LEVEL < y <= GROUND_LEVEL + 6:
+        threshold = (y - (GROUND_LEVEL + 1)) / 5.0  # 0 at GROUND_LEVEL+1, 1 at GROUND_LEVEL+6
+        if terrain_noise(x, y) < threshold:
+            return STONE_ID
+        else:
+            return DIRT_ID
+    else:
+        return STONE_ID
+
+#--------------------------------------------------------------------------------------------------------------------
+def generate_region(x0, y0, width, height):
+    """
+    Vectorized default_tile_id for a whole region.
+    Returns a (height, width) uint8 array of tile ids where [row, col] is tile (x0 + col, y0 + row).
+    The result is identical to calling default_tile_id on every tile.
+    """
+    region = np.empty((height, width), dtype=np.uint8)
+    ys = np.arange(y0, y0 + height)
+    region[ys < GROUND_LEVEL] = 0
+    region[ys == GROUND_LEVEL] = GRASS_ID
+    region[ys > GROUND_LEVEL + 6] = STONE_ID
+
+    band = (ys > GROUND_LEVEL) & (ys <= GROUND_LEVEL + 6)
+    if band.any():
+        band_ys = ys[band]
+        xs = np.arange(x0, x0 + width)
+        noise = np.remainder(np.sin(xs[None, :] * 12.9898 + band_ys[:, None] * 78.233) * 43758.5453, 1.0)
+        thresholds = ((band_ys - (GROUND_LEVEL + 1)) / 5.0)[:, None]
+        band_ids = np.where(noise < thresholds, STONE_ID, DIRT_ID).astype(np.uint8)
+        unsure_rows, unsure_cols = np.nonzero(
+            (np.abs(noise - thresholds) < NOISE_EPSILON) | (np.minimum(noise, 1.0 - noise) < NOISE_EPSILON))
+        for row, col in zip(unsure_rows.tolist(), unsure_cols.tolist()):
+            band_ids[row, col] = default_tile_id(x0 + col, int(band_ys[row]))
+        region[band] = band_ids
+    return region
+
+#--------------------------------------------------------------------------------------------------------------------
+def default_background_tile_id(x, y):
+    """
+    Background wall layer: cave stone from the ground level down, nothing above it.
+    It only shows where the foreground has been carved out.
+    """
+    return CAVE_STONE_ID if y >= GROUND_LEVEL else 0
+
+def generate_background_region(x0, y0, width, height):
+    """Vectorized default_background_tile_id, same layout as generate_region."""
+    region = np.zeros((height, width), dtype=np.uint8)
+    region[np.arange(y0, y0 + height) >= GROUND_LEVEL] = CAVE_STONE_ID
+    return region
+
+#--------------------------------------------------------------------------------------------------------------------
+def check_region_matches_default(x0, y0, width, height):
+    """
+    Compares generate_region with default_tile_id tile by tile over a region.
+    Returns the list of mismatching (x, y) positions (empty when they agree bit for bit).
+    """
+    region = generate_region(x0, y0, width, height)
+    mismatches = []
+    for row in range(height):
+        for col in range(width):
+            if region[row, col] != default_tile_id(x0 + col, y0 + row):
+                mismatches.append((x0 + col, y0 + row))
+    return mismatches
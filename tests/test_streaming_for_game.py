@@ -0,0 +1,48 @@
+from concurrent.futures import Future
+from world_for_game import World, CHUNK_SIZE
+from region_for_game import RegionStore
+from generation_for_game import ChunkGenerator
+from streaming_for_game import ChunkStreamer
+
+def finished(cx, cy, tiles, water):
+    future = Future()
+    future.set_result((cx, cy, tiles, water))
+    return (cx, cy), future
+
+def test_install_keeps_edits_spilled_while_generating(tmp_path):
+    world = World(chunk_budget=1)
+    world.storage = RegionStore(str(tmp_path / "spill"), temporary=True)
+    streamer = ChunkStreamer(world, (800, 600), workers=1)
+    # The chunk is requested from the workers...
+    streamer.pending.add((5, 0))
+    tiles, water = ChunkGenerator(1).generate_chunk(5, 0)
+    # ...edited through a synchronous get_chunk before it arrives, then evicted and spilled.
+    x = 5 * CHUNK_SIZE + 3
+    world.set_tile(x, 2, "wood")
+    assert world.trim() >= 1
+    assert (5, 0) not in world.chunks
+    assert world.storage.has_chunk(5, 0)
+    streamer.finished.put_nowait(finished(5, 0, tiles, water))
+    streamer.install()
+    assert streamer.discarded == 1
+    assert streamer.installed == 0
+    assert (5, 0) not in streamer.pending
+    assert world.get_tile(x, 2).kind == "wood"
+    world.storage.close()
+
+def test_install_survives_a_failed_generation():
+    world = World()
+    streamer = ChunkStreamer(world, (800, 600), workers=1)
+    streamer.pending.update({(1, 0), (2, 0)})
+    future = Future()
+    future.set_exception(RuntimeError("worker died"))
+    streamer.finished.put_nowait(((1, 0), future))
+    tiles, water = ChunkGenerator(1).generate_chunk(2, 0)
+    streamer.finished.put_nowait(finished(2, 0, tiles, water))
+    streamer.install()
+    assert streamer.failed == 1
+    assert streamer.installed == 1
+    # The failed chunk is no longer in flight, so the next update asks for it again.
+    assert not streamer.pending
+    assert (1, 0) not in world.chunks
+    assert (1, 0) in streamer.wanted_chunks(0, 0, 0, 0)
@@ -0,0 +1,47 @@
+from world_for_game import World, CHUNK_SIZE
+from structures_for_game import TREES
+from block_game import open_world, save_world
+
+TREE = TREES[9]
+# Anchored on the last column of chunk column 0, high in the sky: the canopy reaches into chunk (1, -1).
+X, Y = CHUNK_SIZE - 1, -20
+
+class Player:
+    x = 0
+    y = 0
+
+def kind(world, x, y):
+    tile = world.get_tile(x, y)
+    return None if tile is None else tile.kind
+
+def canopy_tops(world):
+    return [kind(world, CHUNK_SIZE, y) for y in range(Y - 10, Y - 7)]
+
+def test_place_structure_queues_the_parts_of_chunks_not_loaded():
+    world = World()
+    world.get_chunk(0, -1)
+    world.place_structure(TREE, X, Y)
+    assert kind(world, X, Y - 1) == "wood"
+    assert kind(world, X - 1, Y - 10) == "leaves"
+    assert (1, -1) not in world.chunks
+    assert [queued[0] for queued in world.pending_structures[(1, -1)]] == [TREE]
+    world.get_chunk(1, -1)
+    assert canopy_tops(world) == ["leaves"] * 3
+    assert kind(world, CHUNK_SIZE, Y - 7) is None
+    assert not world.pending_structures
+
+def test_queued_parts_are_saved_and_stamped_after_loading(tmp_path):
+    world_dir = str(tmp_path / "world")
+    fg_world, bg_world, meta = open_world(world_dir, 1, None)
+    fg_world.get_chunk(0, -1)
+    fg_world.place_structure(TREE, X, Y)
+    assert (1, -1) not in fg_world.chunks
+    save_world(world_dir, fg_world, meta, Player())
+    fg_world.storage.close()
+
+    fg_world, bg_world, meta = open_world(world_dir, None, None)
+    assert (1, -1) in fg_world.pending_structures
+    assert kind(fg_world, X, Y - 1) == "wood"
+    assert canopy_tops(fg_world) == ["leaves"] * 3
+    assert not fg_world.pending_structures
+    fg_world.storage.close()
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from world_for_game import World, GROUND_LEVEL
+from terrain_for_game import generate_region, generate_background_region
+
+def tile_id(tile):
+    # Air is None.
+    return 0 if tile is None else tile.id
+
+def default_ids(world, x0, y0, width, height):
+    return np.array([[tile_id(world.default_tile(x0 + col, y0 + row)) for col in range(width)] for row in range(height)], dtype=np.uint8)
+
+# Around the origin, at negative and non-chunk-aligned origins, and far out where the sin argument is large.
+REGIONS = [
+    (0, 0, 64, 32),
+    (-2048, GROUND_LEVEL - 4, 4096, 16),
+    (-37, -5, 70, 40),
+    (13, GROUND_LEVEL - 1, 333, 9),
+    (10 ** 6 + 7, GROUND_LEVEL - 4, 2048, 16),
+    (-(10 ** 7) - 3, -3, 1024, 40),
+]
+
+@pytest.mark.parametrize("x0, y0, width, height", REGIONS)
+def test_generate_region_matches_default_tile(x0, y0, width, height):
+    region = generate_region(x0, y0, width, height)
+    assert region.dtype == np.uint8
+    assert region.shape == (height, width)
+    np.testing.assert_array_equal(region, default_ids(World(), x0, y0, width, height))
+
+@pytest.mark.parametrize("x0, y0, width, height", REGIONS)
+def test_generate_background_region_matches_default_tile(x0, y0, width, height):
+    np.testing.assert_array_equal(generate_background_region(x0, y0, width, height),
+                                  default_ids(World(layer="background"), x0, y0, width, height))
@@ -0,0 +1,38 @@
+from world_for_game import World
+from water_for_game import WaterSimulation, SOURCE_LEVEL
+
+def basin(width=12, depth=6, top=30):
+    """A closed box of stone, width x depth tiles of air inside."""
+    world = World()
+    for y in range(top - 1, top + depth + 1):
+        for x in range(-1, width + 1):
+            world.set_tile(x, y, "stone")
+    for y in range(top, top + depth):
+        for x in range(width):
+            world.set_tile(x, y, None)
+    return world
+
+def volume(world):
+    return sum(level for x, y, level in world.water_cells())
+
+def test_closed_basin_settles_with_the_same_volume():
+    world = basin()
+    # A column of flowing water dropped in one corner.
+    for y in range(30, 34):
+        world.set_tile(0, y, "water", level=7)
+    simulation = WaterSimulation(world)
+    start = volume(world)
+    for _ in range(500):
+        simulation.step()
+        assert volume(world) == start
+        if not simulation.active_count():
+            break
+    assert simulation.active_count() == 0
+    # Settled: no water became a source, none is left above an empty tile and another tick changes nothing.
+    cells = {(x, y): level for x, y, level in world.water_cells()}
+    assert all(level < SOURCE_LEVEL for level in cells.values())
+    for (x, y), level in cells.items():
+        assert world.get_tile_id(x, y + 1) != 0
+    state = sorted(world.water_cells())
+    simulation.step()
+    assert sorted(world.water_cells()) == state
@@ -0,0 +1,42 @@
+import random
+import numpy as np
+from tile_for_game import TILE_IDS, WATER_ID
+from world_for_game import World, CHUNK_SIZE
+
+KINDS = [None, "grass", "dirt", "stone", "wood", "water"]
+
+def chunk_state(world):
+    return {key: (bytes(chunk.tiles), dict(chunk.water)) for key, chunk in world.chunks.items()}
+
+def test_write_region_matches_set_tile():
+    rng = random.Random(5)
+    for _ in range(50):
+        bulk = World()
+        single = World()
+        # Some water already there, so that writes also change levels and replace water.
+        for world in (bulk, single):
+            for x in range(-40, 40, 3):
+                world.set_tile(x, 12, "water", level=x % 8 + 1)
+        width = rng.randint(1, 2 * CHUNK_SIZE)
+        height = rng.randint(1, 2 * CHUNK_SIZE)
+        x0 = rng.randint(-60, 20)
+        y0 = rng.randint(-20, 20)
+        kinds = [[rng.choice(KINDS) for _ in range(width)] for _ in range(height)]
+        ids = np.array([[0 if kind is None else TILE_IDS[kind] for kind in row] for row in kinds], dtype=np.uint8)
+        mask = np.array([[rng.random() < 0.7 for _ in range(width)] for _ in range(height)])
+        levels = np.array([[rng.randint(1, 8) for _ in range(width)] for _ in range(height)], dtype=np.uint8)
+        changed = bulk.write_region(x0, y0, ids, mask, levels)
+        expected = 0
+        for row in range(height):
+            for col in range(width):
+                if not mask[row, col]:
+                    continue
+                x = x0 + col
+                y = y0 + row
+                before = (single.get_tile_id(x, y), single.get_water_level(x, y))
+                level = int(levels[row, col]) if ids[row, col] == WATER_ID else None
+                single.set_tile(x, y, kinds[row][col], level=level)
+                expected += (single.get_tile_id(x, y), single.get_water_level(x, y)) != before
+        assert chunk_state(bulk) == chunk_state(single)
+        assert changed == expected
+        assert bulk.water_entries == single.water_entries
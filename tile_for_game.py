@@ -1,53 +1,145 @@
 import pygame as p
 from tools_for_game import load_texture
 
-textures = {
-    "grass": load_texture("grass.png"),      # expected texture: grass.png
-    "dirt": load_texture("dirt.png"),          # expected texture: dirt.png
-    "cave_stone": load_texture("cave_stone.png"),  # expected texture: cave_stone.png
-    "water": load_texture("water.png"),        # expected texture: water.png
-    "wood": load_texture("wood.png"),
-    "leaves": load_texture("leaves.png"),
-    "stone": load_texture("stone.png")
+# Tile textures, loaded by load_textures once the display exists. Until then (and in headless
+# runs) tiles are drawn with their fallback color.
+TEXTURE_FILES = {
+    "grass": "grass.png",
+    "dirt": "dirt.png",
+    "cave_stone": "cave_stone.png",
+    "water": "water.png",
+    "wood": "wood.png",
+    "leaves": "leaves.png",
+    "stone": "stone.png"
 }
+textures = {}
+
+def load_textures():
+    for kind, filename in TEXTURE_FILES.items():
+        textures[kind] = load_texture(filename)
+    build_atlas()
 
 tile_size = 32
 
+# Tile property flags.
+SOLID = 1           # blocks movement
+INTERACTABLE = 2    # can be broken by the player
+FLUID = 4           # water-like, the player swims through it
+
 class Tile:
-    def __init__(self, kind, level=None):
-        self.kind = kind
-        # For water, attach a level (1 to 8, where 8 means a full source)
-        if self.kind == "water":
-            self.level = 8 if level is None else level
-        self.image = textures.get(kind, None)
+    """
+    A registered tile type. There is exactly one shared, immutable instance per kind (see
+    register_tile); worlds only store its integer id. Per-tile state such as a water level
+    (1 to 8, where 8 means a full source) is kept by the world, not on the shared instance.
+    """
+    __slots__ = ("id", "kind", "flags", "solid", "can_interact", "fluid", "color")
+
+    def __init__(self, tile_id, kind, flags, color):
+        set_attr = object.__setattr__
+        set_attr(self, "id", tile_id)
+        set_attr(self, "kind", kind)
+        set_attr(self, "flags", flags)
+        set_attr(self, "solid", bool(flags & SOLID))
         # Interactive tiles for collision (except water)
-        self.can_interact = kind in ["grass", "dirt", "stone", "wood", "leaves", "cave_stone"]
-        
+        set_attr(self, "can_interact", bool(flags & INTERACTABLE))
+        set_attr(self, "fluid", bool(flags & FLUID))
+        # Fallback color if the texture is missing.
+        set_attr(self, "color", color)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tile types are shared and immutable")
+
+    @property
+    def image(self):
+        return textures.get(self.kind)
+
     def __eq__(self, other):
         if other is None:
             return False
         if isinstance(other, Tile):
-            # For water, ignore level differences when comparing types.
-            if self.kind == "water" and other.kind == "water":
-                return True
-            return self.kind == other.kind
+            return self.id == other.id
         if isinstance(other, str):
             return self.kind == other
         return False
-    
+
+    def __hash__(self):
+        return self.id
+
+    def __repr__(self):
+        return f"Tile({self.kind!r})"
+
     def draw(self, screen, x, y, camera_x, camera_y):
-        if self.image:
-            screen.blit(self.image, (x - camera_x, y - camera_y))
+        image = textures.get(self.kind)
+        if image:
+            screen.blit(image, (x - camera_x, y - camera_y))
         else:
-            # Fallback colors if texture is missing.
-            color_mapping = {
-                "grass": (34, 139, 34),
-                "dirt": (139, 69, 19),
-                "cave_stone": (70, 70, 70),
-                "stone": (128, 128, 128),
-                "wood": (160, 82, 45),
-                "leaves": (34, 139, 34),
-                "water": (50, 100, 255)
-            }
-            color = color_mapping.get(self.kind, (200, 0, 200))
-            p.draw.rect(screen, color, p.Rect(x - camera_x, y - camera_y, tile_size, tile_size))
\ No newline at end of file
+            p.draw.rect(screen, self.color, p.Rect(x - camera_x, y - camera_y, tile_size, tile_size))
+
+#--------------------------------------------------------------------------------------------------------------------
+# Tile registry. Ids are compact integers used by the World chunk store (one byte per tile); 0 is air / no tile.
+TILE_TYPES = [None]         # id -> Tile
+TILE_KINDS = [None]         # id -> kind name
+TILE_IDS = {None: 0}        # kind name -> id
+TILES = {}                  # kind name -> Tile
+TILE_FLAGS = bytearray(1)   # id -> flags, for lookups straight from chunk bytes
+
+def register_tile(kind, flags, color):
+    if kind in TILES:
+        raise ValueError(f"Tile kind already registered: {kind}")
+    tile = Tile(len(TILE_TYPES), kind, flags, color)
+    TILE_TYPES.append(tile)
+    TILE_KINDS.append(kind)
+    TILE_IDS[kind] = tile.id
+    TILES[kind] = tile
+    TILE_FLAGS.append(flags)
+    return tile
+
+register_tile("grass", SOLID | INTERACTABLE, (34, 139, 34))
+register_tile("dirt", SOLID | INTERACTABLE, (139, 69, 19))
+register_tile("cave_stone", SOLID | INTERACTABLE, (70, 70, 70))
+register_tile("water", FLUID, (50, 100, 255))
+register_tile("wood", SOLID | INTERACTABLE, (160, 82, 45))
+register_tile("leaves", SOLID | INTERACTABLE, (34, 139, 34))
+register_tile("stone", SOLID | INTERACTABLE, (128, 128, 128))
+
+WATER_ID = TILE_IDS["water"]
+
+#--------------------------------------------------------------------------------------------------------------------
+# Texture atlas: every registered tile in one surface, a tile_size cell per id (cell 0, air, stays
+# empty), so a whole chunk is drawn with a single Surface.blits call from the same source surface.
+# Tiles without a texture get a cell filled with their fallback color. When all cells are opaque
+# the atlas has no alpha channel, which makes every blit a plain copy.
+atlas = None
+atlas_areas = [None]    # id -> Rect of the tile's cell in the atlas
+
+def build_atlas():
+    global atlas
+    surface = p.Surface((len(TILE_TYPES) * tile_size, tile_size), p.SRCALPHA)
+    surface.fill((0, 0, 0, 0))
+    areas = [None]
+    for tile in TILE_TYPES[1:]:
+        area = p.Rect(tile.id * tile_size, 0, tile_size, tile_size)
+        image = textures.get(tile.kind)
+        if image:
+            # Added onto the cleared cell, the texture is copied as is (alpha included) instead of blended.
+            surface.blit(image, area, special_flags=p.BLEND_RGBA_ADD)
+        else:
+            surface.fill(tile.color, area)
+        areas.append(area)
+    alpha = p.surfarray.pixels_alpha(surface)
+    opaque = alpha[tile_size:].min() == 255
+    del alpha  # releases the lock on the surface
+    if opaque:
+        # Copying opaque pixels is several times faster than alpha blending them; air cells are never drawn.
+        opaque_surface = p.Surface(surface.get_size())
+        opaque_surface.blit(surface, (0, 0))
+        surface = opaque_surface
+    atlas = surface
+    atlas_areas[:] = areas
+    return surface
+
+def get_atlas():
+    """The tile atlas, built with the fallback colors if the textures were not loaded."""
+    if atlas is None or len(atlas_areas) != len(TILE_TYPES):
+        build_atlas()
+    return atlas
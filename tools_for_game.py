@@ -1,6 +1,7 @@
 import pygame as p
 import os
-import random    
+import random
+import numpy as np
 
 base_path = os.path.dirname(__file__)
 images_path = os.path.join(base_path, 'images')
@@ -28,30 +29,16 @@ def load_bg_image(filename):
     
 #--------------------------------------------------------------------------------------------------------------------
 def update_water_flow(world):
-    from tile_for_game import Tile
     """
-    Simplified water physics:
-    For every water tile, if the tile immediately below is empty (or contains water with a lower level),
-    water flows downward by one tile.
-    Source water blocks (level 8) remain after flowing.
-    Horizontal flow is omitted so water simply drips downward.
+    Advances the world's water by one tick.
+    The water engine lives in water_for_game.WaterSimulation: it only processes moving water,
+    lets water flow down and spread sideways by level, and is created on first use.
+    The game loop calls WaterSimulation.update(dt) instead to run at its own tick rate.
     """
-    water_positions = []
-    for pos, tile in list(world.modifications.items()):
-        if tile is not None and tile.kind == "water":
-            water_positions.append((pos, tile.level))
-    # Process water from bottom to top so gravity is respected.
-    water_positions.sort(key=lambda pos_level: pos_level[0][1], reverse=True)
-    for (x, y), level in water_positions:
-        current_tile = world.get_tile(x, y)
-        if current_tile is None or current_tile.kind != "water":
-            continue
-        L = current_tile.level
-        below = world.get_tile(x, y + 1)
-        if below is None or (below.kind == "water" and getattr(below, "level", 0) < L):
-            world.set_tile(x, y + 1, Tile("water", level=L))
-            if L < 8:  # Only non-source water is removed after flowing.
-                world.set_tile(x, y, None)
+    from water_for_game import WaterSimulation
+    if world.water_simulation is None:
+        WaterSimulation(world)
+    world.water_simulation.step()
 
 #--------------------------------------------------------------------------------------------------------------------
 def fill_surface_caves_with_water(world, x_min, x_max, y_top, y_bottom):
@@ -59,21 +46,59 @@ def fill_surface_caves_with_water(world, x_min, x_max, y_top, y_bottom):
     Scans row y_top for a contiguous empty gap.
     If the gap is 5 or more blocks wide, fills region y_top to y_bottom with source water.
     """
-    x = x_min
-    while x < x_max:
-        if world.get_tile(x, y_top) is None:
+    ids = world.read_ids(x_min, y_top, x_max - x_min, 1)
+    row = ids[0].tolist()
+    x = 0
+    while x < len(row):
+        if row[x] == 0:
             start = x
-            while x < x_max and world.get_tile(x, y_top) is None:
+            while x < len(row) and row[x] == 0:
                 x += 1
-            region_width = x - start
-            if region_width >= 5:
-                for i in range(start, x):
-                    for y in range(y_top, y_bottom + 1):
-                        world.set_tile(i, y, "water")
+            if x - start >= 5:
+                world.fill_rect(x_min + start, y_top, x_min + x, y_bottom + 1, "water")
         else:
             x += 1
 
 #--------------------------------------------------------------------------------------------------------------------
+def carve_mask(x0, y0, width, height, blobs, shafts):
+    """
+    Boolean (height, width) mask of the tiles the cave blobs and shafts remove, where [row, col]
+    is tile (x0 + col, y0 + row). A blob (x, y, rx, ry, entrance_width, cave_type) is carved like
+    generate_cave_blob (see cave_blob_mask); a shaft (x, y_start, y_end) is the column x from
+    y_start up to, but not including, y_end.
+    """
+    mask = np.zeros((height, width), dtype=bool)
+    for blob in blobs:
+        bx, by, rx, ry = blob[:4]
+        left = bx - rx
+        top = by - ry
+        xa = max(left, x0)
+        xb = min(bx + rx + 1, x0 + width)
+        ya = max(top, y0)
+        yb = min(by + ry + 1, y0 + height)
+        if xa >= xb or ya >= yb:
+            continue
+        mask[ya - y0:yb - y0, xa - x0:xb - x0] |= cave_blob_mask(*blob)[ya - top:yb - top, xa - left:xb - left]
+    for sx, sy0, sy1 in shafts:
+        if x0 <= sx < x0 + width:
+            mask[max(sy0, y0) - y0:max(min(sy1, y0 + height), y0) - y0, sx - x0] = True
+    return mask
+
+def cave_blob_mask(cx, cy, rx, ry, entrance_width, cave_type):
+    """
+    The tiles generate_cave_blob removes, as a boolean mask over its bounding box: mask[row, col]
+    is tile (cx - rx + col, cy - ry + row).
+    """
+    entrance_height = 2
+    xs = np.arange(cx - rx, cx + rx + 1)[None, :]
+    ys = np.arange(cy - ry, cy + ry + 1)[:, None]
+    if cave_type == "dirt":
+        opening = xs == cx
+    else:
+        opening = np.abs(xs - cx) <= entrance_width // 2
+    inside = ((xs - cx) ** 2) / (rx ** 2) + ((ys - cy) ** 2) / (ry ** 2) < 1
+    return np.where(ys < cy - ry + entrance_height, opening, inside)
+
 def generate_cave_blob(world, cx, cy, rx, ry, entrance_width, cave_type):
     """
     Carves out a blob-shaped cave.
@@ -81,28 +106,18 @@ def generate_cave_blob(world, cx, cy, rx, ry, entrance_width, cave_type):
       - For stone caves, removes tiles in a wider opening.
       - For dirt caves, removes only the central column to form a narrow, coal-mine style entrance.
     Below that, carving follows an elliptical equation.
+    The whole blob is one bulk edit (World.apply_mask).
     """
-    entrance_height = 2
-    top_y = cy - ry
-    for y in range(top_y, cy + ry + 1):
-        for x in range(cx - rx, cx + rx + 1):
-            if y < top_y + entrance_height:
-                if cave_type == "dirt":
-                    if x == cx:
-                        world.set_tile(x, y, None)
-                else:
-                    if abs(x - cx) <= entrance_width // 2:
-                        world.set_tile(x, y, None)
-            else:
-                if ((x - cx) ** 2) / (rx ** 2) + ((y - cy) ** 2) / (ry ** 2) < 1:
-                    world.set_tile(x, y, None)
+    world.apply_mask(cx - rx, cy - ry, cave_blob_mask(cx, cy, rx, ry, entrance_width, cave_type), None)
 
 #--------------------------------------------------------------------------------------------------------------------
-def generate_caves_in_layer(world, start_x, end_x, start_y, end_y, cave_type):
+def generate_caves_in_layer(world, start_x, end_x, start_y, end_y, cave_type, rng=random):
     """
     Generates cave blobs in a given region.
     - For "dirt" caves (higher, shallower), use smaller parameters.
     - For "stone" caves (lower, deeper), use larger parameters.
+    rng is the random source (a seeded random.Random for reproducible worlds).
+    All blobs are carved together in a single bulk edit.
     """
     width = end_x - start_x
     if cave_type == "dirt":
@@ -111,35 +126,52 @@ def generate_caves_in_layer(world, start_x, end_x, start_y, end_y, cave_type):
     else:
         num_blobs = max(5, width // 30)
         entrance_width = 1
+    blobs = []
+    shafts = []
     for _ in range(num_blobs):
-        cx = random.randint(start_x, end_x)
-        cy = random.randint(start_y, end_y)
+        cx = rng.randint(start_x, end_x)
+        cy = rng.randint(start_y, end_y)
         if cave_type == "dirt":
-            rx = random.randint(3, 6)
-            ry = random.randint(2, 4)
+            rx = rng.randint(3, 6)
+            ry = rng.randint(2, 4)
         else:  # stone caves – generate bigger blobs
-            rx = random.randint(8, 16)
-            ry = random.randint(6, 12)
-        generate_cave_blob(world, cx, cy, rx, ry, entrance_width, cave_type)
+            rx = rng.randint(8, 16)
+            ry = rng.randint(6, 12)
+        blobs.append((cx, cy, rx, ry, entrance_width, cave_type))
         # For stone caves, sometimes generate an interconnected upper blob.
-        if cave_type == "stone" and random.random() < 0.2:
-            upper_cy = cy - ry - random.randint(2, 4)
-            upper_rx = random.randint(6, 10)
-            upper_ry = random.randint(4, 8)
-            generate_cave_blob(world, cx, upper_cy, upper_rx, upper_ry, 1, "stone")
-            for y in range(upper_cy + upper_ry, cy - ry + 1):
-                world.set_tile(cx, y, None)
+        if cave_type == "stone" and rng.random() < 0.2:
+            upper_cy = cy - ry - rng.randint(2, 4)
+            upper_rx = rng.randint(6, 10)
+            upper_ry = rng.randint(4, 8)
+            blobs.append((cx, upper_cy, upper_rx, upper_ry, 1, "stone"))
+            shafts.append((cx, upper_cy + upper_ry, cy - ry + 1))
+    x0 = min(cx - rx for cx, cy, rx, ry, _, _ in blobs)
+    x1 = max(cx + rx + 1 for cx, cy, rx, ry, _, _ in blobs)
+    y0 = min(cy - ry for cx, cy, rx, ry, _, _ in blobs)
+    y1 = max(cy + ry + 1 for cx, cy, rx, ry, _, _ in blobs)
+    world.apply_mask(x0, y0, carve_mask(x0, y0, x1 - x0, y1 - y0, blobs, shafts), None)
 
 #--------------------------------------------------------------------------------------------------------------------
-def generate_trees(world, start_x, end_x):
-    for x in range(start_x, end_x):
-        surface = world.get_tile(x, GROUND_LEVEL)
-        if surface and surface.kind == "grass":
-            if random.random() < 0.1:  # 10% chance per column
-                tree_height = random.randint(6, 9)
-                for i in range(1, tree_height + 1):
-                    world.set_tile(x, GROUND_LEVEL - i, "wood")
-                canopy_y = GROUND_LEVEL - tree_height
-                for cx in range(x - 1, x + 2):
-                    for cy in range(canopy_y - 1, canopy_y + 2):
-                        world.set_tile(cx, cy, "leaves")
\ No newline at end of file
+def generate_trees(world, start_x, end_x, rng=random):
+    """
+    Plants trees on the grass between start_x and end_x (10% of the columns), all stamped in a
+    single bulk edit from the tree structures. Trees are stamped in order of x, so a canopy
+    covers the trunk to its left.
+    """
+    from tile_for_game import TILE_IDS
+    from structures_for_game import TREES, stamp_structure
+    surface = world.read_ids(start_x, GROUND_LEVEL, end_x - start_x, 1)
+    trees = []
+    for x, surface_id in zip(range(start_x, end_x), surface[0].tolist()):
+        if surface_id == TILE_IDS["grass"]:
+            if rng.random() < 0.1:  # 10% chance per column
+                trees.append((x, rng.randint(6, 9)))
+    if not trees:
+        return
+    x0 = start_x - 1
+    top = GROUND_LEVEL - max(height for _, height in trees) - 1
+    ids = np.zeros((GROUND_LEVEL - top, end_x - start_x + 2), dtype=np.uint8)
+    mask = np.zeros(ids.shape, dtype=bool)
+    for x, tree_height in trees:
+        stamp_structure(ids, mask, x0, top, TREES[tree_height], x, GROUND_LEVEL)
+    world.write_region(x0, top, ids, mask)
@@ -0,0 +1,226 @@
+from concurrent.futures import ProcessPoolExecutor
+from tile_for_game import WATER_ID
+from world_for_game import CHUNK_SHIFT, CHUNK_MASK
+
+# Water simulation ticks per second, independent of the render frame rate.
+WATER_TICK_RATE = 10
+# Ticks run at most per update call; if the game falls further behind, water just slows down.
+MAX_TICKS_PER_UPDATE = 4
+SOURCE_LEVEL = 8
+# With workers > 1, ticks with fewer active cells than this still run in-process: below it,
+# shipping the regions to the pool costs more than it saves.
+PARALLEL_MIN_CELLS = 4096
+# Active cells are grouped by chunk column (32 tiles wide, like World chunks) into this many
+# regions per worker, so the pool can balance uneven water.
+REGIONS_PER_WORKER = 2
+REGION_SHIFT = 5
+
+#--------------------------------------------------------------------------------------------------------------------
+def water_proposals(cells, get_tile_id, get_water_level):
+    """
+    Computes one water tick for the given cells, reading only the state before the tick.
+    Rules for a water tile of level L at (x, y), where an empty tile counts as level 0:
+      - If the tile below is empty or holds water of a lower level b, water flows down. Source
+        water (level 8) stays and makes the tile below a source too; other water moves as much
+        of its level as the tile below can take (up to level 7, so it never becomes a source).
+      - Otherwise, if L > 1, water spreads sideways: it gives one level to each empty or water
+        left/right neighbour at least two levels lower (and below 6, so two neighbours giving
+        at once never make a source), unless the tile above that neighbour is flowing down into
+        it. Source water gives without losing any; other water keeps at least level 1, giving
+        to the left neighbour first.
+    Except for sources, water is only ever moved, never made or lost.
+    Returns (changes, sources): changes maps (x, y) to the level to add there (negative where
+    water left, the sum when several cells flow into the same tile), sources lists the tiles
+    that become source water.
+    Because every decision only reads the old state, the result does not depend on the order
+    of the cells, which is what lets WaterSimulation split a tick across processes.
+    """
+    changes = {}
+    sources = []
+    for x, y in cells:
+        L = get_water_level(x, y)
+        if L == 0:
+            continue
+        below_id = get_tile_id(x, y + 1)
+        below = get_water_level(x, y + 1) if below_id == WATER_ID else 0
+        if below_id == 0 or (below_id == WATER_ID and below < L):
+            if L == SOURCE_LEVEL:
+                sources.append((x, y + 1))
+            else:
+                amount = min(L, SOURCE_LEVEL - 1 - below)
+                changes[(x, y + 1)] = changes.get((x, y + 1), 0) + amount
+                changes[(x, y)] = changes.get((x, y), 0) - amount
+        elif L > 1:
+            spare = SOURCE_LEVEL if L == SOURCE_LEVEL else L - 1
+            limit = min(L, SOURCE_LEVEL - 1) - 1
+            for nx in (x - 1, x + 1):
+                if not spare:
+                    break
+                side_id = get_tile_id(nx, y)
+                if side_id != 0 and side_id != WATER_ID:
+                    continue
+                side = get_water_level(nx, y) if side_id == WATER_ID else 0
+                # Water above the neighbour that is falling into it has it to itself this tick.
+                if side >= limit or get_water_level(nx, y - 1) > side:
+                    continue
+                changes[(nx, y)] = changes.get((nx, y), 0) + 1
+                if L != SOURCE_LEVEL:
+                    changes[(x, y)] = changes.get((x, y), 0) - 1
+                    spare -= 1
+    return changes, sources
+
+def region_proposals(task):
+    """
+    Pool worker: runs water_proposals for one region.
+    task is (cells, x0, y0, ids, levels) where ids / levels are tile id and water level arrays
+    covering every cell plus a one tile halo (left, right, above and below), starting at (x0, y0).
+    """
+    cells, x0, y0, ids, levels = task
+    id_rows = ids.tolist()
+    level_rows = levels.tolist()
+    def get_tile_id(x, y):
+        return id_rows[y - y0][x - x0]
+    def get_water_level(x, y):
+        return level_rows[y - y0][x - x0]
+    return water_proposals(cells, get_tile_id, get_water_level)
+
+def split_into_regions(cells, count):
+    """
+    Groups cells by chunk column and packs neighbouring columns into at most count regions
+    holding roughly the same number of cells. Returns a list of cell lists.
+    """
+    columns = {}
+    for cell in cells:
+        columns.setdefault(cell[0] >> REGION_SHIFT, []).append(cell)
+    target = len(cells) / count
+    regions = []
+    current = []
+    for column in sorted(columns):
+        current.extend(columns[column])
+        if len(current) >= target and len(regions) < count - 1:
+            regions.append(current)
+            current = []
+    if current:
+        regions.append(current)
+    return regions
+
+#--------------------------------------------------------------------------------------------------------------------
+class WaterSimulation:
+    """
+    Water physics that only looks at water that can still move.
+    The simulation keeps a set of active water cells. A tick processes just those cells; a cell
+    that did not move or spread goes to sleep, and it is woken up again when something changes
+    next to it (the simulation listens to World.set_tile), so settled lakes cost nothing.
+    Ticks run at tick_rate per second of game time, decoupled from the frame rate.
+    With workers > 1, large ticks are split by chunk column regions across a process pool. Each
+    region is shipped with a one tile halo around it and the proposals are merged exactly like
+    in-process, so the outcome is identical to the serial simulation.
+    """
+    def __init__(self, world, tick_rate=WATER_TICK_RATE, workers=1):
+        self.world = world
+        self.tick_rate = tick_rate
+        self.workers = workers
+        self.pool = None
+        self.accumulator = 0.0
+        self.ticks = 0
+        self.active = set()
+        for x, y, level in world.water_cells():
+            self.active.add((x, y))
+        world.listeners.append(self.on_tiles_changed)
+        world.water_simulation = self
+
+    def on_tiles_changed(self, x0, y0, x1, y1):
+        """
+        Wakes the water that may react to changes in [x0, x1) x [y0, y1): water on the changed
+        tiles themselves, right above them and beside them. Single tile changes (the common case,
+        and every change the simulation makes itself) queue those neighbours without looking
+        them up; the next tick skips the ones that hold no water.
+        """
+        active = self.active
+        if x1 - x0 == 1 and y1 - y0 == 1:
+            active.add((x0, y0))
+            active.add((x0, y0 - 1))
+            active.add((x0 - 1, y0))
+            active.add((x0 + 1, y0))
+            return
+        get_water_level = self.world.get_water_level
+        for y in range(y0 - 1, y1):
+            for x in range(x0 - 1, x1 + 1):
+                if get_water_level(x, y):
+                    active.add((x, y))
+
+    def wake_chunk(self, chunk):
+        """Queues every water tile of a chunk that was just loaded into the world."""
+        x0 = chunk.cx << CHUNK_SHIFT
+        y0 = chunk.cy << CHUNK_SHIFT
+        for i in chunk.water:
+            self.active.add((x0 + (i & CHUNK_MASK), y0 + (i >> CHUNK_SHIFT)))
+
+    def active_chunks(self):
+        """Chunk coordinates of the cells queued for the next tick."""
+        return {(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) for x, y in self.active}
+
+    def active_count(self):
+        """Number of cells queued for the next tick."""
+        return len(self.active)
+
+    def update(self, dt):
+        """Advances the simulation by dt seconds of game time, running as many ticks as are due."""
+        self.accumulator += dt
+        interval = 1.0 / self.tick_rate
+        ticks = 0
+        while self.accumulator >= interval and ticks < MAX_TICKS_PER_UPDATE:
+            self.step()
+            self.accumulator -= interval
+            ticks += 1
+        if ticks == MAX_TICKS_PER_UPDATE:
+            self.accumulator = min(self.accumulator, interval)
+
+    def step(self):
+        """Runs a single tick over the active cells."""
+        cells = self.active
+        self.active = set()
+        if self.workers > 1 and len(cells) >= PARALLEL_MIN_CELLS:
+            changes, sources = self.parallel_proposals(cells)
+        else:
+            changes, sources = water_proposals(cells, self.world.get_tile_id, self.world.get_water_level)
+        self.apply(changes, sources)
+        self.ticks += 1
+
+    def parallel_proposals(self, cells):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        tasks = []
+        for region in split_into_regions(cells, self.workers * REGIONS_PER_WORKER):
+            x0 = min(x for x, y in region) - 1
+            x1 = max(x for x, y in region) + 2
+            y0 = min(y for x, y in region) - 1
+            y1 = max(y for x, y in region) + 2
+            ids, levels = self.world.read_region(x0, y0, x1 - x0, y1 - y0)
+            tasks.append((region, x0, y0, ids, levels))
+        changes = {}
+        sources = []
+        for region_changes, region_sources in self.pool.map(region_proposals, tasks):
+            for pos, amount in region_changes.items():
+                changes[pos] = changes.get(pos, 0) + amount
+            sources.extend(region_sources)
+        return changes, sources
+
+    def close(self):
+        """Shuts down the worker pool, if one was started."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def apply(self, changes, sources):
+        # Changing tiles goes through set_tile, which wakes the neighbours for the next tick.
+        world = self.world
+        get_water_level = world.get_water_level
+        levels = {pos: get_water_level(*pos) + amount for pos, amount in changes.items() if amount}
+        for pos in sources:
+            levels[pos] = SOURCE_LEVEL
+        for (x, y), level in levels.items():
+            if level > 0:
+                world.set_tile(x, y, "water", level=level)
+            else:
+                world.set_tile(x, y, None)
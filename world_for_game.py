@@ -1,75 +1,644 @@
 import pygame as p
 import math
-from tile_for_game import Tile
+import numpy as np
+from collections import OrderedDict
+from terrain_for_game import default_tile_id, generate_region, default_background_tile_id, generate_background_region
+from tile_for_game import Tile, TILE_TYPES, TILE_IDS, TILE_FLAGS, SOLID, WATER_ID, atlas_areas, get_atlas
 
 tile_size = 32
 GROUND_LEVEL = 10
-w, h = 800, 600
-screen = p.display.set_mode((w, h))
+
+# Tiles are stored in square chunks of CHUNK_SIZE x CHUNK_SIZE tiles.
+CHUNK_SHIFT = 5
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_PIXELS = CHUNK_SIZE * tile_size
+# How many pre-rendered chunk surfaces (CHUNK_PIXELS x CHUNK_PIXELS each) World.draw keeps around.
+SURFACE_CACHE_SIZE = 12
+# Approximate memory of a resident chunk (tile array, chunk object and its slot in World.chunks),
+# and of one entry of a chunk's water table, used by the chunk memory budget.
+CHUNK_BYTES = 1400
+WATER_ENTRY_BYTES = 80
+# A bulk edit that changes more cells than this in a chunk with a pre-rendered surface redraws the whole surface.
+REDRAW_CELLS = CHUNK_SIZE * CHUNK_SIZE // 4
+# Chunks made of a single tile kind (deep stone, the background wall) all share one surface per kind.
+uniform_surfaces = {}
+# Drawn for chunks that are still being generated in the background: the ground in a flat color.
+PLACEHOLDER_COLOR = (96, 72, 52)
+placeholder_surfaces = {}
+# Pixel position of every cell inside a chunk surface, by cell index.
+CELL_POSITIONS = [((i & CHUNK_MASK) * tile_size, (i >> CHUNK_SHIFT) * tile_size) for i in range(CHUNK_SIZE * CHUNK_SIZE)]
+
+class Chunk:
+    """
+    A CHUNK_SIZE x CHUNK_SIZE block of tiles.
+      - tiles: one byte per tile (a TILE_IDS id), row-major, index = ly * CHUNK_SIZE + lx.
+      - water: side table {index: level} for the water tiles of the chunk.
+      - modified: set once anything in the chunk was changed, so it can no longer be regenerated.
+    """
+    __slots__ = ("cx", "cy", "tiles", "water", "modified")
+
+    def __init__(self, cx, cy, tiles):
+        self.cx = cx
+        self.cy = cy
+        self.tiles = tiles
+        self.water = {}
+        self.modified = False
+
+def uniform_chunk_surface(tile_id):
+    """The shared surface of a chunk filled with a single (opaque) tile kind."""
+    surface = uniform_surfaces.get(tile_id)
+    if surface is None:
+        surface = p.Surface((CHUNK_PIXELS, CHUNK_PIXELS))
+        atlas = get_atlas()
+        area = atlas_areas[tile_id]
+        surface.blits([(atlas, position, area) for position in CELL_POSITIONS], doreturn=False)
+        uniform_surfaces[tile_id] = surface
+    return surface
+
+def mask_cells(mask):
+    """(row, col) of every True cell of a 2D mask, as Python ints."""
+    rows, cols = np.nonzero(mask)
+    return zip(rows.tolist(), cols.tolist())
+
+def chunk_keys(tx, ty):
+    """
+    The chunks of arrays of tile coordinates: returns (keys, inverse), keys being the distinct
+    (cx, cy) as a list and inverse the position in keys of every tile (flattened).
+    """
+    tx = np.asarray(tx, dtype=np.int64).ravel()
+    ty = np.asarray(ty, dtype=np.int64).ravel()
+    # One integer per chunk: cx in the high 32 bits, cy (two's complement) in the low ones.
+    unique, inverse = np.unique(((tx >> CHUNK_SHIFT) << 32) | ((ty >> CHUNK_SHIFT) & 0xFFFFFFFF), return_inverse=True)
+    keys = []
+    for key in unique.tolist():
+        cy = key & 0xFFFFFFFF
+        keys.append((key >> 32, cy - (1 << 32) if cy >= 1 << 31 else cy))
+    return keys, inverse
+
+def placeholder_chunk_surface(cy):
+    """The stand-in surface for a chunk row that is not generated yet (None above the ground)."""
+    ground = GROUND_LEVEL - (cy << CHUNK_SHIFT)
+    if ground >= CHUNK_SIZE:
+        return None
+    surface = placeholder_surfaces.get(max(ground, 0))
+    if surface is None:
+        surface = p.Surface((CHUNK_PIXELS, CHUNK_PIXELS), p.SRCALPHA)
+        top = max(ground, 0) * tile_size
+        surface.fill(PLACEHOLDER_COLOR, (0, top, CHUNK_PIXELS, CHUNK_PIXELS - top))
+        placeholder_surfaces[max(ground, 0)] = surface
+    return surface
 
 class World:
     """
-    The interactive foreground world:
+    The interactive foreground world (layer="foreground"):
       - y < GROUND_LEVEL: sky (None).
       - y == GROUND_LEVEL: grass tile.
       - GROUND_LEVEL < y <= GROUND_LEVEL+6: a random blend of dirt and stone.
       - y > GROUND_LEVEL+6: stone.
+    The background wall (layer="background") is cave stone from GROUND_LEVEL down; it is drawn
+    under the foreground and shows through wherever the foreground has been dug out.
+    The first read or edit inside a chunk materializes that chunk, generating its whole default
+    terrain in one vectorized pass (see terrain_for_game.generate_region); all further reads and
+    writes in it go through the compact chunk arrays.
+    With a generator (a generation_for_game.ChunkGenerator), chunks get their caves, lakes and
+    trees when they are materialized. With a storage (a region_for_game.RegionStore), chunks that
+    were saved are loaded from it instead of generated, and save() writes back only the chunks
+    changed since the last save. With a streamer (a streaming_for_game.ChunkStreamer), drawing
+    never generates chunks itself: missing chunks are requested from the streamer and drawn as a
+    placeholder until they arrive.
+    With a chunk_budget (in bytes), trim() keeps the resident chunks within it, dropping the least
+    recently used ones: unmodified chunks are simply generated again when needed, modified ones
+    are first written to the storage and loaded back from it.
     """
-    def __init__(self, layer="foreground"):
-        self.modifications = {}
+    def __init__(self, layer="foreground", surface_cache_size=SURFACE_CACHE_SIZE, chunk_budget=None):
+        # Resident chunks, least recently used first.
+        self.chunks = OrderedDict()
+        self.chunk_budget = chunk_budget
         self.layer = layer
-        
+        # Pre-rendered chunk surfaces in LRU order, and the cells of each one that changed since it was drawn.
+        self.surface_cache = OrderedDict()
+        self.surface_cache_size = surface_cache_size
+        self.dirty_cells = {}
+        # Callables invoked as listener(x0, y0, x1, y1) after tiles in [x0, x1) x [y0, y1) changed.
+        self.listeners = []
+        # The WaterSimulation driving this world's water, created on demand by update_water_flow.
+        self.water_simulation = None
+        # Drawing statistics of the last draw call (tiles rendered into chunk surfaces, chunk surfaces blitted).
+        self.tiles_drawn = 0
+        self.chunks_drawn = 0
+        # Feature generation, saved chunks, the world seed, and the chunks changed since the last save.
+        self.generator = None
+        self.storage = None
+        self.streamer = None
+        self.seed = None
+        self.dirty_chunks = set()
+        # Chunk cache statistics (see cache_stats) and the chunks seen by the last draw call, which trim() keeps.
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.reloaded = 0
+        self.visible_chunks = set()
+        # Water table entries of all resident chunks, for the memory estimate.
+        self.water_entries = 0
+        # Parts of placed structures waiting for their chunk to be loaded: (cx, cy) -> [(structure, x0, y0)].
+        self.pending_structures = {}
+
     def default_tile(self, x, y):
+        return TILE_TYPES[self.default_tile_id(x, y)]
+
+    def default_tile_id(self, x, y):
         if self.layer == "foreground":
-            if y < GROUND_LEVEL:
-                return None
-            elif y == GROUND_LEVEL:
-                return Tile("grass")
-            elif GROUND_LEVEL < y <= GROUND_LEVEL + 6:
-                noise = (math.sin(x * 12.9898 + y * 78.233) * 43758.5453) % 1.0
-                threshold = (y - (GROUND_LEVEL + 1)) / 5.0  # 0 at GROUND_LEVEL+1, 1 at GROUND_LEVEL+6
-                if noise < threshold:
-                    return Tile("stone")
-                else:
-                    return Tile("dirt")
-            else:
-                return Tile("stone")
-        
+            return default_tile_id(x, y)
+        if self.layer == "background":
+            return default_background_tile_id(x, y)
+        return 0
+
+    def default_region(self, x0, y0, width, height):
+        """Default terrain tile ids of a region as a (height, width) uint8 array."""
+        if self.layer == "foreground":
+            return generate_region(x0, y0, width, height)
+        if self.layer == "background":
+            return generate_background_region(x0, y0, width, height)
+        return np.zeros((height, width), dtype=np.uint8)
+
+    def get_chunk(self, cx, cy):
+        """Returns the chunk at chunk coordinates (cx, cy), loading it from storage or generating it."""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is not None:
+            self.chunks.move_to_end((cx, cy))
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            if self.storage is not None:
+                chunk = self.storage.load_chunk(cx, cy)
+                if chunk is not None:
+                    chunk.modified = True
+                    self.reloaded += 1
+            if chunk is None and self.generator is not None:
+                tiles, water = self.generator.generate_chunk(cx, cy)
+                chunk = Chunk(cx, cy, tiles)
+                chunk.water = water
+            elif chunk is None:
+                region = self.default_region(cx << CHUNK_SHIFT, cy << CHUNK_SHIFT, CHUNK_SIZE, CHUNK_SIZE)
+                chunk = Chunk(cx, cy, bytearray(region.tobytes()))
+            self.install_chunk(chunk)
+        return chunk
+
+    def install_chunk(self, chunk):
+        """Adds a loaded or generated chunk to the world, stamps the structures queued for it and wakes its water."""
+        self.chunks[(chunk.cx, chunk.cy)] = chunk
+        self.water_entries += len(chunk.water)
+        for structure, x0, y0 in self.pending_structures.pop((chunk.cx, chunk.cy), ()):
+            self.stamp_in_chunk(structure, x0, y0, chunk.cx, chunk.cy)
+        if chunk.water and self.water_simulation is not None:
+            self.water_simulation.wake_chunk(chunk)
+
     def get_tile(self, x, y):
-        if (x, y) in self.modifications:
-            return self.modifications[(x, y)]
-        return self.default_tile(x, y)
-    
-    def set_tile(self, x, y, kind):
-        default_tile_obj = self.default_tile(x, y)
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            chunk = self.get_chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        else:
+            self.cache_hits += 1
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        return TILE_TYPES[chunk.tiles[i]]
+
+    def get_tile_id(self, x, y):
+        """Like get_tile but returns the registry id (0 for air)."""
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            chunk = self.get_chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        else:
+            self.cache_hits += 1
+        return chunk.tiles[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def get_water_level(self, x, y):
+        """Returns the level (1 to 8) of the water tile at (x, y), or 0 if there is no water there."""
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0
+        return chunk.water.get(((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK), 0)
+
+    def set_tile(self, x, y, kind, level=None):
+        """
+        kind is a tile kind name, a registered Tile or None for air.
+        level only applies to water and defaults to 8 (a full source).
+        """
         if kind is None:
-            new_tile = None
+            tile_id = 0
         elif isinstance(kind, Tile):
-            new_tile = kind
+            tile_id = kind.id
         else:
-            new_tile = Tile(kind)
-            
-        if new_tile == default_tile_obj:
-            if (x, y) in self.modifications:
-                del self.modifications[(x, y)]
+            tile_id = TILE_IDS[kind]
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            chunk = self.get_chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
         else:
-            self.modifications[(x, y)] = new_tile
-            
+            self.cache_hits += 1
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if tile_id == WATER_ID:
+            level = 8 if level is None else level
+            if chunk.tiles[i] == WATER_ID:
+                if chunk.water[i] == level:
+                    return
+            else:
+                self.water_entries += 1
+            chunk.water[i] = level
+        elif chunk.tiles[i] == tile_id:
+            return
+        elif i in chunk.water:
+            del chunk.water[i]
+            self.water_entries -= 1
+        chunk.tiles[i] = tile_id
+        chunk.modified = True
+        self.dirty_chunks.add((chunk.cx, chunk.cy))
+        if (chunk.cx, chunk.cy) in self.surface_cache:
+            self.dirty_cells.setdefault((chunk.cx, chunk.cy), set()).add(i)
+        for listener in self.listeners:
+            listener(x, y, x + 1, y + 1)
+
+    def read_region(self, x0, y0, width, height):
+        """
+        Copies a region out of the chunk store.
+        Returns (ids, levels): two (height, width) uint8 arrays holding the tile ids and the water
+        levels (0 where there is no water), where [row, col] is tile (x0 + col, y0 + row).
+        """
+        return self.read_ids(x0, y0, width, height, levels=np.zeros((height, width), dtype=np.uint8))
+
+    def read_ids(self, x0, y0, width, height, levels=None):
+        """The tile ids of a region, like read_region; fills levels too if it is given."""
+        ids = np.empty((height, width), dtype=np.uint8)
+        x1 = x0 + width
+        y1 = y0 + height
+        for cy in range(y0 >> CHUNK_SHIFT, ((y1 - 1) >> CHUNK_SHIFT) + 1):
+            for cx in range(x0 >> CHUNK_SHIFT, ((x1 - 1) >> CHUNK_SHIFT) + 1):
+                chunk = self.get_chunk(cx, cy)
+                chunk_x = cx << CHUNK_SHIFT
+                chunk_y = cy << CHUNK_SHIFT
+                lx0 = max(x0, chunk_x) - chunk_x
+                lx1 = min(x1, chunk_x + CHUNK_SIZE) - chunk_x
+                ly0 = max(y0, chunk_y) - chunk_y
+                ly1 = min(y1, chunk_y + CHUNK_SIZE) - chunk_y
+                tiles = np.frombuffer(chunk.tiles, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+                ids[chunk_y + ly0 - y0:chunk_y + ly1 - y0, chunk_x + lx0 - x0:chunk_x + lx1 - x0] = tiles[ly0:ly1, lx0:lx1]
+                if levels is None:
+                    continue
+                for i, level in chunk.water.items():
+                    lx = i & CHUNK_MASK
+                    ly = i >> CHUNK_SHIFT
+                    if lx0 <= lx < lx1 and ly0 <= ly < ly1:
+                        levels[chunk_y + ly - y0, chunk_x + lx - x0] = level
+        if levels is None:
+            return ids
+        return ids, levels
+
+    #--------------------------------------------------------------------------------------------------------------------
+    # Collision queries. Boxes are in pixels, [left, right) x [top, bottom) with integer bounds; a
+    # tile collides with a box when they overlap by at least a pixel (touching is not colliding).
+    def tile_flags(self, tx, ty):
+        """
+        TILE_FLAGS of many tiles in one call: tx and ty are integer arrays of the same shape, the
+        result a uint8 array of that shape. Each chunk involved is looked up once.
+        """
+        tx = np.asarray(tx, dtype=np.int64)
+        ty = np.asarray(ty, dtype=np.int64)
+        cells = (((ty & CHUNK_MASK) << CHUNK_SHIFT) | (tx & CHUNK_MASK)).ravel()
+        keys, inverse = chunk_keys(tx, ty)
+        # The tile arrays of the chunks involved side by side, one row per chunk.
+        tiles = np.empty((len(keys), CHUNK_SIZE * CHUNK_SIZE), dtype=np.uint8)
+        for k, key in enumerate(keys):
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = self.get_chunk(*key)
+            else:
+                self.cache_hits += 1
+            tiles[k] = np.frombuffer(chunk.tiles, dtype=np.uint8)
+        return np.frombuffer(bytes(TILE_FLAGS), dtype=np.uint8)[tiles[inverse, cells]].reshape(tx.shape)
+
+    def resident_mask(self, tx, ty):
+        """For integer arrays of tile coordinates: True where the tile's chunk is loaded (nothing is loaded or generated)."""
+        keys, inverse = chunk_keys(tx, ty)
+        return np.array([key in self.chunks for key in keys], dtype=bool)[inverse].reshape(np.shape(tx))
+
+    def first_tile(self, left, top, right, bottom, flags=SOLID):
+        """
+        The first tile with any of flags that collides with a box, scanning the columns from the
+        left and each column from the top. Returns (tx, ty), or None if nothing collides.
+        """
+        return self.find_tile(left // tile_size, top // tile_size, (right - 1) // tile_size + 1, (bottom - 1) // tile_size + 1, flags)
+
+    def any_tile(self, tx0, ty0, tx1, ty1, flags):
+        """True if a tile of [tx0, tx1) x [ty0, ty1) has any of flags."""
+        return self.find_tile(tx0, ty0, tx1, ty1, flags) is not None
+
+    def find_tile(self, tx0, ty0, tx1, ty1, flags):
+        """The first tile (tx, ty) of [tx0, tx1) x [ty0, ty1) with any of flags, column by column, or None."""
+        chunks = self.chunks
+        hits = 0
+        for tx in range(tx0, tx1):
+            cx = tx >> CHUNK_SHIFT
+            lx = tx & CHUNK_MASK
+            for ty in range(ty0, ty1):
+                chunk = chunks.get((cx, ty >> CHUNK_SHIFT))
+                if chunk is None:
+                    chunk = self.get_chunk(cx, ty >> CHUNK_SHIFT)
+                else:
+                    hits += 1
+                if TILE_FLAGS[chunk.tiles[((ty & CHUNK_MASK) << CHUNK_SHIFT) | lx]] & flags:
+                    self.cache_hits += hits
+                    return tx, ty
+        self.cache_hits += hits
+        return None
+
+    def write_region(self, x0, y0, ids, mask=None, levels=None):
+        """
+        Bulk set_tile: writes a (height, width) array of tile ids with its top-left tile at (x0, y0).
+        mask (a boolean array of the same shape) limits the write to the cells where it is True;
+        levels (an array or a single value, default 8) gives the water level of water cells.
+        Each affected chunk is updated with array operations in one pass and its caches are
+        invalidated once; listeners are called once for the whole region. Returns the number of
+        tiles that changed.
+        """
+        ids = np.asarray(ids, dtype=np.uint8)
+        height, width = ids.shape
+        write = np.ones(ids.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        water_levels = np.where(ids == WATER_ID, np.broadcast_to(np.asarray(8 if levels is None else levels, dtype=np.uint8), ids.shape), 0)
+        x1 = x0 + width
+        y1 = y0 + height
+        total = 0
+        for cy in range(y0 >> CHUNK_SHIFT, ((y1 - 1) >> CHUNK_SHIFT) + 1):
+            for cx in range(x0 >> CHUNK_SHIFT, ((x1 - 1) >> CHUNK_SHIFT) + 1):
+                chunk_x = cx << CHUNK_SHIFT
+                chunk_y = cy << CHUNK_SHIFT
+                lx0 = max(x0, chunk_x) - chunk_x
+                lx1 = min(x1, chunk_x + CHUNK_SIZE) - chunk_x
+                ly0 = max(y0, chunk_y) - chunk_y
+                ly1 = min(y1, chunk_y + CHUNK_SIZE) - chunk_y
+                part = (slice(chunk_y + ly0 - y0, chunk_y + ly1 - y0), slice(chunk_x + lx0 - x0, chunk_x + lx1 - x0))
+                part_write = write[part]
+                if not part_write.any():
+                    continue
+                chunk = self.get_chunk(cx, cy)
+                tiles = np.frombuffer(chunk.tiles, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)[ly0:ly1, lx0:lx1]
+                new = ids[part]
+                new_levels = water_levels[part]
+                changed = part_write & (tiles != new)
+                if chunk.water:
+                    # Water staying water but changing level.
+                    for row, col in mask_cells(part_write & (new == WATER_ID) & (tiles == WATER_ID)):
+                        if chunk.water[((ly0 + row) << CHUNK_SHIFT) | (lx0 + col)] != new_levels[row, col]:
+                            changed[row, col] = True
+                if not changed.any():
+                    continue
+                water = chunk.water
+                for row, col in mask_cells(changed & (tiles == WATER_ID) & (new != WATER_ID)):
+                    del water[((ly0 + row) << CHUNK_SHIFT) | (lx0 + col)]
+                    self.water_entries -= 1
+                for row, col in mask_cells(changed & (new == WATER_ID)):
+                    i = ((ly0 + row) << CHUNK_SHIFT) | (lx0 + col)
+                    if i not in water:
+                        self.water_entries += 1
+                    water[i] = int(new_levels[row, col])
+                tiles[changed] = new[changed]
+                count = int(np.count_nonzero(changed))
+                total += count
+                key = (cx, cy)
+                chunk.modified = True
+                self.dirty_chunks.add(key)
+                if key in self.surface_cache:
+                    if count > REDRAW_CELLS:
+                        self.invalidate_chunk(cx, cy)
+                    else:
+                        rows, cols = np.nonzero(changed)
+                        self.dirty_cells.setdefault(key, set()).update((((rows + ly0) << CHUNK_SHIFT) | (cols + lx0)).tolist())
+        if total:
+            for listener in self.listeners:
+                listener(x0, y0, x1, y1)
+        return total
+
+    def fill_rect(self, x0, y0, x1, y1, kind, level=None):
+        """Sets every tile of [x0, x1) x [y0, y1) to kind (a kind name, a Tile or None)."""
+        if x1 <= x0 or y1 <= y0:
+            return 0
+        return self.write_region(x0, y0, np.full((y1 - y0, x1 - x0), self.kind_id(kind), dtype=np.uint8), levels=level)
+
+    def apply_mask(self, x0, y0, mask, kind, level=None):
+        """Sets the tiles where mask is True (mask[row, col] is tile (x0 + col, y0 + row)) to kind."""
+        mask = np.asarray(mask, dtype=bool)
+        return self.write_region(x0, y0, np.full(mask.shape, self.kind_id(kind), dtype=np.uint8), mask, level)
+
+    def place_structure(self, structure, x, y):
+        """
+        Places a compiled structure (structures_for_game.Structure) with its anchor at (x, y).
+        The parts in loaded chunks are written right away, one bulk write per chunk. Parts that
+        fall in chunks that are not loaded (or not generated) yet are queued in
+        pending_structures and stamped when those chunks arrive.
+        This is for structures added to a running world (the game plants trees with it); the
+        generated terrain is stamped by ChunkGenerator.generate_chunk itself, chunk by chunk.
+        """
+        x0, y0 = structure.origin(x, y)
+        x1 = x0 + structure.width
+        y1 = y0 + structure.height
+        for cy in range(y0 >> CHUNK_SHIFT, ((y1 - 1) >> CHUNK_SHIFT) + 1):
+            for cx in range(x0 >> CHUNK_SHIFT, ((x1 - 1) >> CHUNK_SHIFT) + 1):
+                if (cx, cy) in self.chunks:
+                    self.stamp_in_chunk(structure, x0, y0, cx, cy)
+                else:
+                    self.pending_structures.setdefault((cx, cy), []).append((structure, x0, y0))
+
+    def stamp_in_chunk(self, structure, x0, y0, cx, cy):
+        """Writes the part of a structure (top-left at (x0, y0)) that lies in chunk (cx, cy)."""
+        chunk_x = cx << CHUNK_SHIFT
+        chunk_y = cy << CHUNK_SHIFT
+        xa = max(x0, chunk_x)
+        xb = min(x0 + structure.width, chunk_x + CHUNK_SIZE)
+        ya = max(y0, chunk_y)
+        yb = min(y0 + structure.height, chunk_y + CHUNK_SIZE)
+        if xa < xb and ya < yb:
+            part = (slice(ya - y0, yb - y0), slice(xa - x0, xb - x0))
+            self.write_region(xa, ya, structure.ids[part], structure.mask[part])
+
+    @staticmethod
+    def kind_id(kind):
+        if kind is None:
+            return 0
+        if isinstance(kind, Tile):
+            return kind.id
+        return TILE_IDS[kind]
+
+    def water_cells(self):
+        """Yields (x, y, level) for every water tile in the world."""
+        for chunk in list(self.chunks.values()):
+            x0 = chunk.cx << CHUNK_SHIFT
+            y0 = chunk.cy << CHUNK_SHIFT
+            for i, level in list(chunk.water.items()):
+                yield x0 + (i & CHUNK_MASK), y0 + (i >> CHUNK_SHIFT), level
+
+    def save(self):
+        """
+        Writes the chunks changed since the last save to the storage.
+        Returns (chunks written, compressed bytes written).
+        """
+        if self.storage is None:
+            raise ValueError("World has no storage to save to")
+        chunks = [self.chunks[key] for key in self.dirty_chunks if key in self.chunks]
+        written = self.storage.save_chunks(chunks)
+        self.dirty_chunks.clear()
+        return len(chunks), written
+
+    def trim(self):
+        """
+        Evicts least recently used chunks until the resident ones fit in chunk_budget (see
+        memory_bytes). Chunks drawn by the last draw call and chunks with moving water are
+        kept, and so are modified chunks when there is no storage to spill them to. Modified chunks
+        that changed since they were last written are saved to the storage before they go.
+        Called once per frame; returns the number of chunks evicted.
+        """
+        if self.chunk_budget is None:
+            return 0
+        excess = self.memory_bytes() - self.chunk_budget
+        if excess <= 0:
+            return 0
+        pinned = self.visible_chunks
+        if self.water_simulation is not None:
+            pinned = pinned | self.water_simulation.active_chunks()
+        victims = []
+        kept = []
+        for key, chunk in self.chunks.items():
+            if excess <= 0:
+                break
+            if key in pinned or (chunk.modified and self.storage is None):
+                kept.append(key)
+            else:
+                victims.append(chunk)
+                excess -= CHUNK_BYTES + len(chunk.water) * WATER_ENTRY_BYTES
+        # Chunks that had to stay go to the back, so the next trim does not walk over them again.
+        for key in kept:
+            self.chunks.move_to_end(key)
+        spill = [chunk for chunk in victims if (chunk.cx, chunk.cy) in self.dirty_chunks]
+        if spill:
+            self.storage.save_chunks(spill)
+            self.spilled += len(spill)
+        for chunk in victims:
+            key = (chunk.cx, chunk.cy)
+            del self.chunks[key]
+            self.water_entries -= len(chunk.water)
+            self.dirty_chunks.discard(key)
+            self.surface_cache.pop(key, None)
+            self.dirty_cells.pop(key, None)
+        self.evicted += len(victims)
+        return len(victims)
+
+    def memory_bytes(self):
+        """Approximate memory used by the resident chunks, water tables included."""
+        return len(self.chunks) * CHUNK_BYTES + self.water_entries * WATER_ENTRY_BYTES
+
+    def cache_stats(self):
+        """
+        Chunk cache statistics. Hits and misses count chunk lookups: by the tile accessors
+        (get_tile, get_tile_id, set_tile, find_tile and tile_flags, one per tile or chunk looked
+        up), get_chunk and draw. A miss loads or generates the chunk.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hit_rate": self.cache_hits / lookups if lookups else 1.0,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "resident_chunks": len(self.chunks),
+            "bytes": self.memory_bytes(),
+            "budget": self.chunk_budget,
+            "evicted": self.evicted,
+            "spilled": self.spilled,
+            "reloaded": self.reloaded,
+        }
+
     def add_tile(self, x, y, kind):
         self.set_tile(x, y, kind)
-        
+
     def remove_tile(self, x, y):
+        """Removes the tile at (x, y) if it can be interacted with; returns the removed Tile (or None)."""
         cur = self.get_tile(x, y)
         if cur is not None and cur.can_interact:
             self.set_tile(x, y, None)
-            
+            return cur
+        return None
+
+    def invalidate_chunk(self, cx, cy):
+        """Drops the pre-rendered surface of a chunk so it is redrawn from scratch next time."""
+        self.surface_cache.pop((cx, cy), None)
+        self.dirty_cells.pop((cx, cy), None)
+
+    def render_chunk(self, cx, cy):
+        """
+        Returns the pre-rendered surface of a chunk (None for a chunk with no tiles).
+        A chunk is drawn once, all its tiles in one Surface.blits call from the tile atlas; after
+        that only the cells changed by set_tile are redrawn. The least recently used surfaces are
+        dropped past surface_cache_size.
+        """
+        key = (cx, cy)
+        surface = self.surface_cache.get(key)
+        if surface is None:
+            if key not in self.chunks and self.streamer is not None and not self.streamer.request(cx, cy):
+                return placeholder_chunk_surface(cy)
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = self.get_chunk(cx, cy)
+            empty = chunk.tiles.count(0)
+            if empty == len(chunk.tiles):
+                return None  # all sky, nothing to draw or cache
+            if chunk.tiles.count(chunk.tiles[0]) == len(chunk.tiles):
+                return uniform_chunk_surface(chunk.tiles[0])
+            # Chunks without empty cells are fully covered by opaque textures and skip per-pixel alpha.
+            surface = p.Surface((CHUNK_PIXELS, CHUNK_PIXELS), p.SRCALPHA if empty else 0)
+            atlas = get_atlas()
+            surface.blits([(atlas, CELL_POSITIONS[i], atlas_areas[t]) for i, t in enumerate(chunk.tiles) if t], doreturn=False)
+            self.tiles_drawn += len(chunk.tiles) - empty
+            self.surface_cache[key] = surface
+            while len(self.surface_cache) > self.surface_cache_size:
+                old_key, _ = self.surface_cache.popitem(last=False)
+                self.dirty_cells.pop(old_key, None)
+        else:
+            self.surface_cache.move_to_end(key)
+            cells = self.dirty_cells.pop(key, None)
+            if cells:
+                tiles = self.chunks[key].tiles
+                if not surface.get_flags() & p.SRCALPHA and 0 in tiles:
+                    # A hole was dug into an opaque chunk, it needs an alpha surface now.
+                    del self.surface_cache[key]
+                    return self.render_chunk(cx, cy)
+                for i in cells:
+                    surface.fill((0, 0, 0, 0), (CELL_POSITIONS[i], (tile_size, tile_size)))
+                atlas = get_atlas()
+                batch = [(atlas, CELL_POSITIONS[i], atlas_areas[tiles[i]]) for i in cells if tiles[i]]
+                surface.blits(batch, doreturn=False)
+                self.tiles_drawn += len(batch)
+        return surface
+
+    def begin_draw(self, camera_x, camera_y, width, height):
+        """
+        Starts drawing a frame: resets the drawing statistics and records the chunks in a
+        width x height view (visible_chunks, which trim() keeps), touching them in the LRU order.
+        Returns their keys.
+        """
+        self.tiles_drawn = 0
+        self.chunks_drawn = 0
+        start_cx = math.floor(camera_x / CHUNK_PIXELS)
+        end_cx = math.floor((camera_x + width) / CHUNK_PIXELS) + 1
+        start_cy = math.floor(camera_y / CHUNK_PIXELS)
+        end_cy = math.floor((camera_y + height) / CHUNK_PIXELS) + 1
+        keys = [(cx, cy) for cx in range(start_cx, end_cx) for cy in range(start_cy, end_cy)]
+        self.visible_chunks = set(keys)
+        for key in keys:
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+                self.cache_hits += 1
+        return keys
+
     def draw(self, camera_x, camera_y):
-        start_x = math.floor(camera_x / tile_size)
-        end_x = math.floor((camera_x + w) / tile_size) + 1
-        start_y = math.floor(camera_y / tile_size)
-        end_y = math.floor((camera_y + h) / tile_size) + 1
-        for tx in range(start_x, end_x):
-            for ty in range(start_y, end_y):
-                tile = self.get_tile(tx, ty)
-                if tile is not None:
-                    tile.draw(screen, tx * tile_size, ty * tile_size, camera_x, camera_y)
\ No newline at end of file
+        screen = p.display.get_surface()
+        for cx, cy in self.begin_draw(camera_x, camera_y, *screen.get_size()):
+            surface = self.render_chunk(cx, cy)
+            if surface is not None:
+                screen.blit(surface, (cx * CHUNK_PIXELS - camera_x, cy * CHUNK_PIXELS - camera_y))
+                self.chunks_drawn += 1